@@ -1,8 +1,44 @@
+import calendar
+import io
+
 import streamlit as st
 import pandas as pd
-from pathlib import Path
 from datetime import datetime, date
 
+from asset_groups import ASSET_FILTER_DIMS, AssetGroupIndex
+from asset_import import AssetHashIndex, split_new_assets, validate_asset_import
+from asset_links import AssetLinkIndex
+from budgets import BUDGET_WARN_RATIO, MonthlyTotals, budget_map, load_budgets, save_budgets
+from books import BOOK_POOL_MAX_MB, DEFAULT_BOOK, Book, BookPool, create_book, list_books, take_prewarmed_pool
+from charts import CHART_MAX_POINTS, spending_charts
+from export import EXPORT_FORMATS, available_formats, export_file
+from ledger import (
+    ASSET_COLUMNS,
+    CATEGORY_OPTIONS,
+    COLUMNS,
+    CURRENCY_OPTIONS,
+    FX_TO_TWD,
+    MONEY_SCALE,
+    PAYMENT_OPTIONS,
+    SUBCATEGORY_MAP,
+    SUMMARY_COLUMNS,
+    WEEKDAY_LABELS,
+    AssetRegistry,
+    Ledger,
+    load_active_rules,
+    from_minor,
+    archive_cutoff,
+    archive_years,
+    query_mask,
+    to_major,
+)
+from recurring import RECURRING_COLUMNS, assign_rule_ids, due_occurrences, load_rules, materialize, save_rules
+from rolling_spend import OUTLIER_FACTOR, OUTLIER_WINDOW, ROLLING_WINDOWS, RollingSpend
+from search_index import SearchIndex, normalize_text
+from spending_cube import SpendingCube, cells_from_rows, split_full_months
+from statement_import import STATEMENT_MATCH_DAYS, read_statement, split_new_rows, statement_range, statement_to_rows
+from view_cache import ViewCache
+
 st.set_page_config(page_title="家芬a整合平台", layout="wide")
 
 # ====== 全域樣式 ======
@@ -99,142 +135,320 @@ st.markdown(
 
 # ===================== 共用設定 =====================
 
-DATA_FILE = Path("transactions.csv")
-
-COLUMNS = [
-    "日期", "星期",
-    "類別", "小類", "項目",
+# 明細表格裡可以修改的欄位（星期、實際支出由帳本重算）
+EDITABLE_COLUMNS = [
+    "日期", "類別", "小類", "項目",
     "支付方式", "幣別",
-    "收入", "支出",
-    "支出比例", "實際支出",
-    "備註"
+    "收入", "支出", "支出比例",
+    "備註",
 ]
 
-CATEGORY_OPTIONS = [
-    "飲食", "衣著", "日常", "交通",
-    "教育", "娛樂", "醫療",
-    "收入",
-    "其他",
+ASSET_EDITABLE_COLUMNS = [
+    "分類", "小類", "產品名稱", "品牌/型號",
+    "購買日期", "幣別", "金額",
+    "當前狀態(服役中/已除役)",
+    "地點", "備註",
 ]
 
-SUBCATEGORY_MAP = {
-    "飲食": ["早餐", "午餐", "晚餐", "零食飲料", "食材原料"],
-    "衣著": ["服飾鞋包"],
-    "日常": [
-        "水費", "電費", "房租", "電話費",
-        "日用消耗", "居家百貨", "美妝保養", "電子數位",
-        "保險", "股票", "稅務",
-    ],
-    "交通": ["加油", "保養維修", "停車費", "過路費", "公共交通", "叫車"],
-    "教育": ["學雜費", "文具用品"],
-    "娛樂": ["旅遊", "聚會娛樂", "運動健身", "人情世故"],
-    "醫療": ["醫藥費", "藥品"],
-    "收入": ["薪資", "獎金"],
-    "其他": ["其他"],
-}
-
-PAYMENT_OPTIONS = ["現金", "魔法小卡", "大哥"]
-CURRENCY_OPTIONS = ["TWD", "USD", "JPY", "EUR", "其他"]
-WEEKDAY_LABELS = ["一", "二", "三", "四", "五", "六", "日"]
-
-# 匯率（你可以自行調整）
-FX_TO_TWD = {
-    "TWD": 1.0,
-    "USD": 32.0,
-    "JPY": 0.22,
-    "EUR": 35.0,
-    "其他": 1.0,
-}
-
-# ===================== 記帳：讀寫 =====================
-
-def load_data() -> pd.DataFrame:
-    if DATA_FILE.exists():
-        df = pd.read_csv(DATA_FILE)
-        for col in COLUMNS:
-            if col not in df.columns:
-                df[col] = ""
-        if not df.empty:
-            df["日期"] = pd.to_datetime(df["日期"])
-    else:
-        df = pd.DataFrame(columns=COLUMNS)
-    return df
+# 新增資產時怎麼跟記帳連結
+ASSET_LINK_MODES = ["不連結", "同時記一筆支出", "連結既有的支出"]
+# 「連結既有的支出」列出最近幾天的支出
+ASSET_LINK_LOOKBACK_DAYS = 180
 
+# 資產篩選 / 分組小計的欄位 → 畫面上的名稱
+ASSET_GROUP_LABELS = {"地點": "地點", "分類": "分類", "當前狀態(服役中/已除役)": "狀態", "幣別": "幣別"}
 
-def save_data(df: pd.DataFrame):
-    df_to_save = df.copy()
-    if not df_to_save.empty:
-        df_to_save["日期"] = df_to_save["日期"].dt.strftime("%Y-%m-%d")
-    df_to_save.to_csv(DATA_FILE, index=False, encoding="utf-8-sig")
+# 篩選結果快取上限（筆數 / MB）
+VIEW_CACHE_MAX_ENTRIES = 32
+VIEW_CACHE_MAX_MB = 64
 
+# 明細表格分頁：每頁筆數的選項 / 預設
+EDITOR_PAGE_SIZES = [50, 100, 200, 500]
+EDITOR_DEFAULT_PAGE_SIZE = 100
 
-# ===================== 分頁 1：記帳 =====================
+# ===================== 帳本（多本） =====================
 
-def show_bookkeeping_page():
-    df = load_data()
-    today = date.today()
+@st.cache_resource
+def get_book_pool() -> BookPool:
+    # 整個 server 共用：每本帳本（含搜尋索引 / 彙總）只讀一次，超過上限丟最久沒用的
+    # 用 warmup.py 啟動的話，直接接手開機時預熱好的帳本池
+    pool = take_prewarmed_pool()
+    return pool if pool is not None else BookPool(BOOK_POOL_MAX_MB * 1024 * 1024)
 
-    # 本月 / 全部 統計
-    if not df.empty:
-        this_month_mask = (
-            (df["日期"].dt.year == today.year) &
-            (df["日期"].dt.month == today.month)
+
+def current_book() -> Book:
+    return get_book_pool().get(st.session_state.get("book_name", DEFAULT_BOOK))
+
+
+def get_search_index() -> SearchIndex:
+    return current_book().search_index
+
+
+def get_spending_cube() -> SpendingCube:
+    return current_book().cube
+
+
+def get_rolling_spend() -> RollingSpend:
+    return current_book().rolling
+
+
+def get_monthly_totals() -> MonthlyTotals:
+    # 預算用的 (月份, 類別, 小類) 實際支出累計，跟著帳本更新
+    return get_ledger().sync(current_book().monthly_totals)
+
+
+def get_budgets() -> dict:
+    return budget_map(load_budgets(current_book().budget_file))
+
+
+def get_ledger() -> Ledger:
+    # 寫檔後會順手增量更新索引 / 彙總
+    return current_book().ledger
+
+
+def get_asset_registry() -> AssetRegistry:
+    return current_book().assets
+
+
+def get_asset_links() -> AssetLinkIndex:
+    # 資產 ↔ 記帳 的雙向對照，跟著資產表更新
+    return get_asset_registry().sync(current_book().asset_links)
+
+
+def get_asset_groups() -> AssetGroupIndex:
+    # 依 地點 / 分類 / 狀態 的分組小計與名單，跟著資產表更新
+    return get_asset_registry().sync(current_book().asset_groups)
+
+
+def get_asset_hashes() -> AssetHashIndex:
+    # 帳上資產的內容 hash（匯入時判斷重複用），跟著資產表更新
+    return get_asset_registry().sync(current_book().asset_hashes)
+
+
+def create_book_from_form():
+    # 表單按鈕的 callback：在畫出帳本選單之前就切過去
+    name = st.session_state["new_book_name"].strip()
+    try:
+        create_book(name)
+    except ValueError as e:
+        st.session_state["book_msg"] = ("error", str(e))
+        return
+    st.session_state["book_name"] = name
+    st.session_state["book_msg"] = ("success", f"已建立帳本「{name}」✅")
+
+
+def show_book_picker():
+    st.sidebar.selectbox("📚 帳本", list_books(), key="book_name")
+    with st.sidebar.expander("新增帳本"):
+        with st.form("new_book_form", clear_on_submit=True):
+            st.text_input("帳本名稱", key="new_book_name", placeholder="例如：小明、家用")
+            st.form_submit_button("建立", on_click=create_book_from_form)
+    if "book_msg" in st.session_state:
+        kind, msg = st.session_state.pop("book_msg")
+        getattr(st.sidebar, kind)(msg)
+
+
+# ===================== 記帳：篩選 =====================
+
+def filter_transactions(df, start_date, end_date, category_filter, payment_filter, search_query=""):
+    if df.empty:
+        return df.copy()
+    mask = query_mask(df, start_date, end_date, category_filter, payment_filter)
+    if search_query.strip():
+        hit_ids = get_ledger().sync(get_search_index()).search(search_query)
+        mask &= df["ID"].isin(hit_ids)
+    return df[mask].copy()
+
+
+def filter_archived(start_date, end_date, category_filter, payment_filter, search_query=""):
+    # 篩選日期往前碰到封存年度才會真的讀檔；封存的沒有搜尋索引，直接比對文字
+    archived = get_ledger().archived(start_date, end_date, category_filter, payment_filter)
+    if search_query.strip() and not archived.empty:
+        text = archived["項目"].map(normalize_text) + "\x1f" + archived["備註"].map(normalize_text)
+        archived = archived[text.str.contains(normalize_text(search_query), regex=False)]
+    return archived
+
+
+def prepare_edit_view(page_df: pd.DataFrame, links: AssetLinkIndex) -> pd.DataFrame:
+    # 給 data_editor 用的版本（只做目前這一頁）：日期轉字串、加上「刪除」勾選欄
+    # ID 留著（不顯示），儲存時靠它對回帳本
+    # 金額換回「元」給使用者看 / 改；買固定資產的那幾筆標上資產名稱
+    edit_df = to_major(page_df)
+    edit_df["日期"] = edit_df["日期"].dt.strftime("%Y-%m-%d")
+    edit_df["資產"] = links.labels(edit_df["ID"])
+    if "刪除" not in edit_df.columns:
+        edit_df["刪除"] = False
+    return edit_df
+
+
+@st.cache_resource
+def get_view_cache() -> ViewCache:
+    return ViewCache(VIEW_CACHE_MAX_ENTRIES, VIEW_CACHE_MAX_MB * 1024 * 1024)
+
+
+def view_key(start_date, end_date, category_filter, payment_filter, search_query, version):
+    return (
+        current_book().name,
+        start_date, end_date,
+        tuple(sorted(category_filter)), tuple(sorted(payment_filter)),
+        search_query.strip(),
+        version,
+    )
+
+
+def filtered_views(df, version, start_date, end_date, category_filter, payment_filter, search_query):
+    # 同一本帳本 + 同一組篩選條件 + 同一版資料 → 直接拿快取好的 (filtered_df, hot_df, order, archived_df)
+    # filtered_df 含封存的紀錄（筆數、匯出、樞紐用）；hot_df 只有熱資料（可以改）
+    # order 是 hot_df 新到舊的列位置（只排日期這一欄），分頁時照它取出那一頁再整理
+    key = view_key(start_date, end_date, category_filter, payment_filter, search_query, version)
+
+    def build():
+        hot = filter_transactions(
+            df, start_date, end_date, category_filter, payment_filter, search_query,
         )
-        this_month_df = df[this_month_mask].copy()
-    else:
-        this_month_df = df.copy()
+        archived = filter_archived(start_date, end_date, category_filter, payment_filter, search_query)
+        filtered_df = pd.concat([archived, hot], ignore_index=True) if not archived.empty else hot
+        # stable 排序倒過來：同一天的新紀錄（ID 大的）在前，每次重跑順序都一樣
+        order = hot["日期"].to_numpy().argsort(kind="stable")[::-1].copy()
+        return filtered_df, hot, order, archived
 
-    if not this_month_df.empty:
-        month_income = this_month_df["收入"].sum()
-        month_expense = this_month_df["實際支出"].sum()
-        month_net = month_income - month_expense
-    else:
-        month_income = month_expense = month_net = 0.0
+    return get_view_cache().get_or_build(key, build)
 
-    if not df.empty:
-        all_income = df["收入"].sum()
-        all_expense = df["實際支出"].sum()
-        all_net = all_income - all_expense
-    else:
-        all_income = all_expense = all_net = 0.0
 
-    # 標題
-    st.header("📒 嘎昏 a 記帳小程式")
+def edit_page(hot_df, order, page, page_size) -> pd.DataFrame:
+    # 只把這一頁的列取出來整理，整份篩選結果不用排序、轉字串、送到瀏覽器
+    lo = (page - 1) * page_size
+    return prepare_edit_view(hot_df.iloc[order[lo:lo + page_size]], get_asset_links())
 
-    st.markdown(
-        """
-        <div class="intro-box">
-        <b>保持可愛。</b><br><br>
-        ‧ 每月 5 號發薪水<br>
-        ‧ 乖乖記帳，知道錢跑去哪<br>
-        ‧ 不要死掉，要快樂花錢
-        </div>
-        """,
-        unsafe_allow_html=True,
+
+def reset_editor_edits():
+    # 表格裡還沒儲存的修改是照「第幾列」記的，換頁後就對不上了，直接丟掉
+    st.session_state.pop("bk_editor", None)
+
+
+def resize_editor_page(old_size):
+    # 換每頁筆數時，停在原本這一頁第一筆所在的頁
+    first_row = (st.session_state.get("bk_page", 1) - 1) * old_size
+    st.session_state["bk_page"] = first_row // st.session_state["bk_page_size"] + 1
+    reset_editor_edits()
+
+
+def pivot_cells(filtered_df, start_date, end_date, category_filter, payment_filter, search_query):
+    # 完整月份直接加總 cube 格子；頭尾不完整的月份、或有搜尋字串時才回頭用明細
+    if search_query.strip():
+        return cells_from_rows(filtered_df)
+    full_months, partial_ranges = split_full_months(start_date, end_date)
+    parts = [get_ledger().sync(get_spending_cube()).cells(full_months, category_filter, payment_filter)]
+    # 封存年度的月份用預先算好的彙總
+    rollup = get_ledger().rollup()
+    if not rollup.empty:
+        keep = rollup["月份"].isin(full_months)
+        if category_filter:
+            keep &= rollup["類別"].isin(category_filter)
+        if payment_filter:
+            keep &= rollup["支付方式"].isin(payment_filter)
+        parts.append(rollup[keep])
+    for lo, hi in partial_ranges:
+        in_range = (filtered_df["日期"].dt.date >= lo) & (filtered_df["日期"].dt.date <= hi)
+        parts.append(cells_from_rows(filtered_df[in_range]))
+    parts = [p for p in parts if not p.empty]
+    if not parts:
+        return cells_from_rows(filtered_df.iloc[0:0])
+    return pd.concat(parts, ignore_index=True)
+
+
+# ===================== 圖表 =====================
+
+def show_spending_charts(filtered_df, version, start_date, end_date, category_filter, payment_filter, search_query):
+    # 畫好的 PNG 跟篩選結果放在同一個快取：條件、資料都沒變就直接拿圖
+    key = ("charts",) + view_key(start_date, end_date, category_filter, payment_filter, search_query, version)
+    trend, share = get_view_cache().get_or_build(
+        key, lambda: spending_charts(filtered_df, start_date, end_date),
     )
+    left, right = st.columns([3, 2])
+    with left:
+        st.image(trend, use_container_width=True)
+        st.caption(f"期間越長點越粗（日 → 週 → 月 → 季 → 年），最多 {CHART_MAX_POINTS} 個點。")
+    with right:
+        if share is None:
+            st.info("這段期間沒有支出。")
+        else:
+            st.image(share, use_container_width=True)
+
+
+# ===================== 匯出 =====================
+
+def show_export_controls(key, downloads, columns):
+    # downloads: [(按鈕文字, 檔名, DataFrame)]；檔案在按下按鈕時才分段產生
+    with st.expander("📤 匯出 CSV / XLSX"):
+        fmt = st.radio("匯出格式", available_formats(), horizontal=True, key=f"{key}_fmt")
+        ext, mime = EXPORT_FORMATS[fmt]
+        for col, (label, stem, frame) in zip(st.columns(len(downloads)), downloads):
+            with col:
+                st.download_button(
+                    label,
+                    data=lambda frame=frame: export_file(frame, fmt, columns, transform=to_major),
+                    file_name=f"{stem}.{ext}",
+                    mime=mime,
+                    disabled=frame.empty,
+                    on_click="ignore",
+                    key=f"{key}_{stem}",
+                )
 
-    # 側邊欄新增紀錄
-    st.sidebar.header("花了什麼")
 
-    tx_date = st.sidebar.date_input("日期", today)
-    category = st.sidebar.selectbox("類別", CATEGORY_OPTIONS)
+# ===================== 分頁 1：記帳（側邊欄新增） =====================
+
+@st.fragment
+def show_category_picker():
+    # 類別 → 小類 連動：放在 fragment 裡，換類別只重跑這一小塊
+    category = st.selectbox("類別", CATEGORY_OPTIONS, key="tx_category")
     sub_options = SUBCATEGORY_MAP.get(category, ["其他"])
-    subcategory = st.sidebar.selectbox("小類", sub_options)
-    item_name = st.sidebar.text_input("項目")
-    pay_method = st.sidebar.selectbox("支付方式", PAYMENT_OPTIONS)
-    currency = st.sidebar.selectbox("幣別", CURRENCY_OPTIONS, index=0)
-    income_or_expense = st.sidebar.radio("這筆是？", ["支出", "收入"], horizontal=True)
-    pay_ratio = st.sidebar.number_input(
-        "支付比例（%）",
-        min_value=0,
-        max_value=100,
-        value=100,
-        step=5,
-    )
-    amount_str = st.sidebar.text_input(f"金額（{currency}）")
-    note = st.sidebar.text_area("備註（選填）", height=60)
+    subcategory = st.selectbox("小類", sub_options, key="tx_subcategory")
+    show_budget_hint(category, subcategory)
+
+
+def show_budget_hint(category, subcategory):
+    # 這個類別本月的預算用量（查累計表，不掃明細）
+    month = date.today().strftime("%Y-%m")
+    for label, spent, budget in get_monthly_totals().budget_status(get_budgets(), month, category, subcategory):
+        text = f"本月「{label}」已花 {spent / MONEY_SCALE:,.0f} / 預算 {budget / MONEY_SCALE:,.0f}（{spent / budget:.0%}）"
+        if spent > budget:
+            st.error(text)
+        elif spent >= budget * BUDGET_WARN_RATIO:
+            st.warning(text)
+        else:
+            st.caption(text)
+
+
+def show_add_transaction_sidebar():
+    today = date.today()
+
+    st.sidebar.header("花了什麼")
+
+    with st.sidebar:
+        show_category_picker()
+
+    # 其餘欄位包成 form，打字不會觸發重跑，按 Add 才送出一次
+    with st.sidebar.form("tx_form"):
+        tx_date = st.date_input("日期", today)
+        item_name = st.text_input("項目")
+        pay_method = st.selectbox("支付方式", PAYMENT_OPTIONS)
+        currency = st.selectbox("幣別", CURRENCY_OPTIONS, index=0)
+        income_or_expense = st.radio("這筆是？", ["支出", "收入"], horizontal=True)
+        pay_ratio = st.number_input(
+            "支付比例（%）",
+            min_value=0,
+            max_value=100,
+            value=100,
+            step=5,
+        )
+        amount_str = st.text_input("金額（依幣別）")
+        note = st.text_area("備註（選填）", height=60)
+
+        submitted = st.form_submit_button("💾 Add")
 
-    submitted = st.sidebar.button("💾 Add")
+    category = st.session_state["tx_category"]
+    subcategory = st.session_state["tx_subcategory"]
 
     if submitted:
         try:
@@ -253,11 +467,8 @@ def show_bookkeeping_page():
 
             income = amount if income_or_expense == "收入" else 0.0
             expense = amount if income_or_expense == "支出" else 0.0
-            if income_or_expense == "支出":
-                actual_expense = expense * (pay_ratio / 100.0)
-            else:
-                actual_expense = 0.0
 
+            # 實際支出由帳本依 支出 × 比例 算成整數的分
             new_row = {
                 "日期": dt,
                 "星期": weekday_str,
@@ -269,14 +480,73 @@ def show_bookkeeping_page():
                 "收入": income,
                 "支出": expense,
                 "支出比例": int(pay_ratio),
-                "實際支出": actual_expense,
                 "備註": note,
             }
 
-            df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-            save_data(df)
+            added = get_ledger().add_many([new_row])
+            actual_expense = int(added["實際支出"].iloc[0])
             st.sidebar.success("已新增一筆紀錄 ✅")
 
+            # 這筆讓類別超過預算就馬上提醒（本來就已經超過的，側邊欄的預算提示會一直標紅，不再重複警告）
+            if actual_expense > 0:
+                month = tx_date.strftime("%Y-%m")
+                status = get_monthly_totals().budget_status(get_budgets(), month, category, subcategory)
+                for label, spent, budget in status:
+                    if spent - actual_expense <= budget < spent:
+                        st.sidebar.warning(
+                            f"⚠️ {month}「{label}」已花 {spent / MONEY_SCALE:,.0f}，"
+                            f"超過預算 {budget / MONEY_SCALE:,.0f}（超出 {(spent - budget) / MONEY_SCALE:,.0f}）"
+                        )
+
+
+# ===================== 分頁 1：記帳 =====================
+
+@st.fragment
+def show_bookkeeping_page():
+    # 共用帳本，請當唯讀使用（要改一律走 ledger.apply_changes）
+    ledger = get_ledger()
+    df, version = ledger.snapshot()
+    today = date.today()
+
+    # 本月 / 全部 統計
+    # 只取 KPI 需要的欄位，不複製整份明細
+    this_month_df = ledger.query(
+        start=today.replace(day=1),
+        end=today.replace(day=calendar.monthrange(today.year, today.month)[1]),
+        columns=SUMMARY_COLUMNS,
+    )
+
+    if not this_month_df.empty:
+        month_income = this_month_df["收入"].sum() / MONEY_SCALE
+        month_expense = this_month_df["實際支出"].sum() / MONEY_SCALE
+        month_net = month_income - month_expense
+    else:
+        month_income = month_expense = month_net = 0.0
+
+    # 封存年度直接加總彙總表，不讀明細
+    rollup = ledger.rollup()
+    if not df.empty or not rollup.empty:
+        all_income = (df["收入"].sum() + rollup["收入"].sum()) / MONEY_SCALE
+        all_expense = (df["實際支出"].sum() + rollup["實際支出"].sum()) / MONEY_SCALE
+        all_net = all_income - all_expense
+    else:
+        all_income = all_expense = all_net = 0.0
+
+    # 標題
+    st.header("📒 嘎昏 a 記帳小程式")
+
+    st.markdown(
+        """
+        <div class="intro-box">
+        <b>保持可愛。</b><br><br>
+        ‧ 每月 5 號發薪水<br>
+        ‧ 乖乖記帳，知道錢跑去哪<br>
+        ‧ 不要死掉，要快樂花錢
+        </div>
+        """,
+        unsafe_allow_html=True,
+    )
+
     # 篩選條件
     st.subheader("篩選條件")
     with st.container():
@@ -303,23 +573,31 @@ def show_bookkeeping_page():
                 options=PAYMENT_OPTIONS,
                 default=[],
             )
+        search_query = st.text_input(
+            "搜尋項目 / 備註（空白 = 不限）",
+            placeholder="例如：便當、全聯…",
+        )
         st.markdown("</div>", unsafe_allow_html=True)
+    years = archive_years(ledger.path)
+    if years:
+        st.caption(f"{years[0]}–{years[-1]} 年的紀錄已封存（唯讀），起始日期往前調到那幾年才會列出來。")
 
-    if not df.empty:
-        mask = (
-            (df["日期"].dt.date >= start_date) &
-            (df["日期"].dt.date <= end_date)
-        )
-        if category_filter:
-            mask &= df["類別"].isin(category_filter)
-        if payment_filter:
-            mask &= df["支付方式"].isin(payment_filter)
-        filtered_df = df[mask].copy()
-    else:
-        filtered_df = df.copy()
+    filtered_df, hot_df, hot_order, archived_df = filtered_views(
+        df, version, start_date, end_date,
+        category_filter, payment_filter, search_query,
+    )
 
     st.write(f"符合條件的筆數：**{len(filtered_df)}**")
 
+    show_export_controls(
+        "bk_export",
+        [
+            ("⬇️ 下載篩選結果", "transactions_filtered", filtered_df),
+            ("⬇️ 下載全部帳本", "transactions_all", df),
+        ],
+        [c for c in COLUMNS if c in df.columns],
+    )
+
     # 本月統計
     st.subheader("本月統計總覽")
     k1, k2, k3 = st.columns(3)
@@ -359,26 +637,40 @@ def show_bookkeeping_page():
     # 明細（可修改 / 刪除）
     st.subheader("明細紀錄（可修改 / 刪除）")
 
-    if filtered_df.empty:
-        st.info("目前沒有符合條件的紀錄。")
+    if hot_df.empty:
+        st.info("目前沒有符合條件的紀錄。" if filtered_df.empty else "符合條件的紀錄都已封存，見下方唯讀列表。")
     else:
-        edit_df = filtered_df.sort_values("日期", ascending=False).copy()
-        if "ID" in edit_df.columns:
-            edit_df = edit_df.drop(columns=["ID"])
-        edit_df["日期"] = edit_df["日期"].dt.strftime("%Y-%m-%d")
-        if "刪除" not in edit_df.columns:
-            edit_df["刪除"] = False
-
         st.markdown(
-            '<p class="hint-text">直接在下列表格中修改欄位內容，或勾選「刪除」，最後按下方按鈕儲存。</p>',
+            '<p class="hint-text">直接在下列表格中修改欄位內容，或勾選「刪除」，最後按下方按鈕儲存（只會存目前這一頁）。</p>',
             unsafe_allow_html=True,
         )
 
+        # 分頁：頁數、每頁筆數都記在 session_state，重跑後停在同一頁；篩選後頁數變少就停在最後一頁
+        page_size = st.session_state.setdefault("bk_page_size", EDITOR_DEFAULT_PAGE_SIZE)
+        page_count = max(1, -(-len(hot_df) // page_size))
+        if st.session_state.get("bk_page", 1) > page_count:
+            st.session_state["bk_page"] = page_count
+        p1, p2, p3 = st.columns([1, 1, 3])
+        with p1:
+            page_size = st.selectbox(
+                "每頁筆數", EDITOR_PAGE_SIZES,
+                key="bk_page_size", on_change=resize_editor_page, args=(page_size,),
+            )
+        with p2:
+            page = st.number_input(
+                "頁數", min_value=1, max_value=page_count, step=1,
+                key="bk_page", on_change=reset_editor_edits,
+            )
+        with p3:
+            lo = (page - 1) * page_size
+            st.caption(f"第 {page} / {page_count} 頁：第 {lo + 1}–{min(lo + page_size, len(hot_df))} 筆，共 {len(hot_df)} 筆可修改")
+        edit_df = edit_page(hot_df, hot_order, page, page_size)
+
         column_order = [
             "日期", "星期", "類別", "小類", "項目",
             "支付方式", "幣別",
             "收入", "支出", "支出比例", "實際支出",
-            "備註", "刪除",
+            "備註", "資產", "刪除",
         ]
         column_order = [c for c in column_order if c in edit_df.columns]
 
@@ -388,53 +680,133 @@ def show_bookkeeping_page():
             use_container_width=True,
             hide_index=True,
             column_order=column_order,
+            disabled=["星期", "實際支出", "資產"],
             key="bk_editor",
         )
 
         if st.button("💾 儲存修改 / 刪除"):
-            new_df = df.copy()
-            for idx, row in edited_df.iterrows():
-                if "刪除" in row and row["刪除"]:
-                    if idx in new_df.index:
-                        new_df = new_df.drop(index=idx)
-                    continue
-                try:
-                    new_date = datetime.strptime(str(row["日期"]), "%Y-%m-%d")
-                except ValueError:
-                    st.error(f"第 {idx} 列日期格式錯誤，請用 YYYY-MM-DD")
-                    continue
-                try:
-                    new_income = float(row["收入"]) if str(row["收入"]).strip() != "" else 0.0
-                    new_expense = float(row["支出"]) if str(row["支出"]).strip() != "" else 0.0
-                    new_ratio = int(row["支出比例"]) if str(row["支出比例"]).strip() != "" else 0
-                except ValueError:
-                    st.error(f"第 {idx} 列的金額或比例欄位有非數字，請修正。")
-                    continue
-                if new_expense > 0:
-                    new_actual = new_expense * (new_ratio / 100.0)
-                else:
-                    new_actual = 0.0
-                if idx in new_df.index:
-                    new_df.loc[idx, "日期"] = new_date
-                    new_df.loc[idx, "星期"] = row["星期"]
-                    new_df.loc[idx, "類別"] = row["類別"]
-                    new_df.loc[idx, "小類"] = row["小類"]
-                    new_df.loc[idx, "項目"] = row["項目"]
-                    new_df.loc[idx, "支付方式"] = row["支付方式"]
-                    new_df.loc[idx, "幣別"] = row["幣別"]
-                    new_df.loc[idx, "收入"] = new_income
-                    new_df.loc[idx, "支出"] = new_expense
-                    new_df.loc[idx, "支出比例"] = new_ratio
-                    new_df.loc[idx, "實際支出"] = new_actual
-                    new_df.loc[idx, "備註"] = row["備註"]
-            save_data(new_df)
-            st.success("已套用修改 / 刪除 ✅")
+            to_delete = edited_df["刪除"].fillna(False).astype(bool)
+            kept = edited_df[~to_delete]
+
+            # 只送出真的有改到的列
+            editable = [c for c in EDITABLE_COLUMNS if c in kept.columns]
+            before = edit_df.loc[kept.index, editable]
+            after = kept[editable]
+            changed = ~((before == after) | (before.isna() & after.isna())).all(axis=1)
+            kept = kept[changed]
+
+            new_dates = pd.to_datetime(kept["日期"].astype(str), format="%Y-%m-%d", errors="coerce")
+            bad_date = new_dates.isna()
+            numbers = {}
+            bad_number = pd.Series(False, index=kept.index)
+            for col in ["收入", "支出", "支出比例"]:
+                raw = kept[col]
+                blank = raw.isna() | (raw.astype(str).str.strip() == "")
+                value = pd.to_numeric(raw.where(~blank), errors="coerce")
+                bad_number |= value.isna() & ~blank
+                numbers[col] = value.fillna(0)
+            errors = [f"第 {idx} 列日期格式錯誤，請用 YYYY-MM-DD" for idx in kept.index[bad_date]]
+            errors += [f"第 {idx} 列的金額或比例欄位有非數字，請修正。" for idx in kept.index[bad_number & ~bad_date]]
+
+            # 星期、實際支出由帳本依日期 / 支出 / 比例重算
+            valid = ~(bad_date | bad_number)
+            updates = kept.loc[valid, ["ID"] + editable].copy()
+            updates["日期"] = new_dates[valid]
+            for col, value in numbers.items():
+                updates[col] = value[valid]
+            updates["支出比例"] = updates["支出比例"].astype(int)
+
+            deletes = edited_df.loc[to_delete, "ID"]
+            if updates.empty and deletes.empty:
+                for text in errors:
+                    st.error(text)
+                if not errors:
+                    st.success("已套用修改 / 刪除 ✅")
+            else:
+                ledger.apply_changes(update=updates, delete=deletes)
+                # 金額變了，側邊欄的預算提示也要跟著更新，所以整頁重跑（不是只重跑這個分頁）
+                st.session_state["save_msg"] = ("已套用修改 / 刪除 ✅", errors)
+                st.rerun()
+    if "save_msg" in st.session_state:
+        text, errors = st.session_state.pop("save_msg")
+        for error in errors:
+            st.error(error)
+        st.success(text)
+
+    if not archived_df.empty:
+        st.markdown(f"**已封存的紀錄（唯讀，{len(archived_df)} 筆）**")
+        archived_view = to_major(archived_df.sort_values("日期", ascending=False))
+        archived_view["日期"] = archived_view["日期"].dt.strftime("%Y-%m-%d")
+        st.dataframe(
+            archived_view[[c for c in COLUMNS if c in archived_view.columns]],
+            use_container_width=True,
+            hide_index=True,
+        )
+
+    # 每次修改都記在變更紀錄裡，可以一步一步往回復原
+    if st.button("↩️ 復原上一次修改"):
+        if ledger.undo():
+            st.session_state["undo_msg"] = "已復原上一次修改 ✅"
+            st.rerun()
+        else:
+            st.info("沒有可以復原的修改。")
+    if "undo_msg" in st.session_state:
+        st.success(st.session_state.pop("undo_msg"))
+
+    st.divider()
+
+    # 類別 × 月份 樞紐（套用上方篩選條件）
+    st.subheader("類別 × 月份 實際支出")
+    if filtered_df.empty or start_date > end_date:
+        st.info("目前沒有符合條件的紀錄。")
+    else:
+        drill_category = st.selectbox(
+            "展開類別看小類",
+            ["（全部類別）"] + CATEGORY_OPTIONS,
+            key="pivot_drill",
+        )
+        cells = pivot_cells(
+            filtered_df, start_date, end_date,
+            category_filter, payment_filter, search_query,
+        )
+        level = "類別"
+        if drill_category != "（全部類別）":
+            cells = cells[cells["類別"] == drill_category]
+            level = "小類"
+        if cells.empty or cells["實際支出"].sum() == 0:
+            st.info("這段期間沒有支出。")
+        else:
+            pivot = cells.pivot_table(
+                index=level,
+                columns="月份",
+                values="實際支出",
+                aggfunc="sum",
+                fill_value=0,
+            )
+            pivot["合計"] = pivot.sum(axis=1)
+            pivot = pivot[pivot["合計"] != 0].sort_values("合計", ascending=False) / MONEY_SCALE
+            st.dataframe(pivot.style.format("{:,.0f}"), use_container_width=True)
+
+    st.divider()
+
+    # 收支趨勢 / 類別占比（套用上方篩選條件）
+    st.subheader("收支趨勢 / 類別占比")
+    if filtered_df.empty or start_date > end_date:
+        st.info("目前沒有符合條件的紀錄。")
+    else:
+        show_spending_charts(
+            filtered_df, version, start_date, end_date,
+            category_filter, payment_filter, search_query,
+        )
+
+    st.divider()
+    show_rolling_spend()
 
     st.divider()
 
     # 長期統計
     st.subheader("長期統計（全部資料）")
-    if not df.empty:
+    if not df.empty or not rollup.empty:
         c1, c2, c3 = st.columns(3)
         with c1:
             st.markdown(
@@ -468,14 +840,7 @@ def show_bookkeeping_page():
             )
 
         st.markdown("### 依月份統計（卡片式）")
-        month_stats = df.copy()
-        month_stats["月份"] = month_stats["日期"].dt.strftime("%Y-%m")
-        by_month = (
-            month_stats.groupby("月份")[["收入", "實際支出"]]
-            .sum()
-            .rename(columns={"實際支出": "支出"})
-            .sort_values("月份", ascending=True)
-        )
+        by_month = ledger.monthly_summary()
 
         cols = [None, None, None]
         for i, (m, row) in enumerate(by_month.iterrows()):
@@ -503,69 +868,277 @@ def show_bookkeeping_page():
     else:
         st.info("尚無資料可以統計。")
 
+    st.divider()
+    show_budgets()
+    show_recurring_rules()
+    show_statement_import()
+    show_archive_controls()
 
-# ===================== 分頁 2：固定資產 =====================
 
-ASSET_FILE = Path("assets.csv")
-
-ASSET_COLUMNS = [
-    "分類",
-    "小類",
-    "產品名稱",
-    "品牌/型號",
-    "購買日期",
-    "幣別",
-    "金額",
-    "持有天數",
-    "每日均攤費用",
-    "當前狀態(服役中/已除役)",
-    "地點",
-    "備註",
-]
+# ===================== 記帳：近期支出趨勢 =====================
 
+def show_rolling_spend():
+    # 不套用上方篩選條件：一律以今天為準、看全部類別
+    st.subheader("近期支出趨勢")
+    rolling = get_ledger().sync(get_rolling_spend())
+    today = date.today()
 
-def load_assets() -> pd.DataFrame:
-    if ASSET_FILE.exists():
-        df = pd.read_csv(ASSET_FILE)
+    totals = rolling.rolling_totals(today)
+    changes = rolling.month_over_month(today)
+    if totals.empty and changes.empty:
+        st.info(f"最近 {ROLLING_WINDOWS[-1]} 天跟這兩個月都沒有支出。")
+    else:
+        table = totals.join(changes, how="outer")
+        money = [c for c in table.columns if c != "增減%"]
+        table[money] = table[money].fillna(0) / MONEY_SCALE
+        st.dataframe(
+            table.style.format("{:,.0f}", subset=money).format("{:+.1f}%", subset=["增減%"], na_rep="—"),
+            use_container_width=True,
+        )
 
-        # 補齊欄位
-        for col in ASSET_COLUMNS:
-            if col not in df.columns:
-                df[col] = "TWD" if col == "幣別" else None
+    outliers = rolling.outliers(since=today - pd.Timedelta(days=OUTLIER_WINDOW))
+    if outliers.empty:
+        st.caption(f"最近 {OUTLIER_WINDOW} 天沒有特別突出的支出。")
+    else:
+        st.markdown(f"**⚠️ 異常支出**（當天超過該類別前 {OUTLIER_WINDOW} 天中位數的 {OUTLIER_FACTOR} 倍）")
+        outliers["日期"] = outliers["日期"].dt.strftime("%Y-%m-%d")
+        outliers[["當日支出", "中位數"]] = outliers[["當日支出", "中位數"]] / MONEY_SCALE
+        st.dataframe(
+            outliers.style.format({"當日支出": "{:,.0f}", "中位數": "{:,.0f}", "倍數": "{:.1f}×"}),
+            use_container_width=True,
+            hide_index=True,
+        )
 
-        # 型態處理
-        df["金額"] = pd.to_numeric(df["金額"], errors="coerce").fillna(0).astype(int)
-        df["購買日期"] = pd.to_datetime(df["購買日期"], errors="coerce")
 
-        today = pd.to_datetime(date.today())
-        valid_mask = df["購買日期"].notna()
-        df.loc[valid_mask, "持有天數"] = (today - df.loc[valid_mask, "購買日期"]).dt.days + 1
-        df.loc[~valid_mask, "持有天數"] = 1
+# ===================== 記帳：固定收支 =====================
+
+def materialize_recurring(today=None) -> int:
+    # 把所有到期的固定收支一次產生、一次寫檔；回傳新增筆數
+    today = today or date.today()
+    book = current_book()
+    rules = load_active_rules(book.recurring_file)
+    due = due_occurrences(rules, today)
+    if due.empty:
+        return 0
+    with book.recurring_lock:
+        ledger = book.ledger
+        # 已經入帳過的也可能在封存的年度裡；只讀最早到期那天以後的
+        df = ledger.query_all(due["日期"].min())
+        # ID 由帳本新增時重新編號
+        new_rows, updated_rules = materialize(rules, df, today, 1, WEEKDAY_LABELS)
+        if not new_rows.empty:
+            ledger.add_many(new_rows)
+        save_rules(updated_rules, book.recurring_file)
+    return len(new_rows)
+
+
+def show_budgets():
+    with st.expander("💰 每月預算"):
+        st.markdown(
+            '<p class="hint-text">依類別設定每月預算（小類空白 = 整個類別）。'
+            '新增的支出讓類別超過預算時，側邊欄會馬上提醒。</p>',
+            unsafe_allow_html=True,
+        )
+        book = current_book()
+        budgets = load_budgets(book.budget_file)
+        edited_budgets = st.data_editor(
+            budgets,
+            num_rows="dynamic",
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "類別": st.column_config.SelectboxColumn(options=CATEGORY_OPTIONS),
+                "小類": st.column_config.TextColumn(help="空白 = 整個類別"),
+                "每月預算": st.column_config.NumberColumn(min_value=0),
+            },
+            key="budget_editor",
+        )
 
-        df["持有天數"] = pd.to_numeric(df["持有天數"], errors="coerce")
-        df.loc[df["持有天數"].isna() | (df["持有天數"] <= 0), "持有天數"] = 1
-        df["持有天數"] = df["持有天數"].astype(int)
+        if st.button("💾 儲存預算"):
+            budgets = edited_budgets[edited_budgets["類別"].fillna("").astype(str).str.strip() != ""]
+            save_budgets(budgets, book.budget_file)
+            st.success(f"已儲存 {len(budgets)} 筆預算 ✅")
+
+        # 本月用量：每個預算查一次累計表
+        month = date.today().strftime("%Y-%m")
+        totals = get_monthly_totals()
+        usage = pd.DataFrame(
+            [
+                (category, subcategory or "（整個類別）", totals.spent(month, category, subcategory or None), budget)
+                for (category, subcategory), budget in budget_map(budgets).items()
+            ],
+            columns=["類別", "小類", "已花", "預算"],
+        )
+        if not usage.empty:
+            usage["剩餘"] = usage["預算"] - usage["已花"]
+            usage["使用率"] = usage["已花"] / usage["預算"]
+            for col in ["已花", "預算", "剩餘"]:
+                usage[col] = from_minor(usage[col])
+            st.markdown(f"**{month} 預算用量**")
+            st.dataframe(
+                usage.style.format({"已花": "{:,.0f}", "預算": "{:,.0f}", "剩餘": "{:,.0f}", "使用率": "{:.0%}"}),
+                hide_index=True,
+                use_container_width=True,
+            )
 
-        df["每日均攤費用"] = (df["金額"] / df["持有天數"]).round(2)
 
-        return df
-    else:
-        df = pd.DataFrame(columns=ASSET_COLUMNS)
-        df.to_csv(ASSET_FILE, index=False, encoding="utf-8-sig")
-        return df
+def show_recurring_rules():
+    with st.expander("🔁 固定收支（每月自動入帳）"):
+        st.markdown(
+            '<p class="hint-text">每條規則會在每月指定的日期自動新增一筆紀錄（例如 5 號薪資、房租、電話費）。'
+            '同一條規則同一天只會入帳一次。</p>',
+            unsafe_allow_html=True,
+        )
+        rules = load_rules(current_book().recurring_file)
+        edited_rules = st.data_editor(
+            rules,
+            num_rows="dynamic",
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "規則ID": st.column_config.TextColumn(disabled=True),
+                "類別": st.column_config.SelectboxColumn(options=CATEGORY_OPTIONS),
+                "支付方式": st.column_config.SelectboxColumn(options=PAYMENT_OPTIONS),
+                "幣別": st.column_config.SelectboxColumn(options=CURRENCY_OPTIONS, default="TWD"),
+                "收支": st.column_config.SelectboxColumn(options=["支出", "收入"], default="支出"),
+                "金額": st.column_config.NumberColumn(min_value=0),
+                "支出比例": st.column_config.NumberColumn(min_value=0, max_value=100, default=100),
+                "每月幾號": st.column_config.NumberColumn(min_value=1, max_value=31, default=5),
+                "開始日期": st.column_config.DateColumn(),
+                "結束日期": st.column_config.DateColumn(),
+                "上次產生": st.column_config.DateColumn(disabled=True),
+            },
+            key="recurring_editor",
+        )
+
+        if st.button("💾 儲存規則並產生到期項目"):
+            cleaned = edited_rules[edited_rules["項目"].fillna("").astype(str).str.strip() != ""]
+            cleaned = assign_rule_ids(cleaned.reindex(columns=RECURRING_COLUMNS))
+            save_rules(cleaned, current_book().recurring_file)
+            added = materialize_recurring()
+            # 重跑整頁讓明細 / 統計看到新紀錄，訊息先放 session_state 等重跑後再顯示
+            st.session_state["recurring_msg"] = f"已儲存 {len(cleaned)} 條規則，新增 {added} 筆到期紀錄 ✅"
+            st.rerun()
+
+        if "recurring_msg" in st.session_state:
+            st.success(st.session_state.pop("recurring_msg"))
 
 
-def save_assets(df: pd.DataFrame):
-    df_to_save = df.copy()
-    if not df_to_save.empty:
-        df_to_save["購買日期"] = pd.to_datetime(df_to_save["購買日期"], errors="coerce").dt.strftime("%Y-%m-%d")
-    df_to_save.to_csv(ASSET_FILE, index=False, encoding="utf-8-sig")
+# ===================== 記帳：封存舊年度 =====================
+
+def show_archive_controls():
+    # 只在按下按鈕時封存：搬走的紀錄變唯讀，之前的修改也不能再復原，不能每次重跑都自動做
+    with st.expander("🗄️ 封存已結束的年度"):
+        ledger = get_ledger()
+        cutoff = archive_cutoff()
+        cold = int((ledger.df["日期"] < cutoff).sum())
+        st.markdown(
+            f'<p class="hint-text">{cutoff.year} 年以前的紀錄會搬進壓縮的封存檔，之後只能查看、不能修改或刪除；'
+            '統計照樣算得到。封存後，之前的修改就不能再「復原」。</p>',
+            unsafe_allow_html=True,
+        )
+        if cold == 0:
+            st.caption("目前沒有需要封存的紀錄。")
+        elif st.button(f"🗄️ 封存 {cold} 筆舊年度的紀錄"):
+            moved = ledger.archive_closed_years()
+            st.session_state["archive_msg"] = f"已封存 {moved} 筆舊年度的紀錄 🗄️"
+            st.rerun()
+
+        if "archive_msg" in st.session_state:
+            st.success(st.session_state.pop("archive_msg"))
+
+
+# ===================== 記帳：匯入對帳單 =====================
+
+def show_statement_import():
+    with st.expander("💳 匯入信用卡 / 銀行對帳單"):
+        st.markdown(
+            '<p class="hint-text">帳本裡已經有的紀錄（金額、項目相同，日期相差在容許天數內）會自動跳過，只新增真的沒記過的。</p>',
+            unsafe_allow_html=True,
+        )
+        uploaded = st.file_uploader("對帳單（CSV / XLSX）", type=["csv", "xlsx", "xls"], key="statement_file")
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            payment = st.selectbox("支付方式", PAYMENT_OPTIONS, key="statement_payment")
+        with col2:
+            category = st.selectbox("類別", CATEGORY_OPTIONS, index=CATEGORY_OPTIONS.index("其他"), key="statement_category")
+        with col3:
+            subcategory = st.selectbox("小類", SUBCATEGORY_MAP.get(category, ["其他"]), key="statement_subcategory")
+        with col4:
+            days = st.number_input("日期容許誤差（天）", min_value=0, max_value=31, value=STATEMENT_MATCH_DAYS, key="statement_days")
+
+        if "statement_msg" in st.session_state:
+            st.success(st.session_state.pop("statement_msg"))
+        if uploaded is None:
+            return
+
+        try:
+            raw = read_statement(io.BytesIO(uploaded.getvalue()), uploaded.name)
+            rows, skipped = statement_to_rows(raw, payment, category, subcategory)
+        except ValueError as e:
+            st.error(f"讀取對帳單失敗：{e}")
+            return
+
+        ledger = get_ledger()
+        # 對帳單的日期落在封存的年度時，也要跟封存的紀錄比
+        existing = ledger.query_all(*statement_range(rows, int(days))) if not rows.empty else ledger.df
+        new_rows, duplicates = split_new_rows(existing, rows, int(days))
+        summary = f"對帳單共 {len(rows)} 筆：新的 **{len(new_rows)}** 筆、帳本已經有 {len(duplicates)} 筆"
+        if skipped:
+            summary += f"、日期或金額看不懂而略過 {skipped} 筆"
+        st.write(summary)
+
+        if new_rows.empty:
+            return
+        preview = new_rows.copy()
+        preview["日期"] = preview["日期"].dt.strftime("%Y-%m-%d")
+        st.dataframe(preview, use_container_width=True, hide_index=True)
+        if st.button(f"📥 匯入 {len(new_rows)} 筆新紀錄", key="statement_import"):
+            ledger.add_many(new_rows)
+            st.session_state["statement_msg"] = f"已匯入 {len(new_rows)} 筆 ✅"
+            st.rerun()
 
 
+# ===================== 分頁 2：固定資產 =====================
+
+def transaction_label(rows: pd.DataFrame) -> pd.Series:
+    # 「日期 項目 金額 幣別」；沒有列時回傳空的 Series（空的金額欄 map 完會變成 float）
+    if rows.empty:
+        return pd.Series(dtype=str, index=rows.index)
+    amounts = pd.Series(from_minor(rows["支出"]).map("{:,.0f}".format).to_numpy(), index=rows.index)
+    return (
+        rows["日期"].dt.strftime("%Y-%m-%d") + " " + rows["項目"].fillna("").astype(str) + " "
+        + amounts + " " + rows["幣別"].fillna("").astype(str)
+    )
+
+
+def source_transaction_labels(tx_ids: pd.Series) -> pd.Series:
+    # 資產的 交易ID → 「日期 項目 金額 幣別」；找不到（已刪除或已封存）就只顯示編號
+    linked = tx_ids.dropna().astype("int64")
+    if linked.empty:
+        return pd.Series("", index=tx_ids.index)
+    found = get_ledger().rows_by_id(linked)
+    labels = pd.Series(transaction_label(found).to_numpy(), index=found["ID"].to_numpy())
+    out = tx_ids.map(labels).astype(object)
+    missing = tx_ids.notna() & out.isna()
+    out[missing] = "#" + tx_ids[missing].astype("int64").astype(str) + "（已刪除或已封存）"
+    return out.fillna("")
+
+
+@st.fragment
 def show_asset_page():
-    df_assets = load_assets()
+    registry = get_asset_registry()
+    df_assets = registry.df
     today = date.today()
 
+    # 可以連結的支出：最近 ASSET_LINK_LOOKBACK_DAYS 天，新的在前
+    recent = get_ledger().query(
+        start=today - pd.Timedelta(days=ASSET_LINK_LOOKBACK_DAYS),
+        columns=["ID", "日期", "項目", "支出", "幣別"],
+    )
+    recent = recent[recent["支出"] > 0].sort_values("日期", ascending=False)
+    recent_labels = dict(zip(recent["ID"], transaction_label(recent)))
+
     st.header("🧱 固定資產折舊計算")
 
     # 新增資產
@@ -593,14 +1166,48 @@ def show_asset_page():
             status = st.selectbox("當前狀態", ["服役中", "已除役"])
             note = st.text_input("備註", placeholder="例如：團購價、二手購入、含配件…")
 
+        link_mode = st.radio("記帳", ASSET_LINK_MODES, horizontal=True)
+        col3, col4 = st.columns(2)
+        with col3:
+            link_payment = st.selectbox("支付方式（同時記一筆支出時）", PAYMENT_OPTIONS)
+        with col4:
+            link_tx = st.selectbox(
+                f"既有的支出（最近 {ASSET_LINK_LOOKBACK_DAYS} 天）",
+                list(recent_labels),
+                index=None,
+                format_func=recent_labels.get,
+                placeholder="連結既有的支出時選一筆",
+            )
+
         submitted = st.form_submit_button("新增資產")
 
     if submitted:
-        holding_days = (today - purchase_date).days + 1
-        if holding_days <= 0:
-            holding_days = 1
-        daily_cost = round(amount / holding_days, 2) if holding_days > 0 else 0
+        tx_id = None
+        if link_mode == "同時記一筆支出":
+            if amount <= 0:
+                st.error("金額要大於 0 才能同時記成支出。")
+                submitted = False
+            else:
+                paid = get_ledger().add_many([{
+                    "日期": purchase_date,
+                    "類別": asset_category,
+                    "小類": asset_subcategory,
+                    "項目": asset_name,
+                    "支付方式": link_payment,
+                    "幣別": asset_currency,
+                    "支出": int(amount),
+                    "支出比例": 100,
+                    "備註": "固定資產",
+                }])
+                tx_id = int(paid["ID"].iloc[0])
+        elif link_mode == "連結既有的支出":
+            if link_tx is None:
+                st.error("請選擇要連結的支出。")
+                submitted = False
+            tx_id = link_tx
 
+    if submitted:
+        # 持有天數、每日均攤費用由 registry 重算
         new_row = {
             "分類": asset_category,
             "小類": asset_subcategory,
@@ -609,26 +1216,44 @@ def show_asset_page():
             "購買日期": purchase_date,
             "幣別": asset_currency,
             "金額": int(amount),
-            "持有天數": holding_days,
-            "每日均攤費用": daily_cost,
             "當前狀態(服役中/已除役)": status,
             "地點": location,
             "備註": note,
+            "交易ID": tx_id,
         }
 
-        df_assets = pd.concat([df_assets, pd.DataFrame([new_row])], ignore_index=True)
-        save_assets(df_assets)
+        registry.add_many([new_row])
         st.success("已新增固定資產資料 ✅")
-        df_assets = load_assets()
+        df_assets = registry.df
 
     # 資產總覽（可修改 / 刪除）
     st.subheader("固定資產總覽（可修改 / 刪除）")
 
+    groups = get_asset_groups()
+    filters = {}
+    if not df_assets.empty:
+        filter_cols = st.columns(len(ASSET_FILTER_DIMS))
+        for col, dim in zip(filter_cols, ASSET_FILTER_DIMS):
+            with col:
+                filters[dim] = st.multiselect(
+                    ASSET_GROUP_LABELS[dim],
+                    groups.values(dim),
+                    format_func=lambda v: v or "（未填）",
+                    key=f"asset_filter_{dim}",
+                )
+    matched_ids = groups.ids(filters)
+    view_assets = df_assets if matched_ids is None else registry.rows_by_id(matched_ids)
+
     if df_assets.empty:
         st.info("目前尚未登記任何固定資產。")
+    elif view_assets.empty:
+        st.info("沒有符合篩選條件的資產。")
     else:
-        display_df = df_assets.copy()
+        if matched_ids is not None:
+            st.caption(f"符合條件：{len(view_assets)} / {len(df_assets)} 件")
+        display_df = to_major(view_assets)
         display_df["購買日期"] = pd.to_datetime(display_df["購買日期"], errors="coerce").dt.strftime("%Y-%m-%d")
+        display_df["來源交易"] = source_transaction_labels(display_df["交易ID"])
         if "刪除" not in display_df.columns:
             display_df["刪除"] = False
 
@@ -637,7 +1262,7 @@ def show_asset_page():
             "購買日期", "幣別", "金額",
             "持有天數", "每日均攤費用",
             "當前狀態(服役中/已除役)",
-            "地點", "備註", "刪除",
+            "地點", "備註", "來源交易", "刪除",
         ]
         col_order = [c for c in col_order if c in display_df.columns]
 
@@ -647,80 +1272,87 @@ def show_asset_page():
             use_container_width=True,
             hide_index=True,
             column_order=col_order,
+            disabled=["持有天數", "每日均攤費用", "來源交易"],
             key="asset_editor",
         )
 
         if st.button("💾 儲存資產修改 / 刪除"):
-            new_df = df_assets.copy()
-            for idx, row in edited_assets.iterrows():
-                if "刪除" in row and row["刪除"]:
-                    if idx in new_df.index:
-                        new_df = new_df.drop(index=idx)
-                    continue
-
-                try:
-                    new_date = datetime.strptime(str(row["購買日期"]), "%Y-%m-%d")
-                except ValueError:
-                    new_date = None
-
-                try:
-                    new_amount = int(row["金額"]) if str(row["金額"]).strip() != "" else 0
-                except ValueError:
-                    st.error(f"第 {idx} 列金額格式錯誤，請輸入整數")
-                    continue
-
-                if new_date is not None:
-                    holding_days = (today - new_date.date()).days + 1
-                else:
-                    holding_days = 1
-                if holding_days <= 0:
-                    holding_days = 1
-
-                daily_cost = round(new_amount / holding_days, 2) if holding_days > 0 else 0
-
-                if idx in new_df.index:
-                    new_df.loc[idx, "分類"] = row["分類"]
-                    new_df.loc[idx, "小類"] = row["小類"]
-                    new_df.loc[idx, "產品名稱"] = row["產品名稱"]
-                    new_df.loc[idx, "品牌/型號"] = row["品牌/型號"]
-                    if new_date is not None:
-                        new_df.loc[idx, "購買日期"] = new_date
-                    new_df.loc[idx, "幣別"] = row["幣別"]
-                    new_df.loc[idx, "金額"] = new_amount
-                    new_df.loc[idx, "持有天數"] = holding_days
-                    new_df.loc[idx, "每日均攤費用"] = daily_cost
-                    new_df.loc[idx, "當前狀態(服役中/已除役)"] = row["當前狀態(服役中/已除役)"]
-                    new_df.loc[idx, "地點"] = row["地點"]
-                    new_df.loc[idx, "備註"] = row["備註"]
-
-            save_assets(new_df)
+            to_delete = edited_assets["刪除"].fillna(False).astype(bool)
+            kept = edited_assets[~to_delete]
+
+            editable = [c for c in ASSET_EDITABLE_COLUMNS if c in kept.columns]
+            before = display_df.loc[kept.index, editable]
+            after = kept[editable]
+            changed = ~((before == after) | (before.isna() & after.isna())).all(axis=1)
+            kept = kept[changed]
+
+            # 日期看不懂就保留原本的日期
+            new_dates = pd.to_datetime(kept["購買日期"].astype(str), format="%Y-%m-%d", errors="coerce")
+            new_dates = new_dates.fillna(pd.to_datetime(before.loc[kept.index, "購買日期"], errors="coerce"))
+            raw = kept["金額"]
+            blank = raw.isna() | (raw.astype(str).str.strip() == "")
+            new_amount = pd.to_numeric(raw.where(~blank), errors="coerce")
+            bad_amount = (new_amount.isna() & ~blank) | (new_amount.fillna(0) % 1 != 0)
+            for idx in kept.index[bad_amount]:
+                st.error(f"第 {idx} 列金額格式錯誤，請輸入整數")
+
+            updates = kept.loc[~bad_amount, ["ID"] + editable].copy()
+            updates["購買日期"] = new_dates[~bad_amount]
+            updates["金額"] = new_amount[~bad_amount].fillna(0).astype(int)
+
+            registry.apply_changes(update=updates, delete=edited_assets.loc[to_delete, "ID"])
             st.success("已套用資產修改 / 刪除 ✅")
-            df_assets = load_assets()
+            df_assets = registry.df
 
-    # 各幣別每日均攤 → 折合 TWD
     if not df_assets.empty:
+        show_export_controls(
+            "asset_export",
+            [("⬇️ 下載資產表", "assets", df_assets)],
+            [c for c in ASSET_COLUMNS if c in df_assets.columns],
+        )
+
+    # 各幣別每日均攤 → 折合 TWD（篩選條件也套用在這裡）；直接用預先彙總的格子
+    cells = groups.cells(filters)
+    if not cells.empty:
         st.subheader("每日均攤費用（折合 TWD 顯示）")
 
-        tmp = df_assets.copy()
-        tmp["rate"] = tmp["幣別"].map(FX_TO_TWD).fillna(1.0)
-        tmp["每日均攤_TWD"] = (tmp["每日均攤費用"] * tmp["rate"]).round(2)
+        rate = cells["幣別"].map(FX_TO_TWD).fillna(1.0)
+        cells["金額_TWD"] = from_minor(cells["金額"]) * rate
+        cells["每日均攤_TWD"] = from_minor(cells["每日均攤費用"]) * rate
 
-        by_ccy = tmp.groupby("幣別")["每日均攤_TWD"].sum().sort_index()
-        total_twd = tmp["每日均攤_TWD"].sum()
+        by_ccy = cells.groupby("幣別")["每日均攤_TWD"].sum().round(2).sort_index()
+        total_twd = cells["每日均攤_TWD"].sum().round(2)
 
         st.markdown("**各幣別折合 TWD 的每日均攤費用：**")
         for ccy, v in by_ccy.items():
             st.markdown(f"- {ccy}：{v:,.2f} TWD")
 
-        st.markdown(f"**全部資產合計每日均攤：約 {total_twd:,.2f} TWD**")
+        label = "符合條件的資產" if matched_ids is not None else "全部資產"
+        st.markdown(f"**{label}合計每日均攤：約 {total_twd:,.2f} TWD**")
         st.caption("（匯率請到程式 FX_TO_TWD 常數自行調整）")
 
+        group_dim = st.radio(
+            "分組小計",
+            ASSET_FILTER_DIMS,
+            format_func=ASSET_GROUP_LABELS.get,
+            horizontal=True,
+            key="asset_group_by",
+        )
+        by_group = cells.groupby(group_dim)[["件數", "金額_TWD", "每日均攤_TWD"]].sum()
+        by_group = by_group.sort_values("每日均攤_TWD", ascending=False)
+        by_group.index = [v or "（未填）" for v in by_group.index]
+        by_group = by_group.rename(columns={"金額_TWD": "金額（TWD）", "每日均攤_TWD": "每日均攤（TWD）"})
+        st.dataframe(
+            by_group.style.format({"金額（TWD）": "{:,.0f}", "每日均攤（TWD）": "{:,.2f}"}),
+            use_container_width=True,
+        )
+
     # 舊資料一次性匯入
     st.markdown("---")
     with st.expander("📥 舊資料一次性匯入（選用，不常態顯示）"):
         st.write("在下表輸入 / 貼上舊資料，匯入後會自動重算持有天數與每日均攤費用。")
         template_rows = 5
-        template_df = pd.DataFrame(columns=ASSET_COLUMNS).head(template_rows)
+        template_df = pd.DataFrame(columns=[c for c in ASSET_COLUMNS if c != "交易ID"]).head(template_rows)
 
         import_df = st.data_editor(
             template_df,
@@ -730,47 +1362,55 @@ def show_asset_page():
         )
 
         if st.button("🔄 匯入上方資料並加入現有資產"):
-            cleaned = import_df.copy()
-            cleaned = cleaned[cleaned["產品名稱"].astype(str).str.strip() != ""]
+            # 整批檢查，有任何問題就全部列出、一筆都不匯入
+            cleaned, problems = validate_asset_import(import_df, today)
 
             if cleaned.empty:
                 st.warning("沒有有效資料可匯入（至少填一列產品名稱）。")
+            elif not problems.empty:
+                st.error(f"有 {len(problems)} 個問題，請修正後再匯入（這次沒有匯入任何資料）：")
+                st.dataframe(problems, hide_index=True, use_container_width=True)
             else:
-                try:
-                    if "購買日期" in cleaned.columns:
-                        cleaned["購買日期"] = pd.to_datetime(
-                            cleaned["購買日期"], errors="coerce"
-                        )
-                    if "幣別" in cleaned.columns:
-                        cleaned["幣別"] = cleaned["幣別"].fillna("TWD").replace("", "TWD")
-                    cleaned["金額"] = pd.to_numeric(
-                        cleaned["金額"], errors="coerce"
-                    ).fillna(0).astype(int)
-
-                    cleaned["持有天數"] = None
-                    cleaned["每日均攤費用"] = None
-
-                    df_assets2 = pd.concat([df_assets, cleaned], ignore_index=True)
-                    save_assets(df_assets2)
-
-                    st.success(f"已匯入 {len(cleaned)} 筆舊資料，並加入現有資產。")
-                except Exception as e:
-                    st.error(f"匯入時發生錯誤：{e}")
+                # 帳上已經有的、同一批重複貼的都跳過，只追加新的
+                new_rows, duplicates = split_new_assets(cleaned, get_asset_hashes())
+                if not new_rows.empty:
+                    registry.add_many(new_rows)
+                message = f"已匯入 {len(new_rows)} 筆舊資料，並加入現有資產。"
+                if not duplicates.empty:
+                    message += f"（{len(duplicates)} 筆跟現有資產重複，已略過）"
+                st.success(message)
 
 
 # ===================== 主程式：tabs 分頁 =====================
 
 def main():
     st.sidebar.title("功能選單")
+    # 先選帳本，下面所有頁面都用這本
+    show_book_picker()
     st.title("家芬a整合平台")
 
-    tab1, tab2 = st.tabs(["📒 記帳", "🧱 固定資產折舊"])
+    # on_change="rerun" 讓 tabs 記住目前分頁，只執行被選到的那一頁；
+    # 兩個分頁本身是 st.fragment，頁內操作只重跑該頁
+    tab1, tab2 = st.tabs(
+        ["📒 記帳", "🧱 固定資產折舊"],
+        key="main_tabs",
+        on_change="rerun",
+    )
+
+    # 每次整頁載入時補上到期的固定收支（沒有到期項目時不會讀帳本）
+    added = materialize_recurring()
+    if added:
+        st.toast(f"已自動入帳 {added} 筆固定收支 🔁")
 
-    with tab1:
-        show_bookkeeping_page()
+    if tab1.open:
+        # 側邊欄新增會改到資料，要整頁重跑，所以放在 fragment 外面
+        show_add_transaction_sidebar()
+        with tab1:
+            show_bookkeeping_page()
 
-    with tab2:
-        show_asset_page()
+    if tab2.open:
+        with tab2:
+            show_asset_page()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,108 @@
+import threading
+
+import pandas as pd
+
+
+# ===================== 固定資產 分組彙總 =====================
+#
+# 以 (地點, 分類, 狀態, 幣別) 為格子，預先加總件數、金額、每日均攤費用（分），
+# 另外記著每個 地點 / 分類 / 狀態 底下有哪些資產 ID。
+# 新增、修改、匯入時只加減受影響的格子跟名單，資產頁依地點或狀態篩選、
+# 看各組小計時直接查表，不用每次重跑都對整張資產表 groupby。
+
+ASSET_GROUP_DIMS = ["地點", "分類", "當前狀態(服役中/已除役)", "幣別"]
+ASSET_GROUP_MEASURES = ["件數", "金額", "每日均攤費用"]
+# 可以拿來篩選的欄位（幣別只用來換算，不篩）
+ASSET_FILTER_DIMS = ["地點", "分類", "當前狀態(服役中/已除役)"]
+
+
+def _dim_values(df: pd.DataFrame) -> pd.DataFrame:
+    # 沒填的當成空字串，自成一組
+    return df.reindex(columns=ASSET_GROUP_DIMS).fillna("").astype(str)
+
+
+def cells_from_assets(df: pd.DataFrame) -> pd.DataFrame:
+    if df.empty:
+        return pd.DataFrame(columns=ASSET_GROUP_DIMS + ASSET_GROUP_MEASURES)
+    tmp = _dim_values(df)
+    tmp["件數"] = 1
+    for col in ["金額", "每日均攤費用"]:
+        tmp[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype("int64")
+    return tmp.groupby(ASSET_GROUP_DIMS)[ASSET_GROUP_MEASURES].sum().reset_index()
+
+
+class AssetGroupIndex:
+    def __init__(self):
+        self.version = None
+        self._cells = {}
+        self._members = {dim: {} for dim in ASSET_FILTER_DIMS}
+        self._lock = threading.Lock()
+
+    def _index_members(self, df: pd.DataFrame, sign: int):
+        values = _dim_values(df)
+        for dim in ASSET_FILTER_DIMS:
+            members = self._members[dim]
+            for asset_id, value in zip(df["ID"], values[dim]):
+                if sign > 0:
+                    members.setdefault(value, set()).add(int(asset_id))
+                else:
+                    group = members.get(value, set())
+                    group.discard(int(asset_id))
+                    if not group:
+                        members.pop(value, None)
+
+    def build(self, df: pd.DataFrame, version=None):
+        with self._lock:
+            self._cells = {}
+            self._members = {dim: {} for dim in ASSET_FILTER_DIMS}
+            for *key, count, amount, daily in cells_from_assets(df).itertuples(index=False):
+                self._cells[tuple(key)] = [int(count), int(amount), int(daily)]
+            if not df.empty:
+                self._index_members(df, +1)
+            self.version = version
+
+    def apply(self, removed: pd.DataFrame, added: pd.DataFrame, version=None):
+        # 修改 = 扣掉舊列 + 加上新列
+        with self._lock:
+            for frame, sign in ((removed, -1), (added, +1)):
+                for *key, count, amount, daily in cells_from_assets(frame).itertuples(index=False):
+                    cell = self._cells.setdefault(tuple(key), [0, 0, 0])
+                    cell[0] += sign * int(count)
+                    cell[1] += sign * int(amount)
+                    cell[2] += sign * int(daily)
+                    if cell[0] == 0:
+                        del self._cells[tuple(key)]
+                if not frame.empty:
+                    self._index_members(frame, sign)
+            self.version = version
+
+    def values(self, dim) -> list:
+        # 某個欄位目前有哪些值（給篩選用）
+        with self._lock:
+            return sorted(self._members[dim])
+
+    def ids(self, filters=None) -> list:
+        # filters：{欄位: [值, ...]}，同一欄位的值是「或」，不同欄位是「且」；空的條件 = 不限
+        # 回傳符合的資產 ID（由小到大）；沒有任何條件時回傳 None，代表全部
+        filters = {dim: vals for dim, vals in (filters or {}).items() if vals}
+        if not filters:
+            return None
+        with self._lock:
+            result = None
+            for dim, vals in filters.items():
+                members = self._members[dim]
+                matched = set().union(*(members.get(v, set()) for v in vals))
+                result = matched if result is None else result & matched
+        return sorted(result)
+
+    def cells(self, filters=None) -> pd.DataFrame:
+        filters = {dim: set(vals) for dim, vals in (filters or {}).items() if vals}
+        positions = {dim: ASSET_GROUP_DIMS.index(dim) for dim in filters}
+        with self._lock:
+            items = list(self._cells.items())
+        rows = [
+            (*key, *measures)
+            for key, measures in items
+            if all(key[positions[dim]] in vals for dim, vals in filters.items())
+        ]
+        return pd.DataFrame(rows, columns=ASSET_GROUP_DIMS + ASSET_GROUP_MEASURES)
@@ -0,0 +1,118 @@
+import threading
+from datetime import date
+
+import pandas as pd
+
+from ledger import ASSET_COLUMNS, CURRENCY_OPTIONS, to_minor
+
+
+# ===================== 固定資產 批次匯入 =====================
+#
+# 貼上來的舊資料整批檢查（日期、金額、幣別、狀態），有問題就一次列出全部，
+# 一筆都不匯入；都沒問題才算折舊、加進資產表。
+# 重複判斷用內容 hash：同一件資產（分類、品名、型號、購買日期、幣別、金額都一樣）
+# 不管是帳上已經有、還是同一批貼了兩次，都只留一筆。
+# 帳上資產的 hash 跟著資產表的寫入增量更新，檢查時不用每次重算整張表。
+
+# 這幾欄都一樣就當成同一件資產
+ASSET_IDENTITY_COLUMNS = ["分類", "小類", "產品名稱", "品牌/型號", "購買日期", "幣別", "金額"]
+ASSET_STATUS_OPTIONS = ["服役中", "已除役"]
+ASSET_STATUS_COLUMN = "當前狀態(服役中/已除役)"
+
+
+def asset_content_hash(df: pd.DataFrame) -> pd.Series:
+    # 金額請給「分」；文字去掉頭尾空白、日期只看到日，跟帳上的資產用同一套算法
+    key = pd.DataFrame(index=df.index)
+    for col in ASSET_IDENTITY_COLUMNS:
+        if col == "購買日期":
+            key[col] = pd.to_datetime(df[col], errors="coerce").dt.strftime("%Y-%m-%d").fillna("")
+        elif col == "金額":
+            key[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype("int64")
+        else:
+            key[col] = df[col].fillna("").astype(str).str.strip()
+    return pd.util.hash_pandas_object(key, index=False)
+
+
+def _problems(rows: pd.DataFrame, mask: pd.Series, column, message) -> pd.DataFrame:
+    return pd.DataFrame({"列": rows.index[mask] + 1, "欄位": column, "問題": message})
+
+
+def validate_asset_import(raw: pd.DataFrame, today=None):
+    # 回傳 (整理好的列（金額單位：元）, 問題清單 DataFrame[列, 欄位, 問題])；
+    # 產品名稱空白的列當作沒填，直接略過
+    today = pd.Timestamp(today or date.today())
+    df = raw.reindex(columns=[c for c in ASSET_COLUMNS if c != "交易ID"])
+    text = df.astype("object").where(df.notna(), "").astype(str).apply(lambda col: col.str.strip())
+    keep = text["產品名稱"] != ""
+    df, text = df[keep].copy(), text[keep]
+
+    raw_date = text["購買日期"]
+    dates = pd.to_datetime(raw_date.where(raw_date != ""), errors="coerce", format="mixed")
+    raw_amount = text["金額"]
+    amounts = pd.to_numeric(raw_amount.where(raw_amount != ""), errors="coerce")
+    currency = text["幣別"].replace("", "TWD")
+    status = text[ASSET_STATUS_COLUMN].replace("", ASSET_STATUS_OPTIONS[0])
+
+    errors = pd.concat(
+        [
+            _problems(df, (raw_date != "") & dates.isna(), "購買日期", "看不懂的日期（請用 YYYY-MM-DD）"),
+            _problems(df, dates > today, "購買日期", "購買日期在未來"),
+            _problems(df, amounts.isna(), "金額", "金額空白或不是數字"),
+            _problems(df, amounts.notna() & ((amounts < 0) | (amounts % 1 != 0)), "金額", "金額要是 0 以上的整數"),
+            _problems(df, ~currency.isin(CURRENCY_OPTIONS), "幣別", f"幣別只能是 {'、'.join(CURRENCY_OPTIONS)}"),
+            _problems(df, ~status.isin(ASSET_STATUS_OPTIONS), "狀態", f"狀態只能是 {'、'.join(ASSET_STATUS_OPTIONS)}"),
+        ],
+        ignore_index=True,
+    ).sort_values(["列", "欄位"], ignore_index=True)
+
+    for col in ["分類", "小類", "產品名稱", "品牌/型號", "地點", "備註"]:
+        df[col] = text[col]
+    df["購買日期"] = dates
+    df["金額"] = amounts.fillna(0)
+    df["幣別"] = currency
+    df[ASSET_STATUS_COLUMN] = status
+    return df, errors
+
+
+def split_new_assets(rows: pd.DataFrame, index: "AssetHashIndex"):
+    # rows 金額單位：元。回傳 (要新增的, 重複的)：帳上已經有的、同一批前面已經出現過的都算重複
+    if rows.empty:
+        return rows, rows
+    minor = rows.assign(金額=to_minor(rows["金額"]).to_numpy())
+    hashes = asset_content_hash(minor)
+    duplicate = index.known(hashes) | hashes.duplicated()
+    return rows[~duplicate], rows[duplicate]
+
+
+class AssetHashIndex:
+    def __init__(self):
+        self.version = None
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def _add(self, df: pd.DataFrame, sign: int):
+        if df.empty:
+            return
+        for h, n in asset_content_hash(df).value_counts().items():
+            count = self._counts.get(h, 0) + sign * int(n)
+            if count > 0:
+                self._counts[h] = count
+            else:
+                self._counts.pop(h, None)
+
+    def build(self, df: pd.DataFrame, version=None):
+        with self._lock:
+            self._counts = {}
+            self._add(df, +1)
+            self.version = version
+
+    def apply(self, removed: pd.DataFrame, added: pd.DataFrame, version=None):
+        with self._lock:
+            self._add(removed, -1)
+            self._add(added, +1)
+            self.version = version
+
+    def known(self, hashes: pd.Series) -> pd.Series:
+        with self._lock:
+            existing = list(self._counts)
+        return hashes.isin(existing)
@@ -0,0 +1,70 @@
+import threading
+
+import pandas as pd
+
+
+# ===================== 固定資產 ↔ 記帳 連結索引 =====================
+#
+# 資產表的「交易ID」欄記著付這筆錢的記帳紀錄（可以空白）。
+# 這裡維護雙向對照：資產 ID → 交易 ID、交易 ID → {資產 ID: 產品名稱}，
+# 跟著資產表的寫入增量更新，資產頁要顯示來源交易、記帳頁要標出哪些是買資產的，
+# 都只要查字典，不用每次重跑都把兩張表 join 起來。
+
+
+class AssetLinkIndex:
+    def __init__(self):
+        self.version = None
+        self._tx_of_asset = {}
+        self._assets_of_tx = {}
+        self._lock = threading.Lock()
+
+    def _add(self, asset_id, tx_id, name):
+        self._tx_of_asset[asset_id] = tx_id
+        self._assets_of_tx.setdefault(tx_id, {})[asset_id] = name
+
+    def _remove(self, asset_id):
+        tx_id = self._tx_of_asset.pop(asset_id, None)
+        if tx_id is None:
+            return
+        assets = self._assets_of_tx.get(tx_id, {})
+        assets.pop(asset_id, None)
+        if not assets:
+            self._assets_of_tx.pop(tx_id, None)
+
+    def _index_rows(self, df: pd.DataFrame):
+        linked = df[df["交易ID"].notna()] if "交易ID" in df.columns else df.iloc[0:0]
+        for asset_id, tx_id, name in zip(linked["ID"], linked["交易ID"], linked["產品名稱"].fillna("")):
+            self._add(int(asset_id), int(tx_id), str(name))
+
+    def build(self, df: pd.DataFrame, version=None):
+        with self._lock:
+            self._tx_of_asset = {}
+            self._assets_of_tx = {}
+            self._index_rows(df)
+            self.version = version
+
+    def apply(self, removed: pd.DataFrame, added: pd.DataFrame, version=None):
+        # 修改 = 拿掉舊連結 + 放上新連結
+        with self._lock:
+            for asset_id in pd.concat([removed["ID"], added["ID"]]):
+                self._remove(int(asset_id))
+            self._index_rows(added)
+            self.version = version
+
+    def transaction_of(self, asset_id):
+        with self._lock:
+            return self._tx_of_asset.get(int(asset_id))
+
+    def assets_of(self, tx_id) -> dict:
+        with self._lock:
+            return dict(self._assets_of_tx.get(int(tx_id), {}))
+
+    def linked_transactions(self) -> set:
+        with self._lock:
+            return set(self._assets_of_tx)
+
+    def labels(self, tx_ids: pd.Series) -> pd.Series:
+        # 記帳列的 ID → 「🧱 產品名稱」（沒有連結的是空字串）
+        with self._lock:
+            names = {tx: "🧱 " + "、".join(assets.values()) for tx, assets in self._assets_of_tx.items()}
+        return tx_ids.map(names).fillna("")
@@ -0,0 +1,142 @@
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from asset_groups import AssetGroupIndex
+from asset_import import AssetHashIndex
+from asset_links import AssetLinkIndex
+from budgets import BUDGET_FILE, MonthlyTotals, budget_totals_path
+from ledger import ASSET_FILE, DATA_FILE, RECURRING_FILE, AssetRegistry, Ledger
+from rolling_spend import RollingSpend
+from search_index import SearchIndex
+from spending_cube import SpendingCube
+
+
+# ===================== 多本帳本 =====================
+#
+# 每本帳本一個資料夾（ledgers/<名稱>/），裡面各自有 transactions.csv / assets.csv /
+# recurring.csv。「預設」帳本就是目前的資料夾，原本的單一帳本不用搬。
+#
+# 帳本第一次用到才讀檔。讀進記憶體的帳本用 LRU 管理：總大小超過上限時，
+# 從最久沒用的開始丟掉（檔案都在，下次用到再讀），只有常用的會留在記憶體裡。
+
+LEDGERS_DIR = Path("ledgers")
+DEFAULT_BOOK = "預設"
+
+# 帳本名稱就是資料夾名稱：不能有斜線、不能用 . 開頭
+BOOK_NAME_PATTERN = re.compile(r"^[^/\\.][^/\\]{0,39}$")
+
+# 記憶體裡最多放多少 MB 的帳本（超過就把最久沒用的帳本丟掉，下次用到再讀）
+BOOK_POOL_MAX_MB = 256
+
+
+def book_dir(name) -> Path:
+    if name == DEFAULT_BOOK:
+        return Path(".")
+    return LEDGERS_DIR / name
+
+
+def list_books():
+    names = [DEFAULT_BOOK]
+    if LEDGERS_DIR.is_dir():
+        names += sorted(p.name for p in LEDGERS_DIR.iterdir() if p.is_dir() and p.name != DEFAULT_BOOK)
+    return names
+
+
+def create_book(name) -> Path:
+    if not BOOK_NAME_PATTERN.match(name or "") or name == DEFAULT_BOOK:
+        raise ValueError("帳本名稱不能空白、不能有斜線、不能用 . 開頭，最多 40 個字")
+    path = book_dir(name)
+    if path.exists():
+        raise ValueError(f"帳本「{name}」已經存在")
+    path.mkdir(parents=True)
+    return path
+
+
+class Book:
+    # 一本帳本用到的所有東西：記帳、固定資產、固定收支，以及它們的索引 / 彙總 / 連結
+    def __init__(self, name):
+        self.name = name
+        self.dir = book_dir(name)
+        self.ledger = Ledger(self.dir / DATA_FILE.name)
+        self.assets = AssetRegistry(self.dir / ASSET_FILE.name)
+        self.recurring_file = self.dir / RECURRING_FILE.name
+        self.budget_file = self.dir / BUDGET_FILE.name
+        self.search_index = SearchIndex(["項目", "備註"])
+        self.cube = SpendingCube()
+        self.rolling = RollingSpend()
+        self.ledger.subscribe(self.search_index)
+        self.ledger.subscribe(self.cube)
+        self.ledger.subscribe(self.rolling)
+        # 預算用的每月累計，另外存一份在帳本旁邊
+        self.monthly_totals = MonthlyTotals(budget_totals_path(self.ledger.path))
+        self.ledger.subscribe(self.monthly_totals)
+        self.asset_links = AssetLinkIndex()
+        self.asset_groups = AssetGroupIndex()
+        self.assets.subscribe(self.asset_links)
+        self.assets.subscribe(self.asset_groups)
+        self.asset_hashes = AssetHashIndex()
+        self.assets.subscribe(self.asset_hashes)
+        # 多個 session 同時觸發固定收支時，一次只讓一個去讀帳本、產生、寫檔
+        self.recurring_lock = threading.Lock()
+
+    def nbytes(self) -> int:
+        # 只算已經讀進記憶體的表
+        return self.ledger.nbytes() + self.assets.nbytes()
+
+
+class BookPool:
+    def __init__(self, max_bytes: int = BOOK_POOL_MAX_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._books = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name) -> Book:
+        with self._lock:
+            book = self._books.get(name)
+            if book is None:
+                # 只建物件，真正讀檔等第一次用到資料時才做
+                book = self._books[name] = Book(name)
+            self._books.move_to_end(name)
+            self._evict(keep=name)
+            return book
+
+    def _evict(self, keep):
+        sizes = {name: book.nbytes() for name, book in self._books.items()}
+        total = sum(sizes.values())
+        for name in list(self._books):
+            if total <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            # 還拿著這本的 session 可以繼續用完這一輪，下次 get 會重新讀
+            del self._books[name]
+            total -= sizes[name]
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(book.nbytes() for book in self._books.values())
+
+    def __len__(self):
+        return len(self._books)
+
+
+# 開機預熱（warmup.py）先建好的帳本池，server 第一次要帳本池時直接接手；
+# 預熱還沒做完也沒關係，表都有鎖，接手的 session 會等那張表讀完，不會重讀
+_prewarmed_pool = None
+_prewarmed_lock = threading.Lock()
+
+
+def offer_pool(pool: BookPool):
+    global _prewarmed_pool
+    with _prewarmed_lock:
+        _prewarmed_pool = pool
+
+
+def take_prewarmed_pool():
+    # 只能接手一次（之後清掉快取重建時就是全新的帳本池）
+    global _prewarmed_pool
+    with _prewarmed_lock:
+        pool, _prewarmed_pool = _prewarmed_pool, None
+        return pool
@@ -0,0 +1,148 @@
+import json
+import os
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+from ledger import to_minor
+
+
+# ===================== 每月預算 =====================
+#
+# 預算存在 budgets.csv：每列是一個 類別（小類空白 = 整個類別）的每月預算（元）。
+# 每個 (月份, 類別, 小類) 的實際支出累計放在記憶體裡，跟著記帳的新增 / 修改 / 刪除
+# 加減，另外存一份在帳本旁邊（transactions.budget.json，記著帳本版本）；
+# 重開時版本對得上就直接讀回來。查某個類別這個月花了多少只要查字典，
+# 每按一次 Add 都不用掃這個月的明細。
+
+BUDGET_FILE = Path("budgets.csv")
+BUDGET_COLUMNS = ["類別", "小類", "每月預算"]
+# 預算用到幾 % 開始提醒
+BUDGET_WARN_RATIO = 0.8
+
+
+def budget_totals_path(ledger_path) -> Path:
+    ledger_path = Path(ledger_path)
+    return ledger_path.with_name(ledger_path.stem + ".budget.json")
+
+
+def load_budgets(path) -> pd.DataFrame:
+    path = Path(path)
+    if path.exists():
+        budgets = pd.read_csv(path, dtype={"類別": str, "小類": str}).reindex(columns=BUDGET_COLUMNS)
+    else:
+        budgets = pd.DataFrame(columns=BUDGET_COLUMNS)
+    budgets["每月預算"] = pd.to_numeric(budgets["每月預算"], errors="coerce").astype("float64")
+    return budgets
+
+
+def save_budgets(budgets: pd.DataFrame, path):
+    budgets.reindex(columns=BUDGET_COLUMNS).to_csv(path, index=False, encoding="utf-8-sig")
+
+
+def budget_map(budgets: pd.DataFrame) -> dict:
+    # (類別, 小類 或 "") → 每月預算（分）；同一組重複填的以最後一列為準
+    if budgets.empty:
+        return {}
+    keys = zip(budgets["類別"].fillna("").astype(str).str.strip(), budgets["小類"].fillna("").astype(str).str.strip())
+    return {key: int(v) for key, v in zip(keys, to_minor(budgets["每月預算"])) if key[0] and v > 0}
+
+
+def _month_totals(df: pd.DataFrame) -> pd.Series:
+    # 明細 → (月份, 類別, 小類) 的實際支出（分）；只看有支出的列
+    if df.empty:
+        return pd.Series(dtype="int64")
+    spent = pd.to_numeric(df["實際支出"], errors="coerce").fillna(0).astype("int64")
+    rows = df[spent != 0]
+    keys = [
+        pd.to_datetime(rows["日期"]).dt.strftime("%Y-%m"),
+        rows["類別"].fillna("").astype(str),
+        rows["小類"].fillna("").astype(str),
+    ]
+    return spent[spent != 0].groupby(keys).sum()
+
+
+def _jsonable(version):
+    # 版本是巢狀 tuple，存成 JSON 後會變成 list，比對前兩邊都轉成一樣的形式
+    return json.loads(json.dumps(version))
+
+
+class MonthlyTotals:
+    def __init__(self, path=None):
+        self.path = Path(path) if path is not None else None
+        self.version = None
+        # (月份, 類別, 小類) → 分；(月份, 類別, None) 是整個類別的合計
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def _add(self, df: pd.DataFrame, sign: int):
+        for (month, category, subcategory), spent in _month_totals(df).items():
+            for key in ((month, category, subcategory), (month, category, None)):
+                total = self._totals.get(key, 0) + sign * int(spent)
+                if total:
+                    self._totals[key] = total
+                else:
+                    self._totals.pop(key, None)
+
+    def _load(self, version) -> bool:
+        if self.path is None or not self.path.exists():
+            return False
+        try:
+            saved = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return False
+        if saved.get("version") != _jsonable(version):
+            return False
+        self._totals = {
+            (month, category, subcategory): total
+            for month, category, subcategory, total in saved["totals"]
+        }
+        return True
+
+    def _persist(self):
+        if self.path is None:
+            return
+        data = {
+            "version": _jsonable(self.version),
+            "totals": [[m, c, s, t] for (m, c, s), t in self._totals.items()],
+        }
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        try:
+            tmp_path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp_path, self.path)
+        except OSError:
+            # 寫不進去就算了，下次重開再從明細算
+            tmp_path.unlink(missing_ok=True)
+
+    def build(self, df: pd.DataFrame, version=None):
+        with self._lock:
+            if version is not None and self._load(version):
+                self.version = version
+                return
+            self._totals = {}
+            self._add(df, +1)
+            self.version = version
+            self._persist()
+
+    def apply(self, removed: pd.DataFrame, added: pd.DataFrame, version=None):
+        with self._lock:
+            self._add(removed, -1)
+            self._add(added, +1)
+            self.version = version
+            self._persist()
+
+    def spent(self, month, category, subcategory=None) -> int:
+        # 某月某類別（subcategory=None）或某小類的實際支出（分）；month 是 "YYYY-MM"
+        with self._lock:
+            return self._totals.get((month, category, subcategory), 0)
+
+    def budget_status(self, budgets: dict, month, category, subcategory=None) -> list:
+        # 這個類別 / 小類有設的預算：[(名稱, 已花, 預算)]，金額單位：分
+        status = []
+        if (category, "") in budgets:
+            status.append((category, self.spent(month, category), budgets[(category, "")]))
+        if subcategory and (category, subcategory) in budgets:
+            label = f"{category} / {subcategory}"
+            status.append((label, self.spent(month, category, subcategory), budgets[(category, subcategory)]))
+        return status
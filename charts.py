@@ -0,0 +1,122 @@
+import io
+import warnings
+
+import pandas as pd
+from matplotlib import font_manager
+from matplotlib.figure import Figure
+from matplotlib.ticker import FuncFormatter
+
+from ledger import MONEY_SCALE
+
+
+# ===================== 圖表（matplotlib） =====================
+#
+# 不用 pyplot：每張圖自己建一個 Figure，多個 session 同時畫也不會互相干擾。
+# 期間越長，就用越粗的時間單位加總（日 → 週 → 月 → 季 → 年），
+# 一張趨勢圖最多 CHART_MAX_POINTS 個點：十年的日資料也只會畫成 120 個月。
+# 畫好的 PNG 由呼叫端依 (篩選條件, 資料版本) 快取，資料沒變就不會重畫。
+
+CHART_MAX_POINTS = 120
+# (pandas 的 period 代碼, 顯示用的單位)，由細到粗
+CHART_FREQUENCIES = [("D", "日"), ("W", "週"), ("M", "月"), ("Q", "季"), ("Y", "年")]
+# 類別占比只列前幾名，其餘併成「其他」
+SHARE_TOP_N = 8
+
+INCOME_COLOR = "#2e7d32"
+EXPENSE_COLOR = "#c62828"
+
+# 有裝中文字型就用，沒有的話中文會變成方塊，但圖一樣畫得出來
+CJK_FONTS = ["Noto Sans CJK TC", "Noto Sans TC", "Microsoft JhengHei", "PingFang TC", "Heiti TC", "Arial Unicode MS"]
+_installed = {f.name for f in font_manager.fontManager.ttflist}
+CHART_FONTS = [f for f in CJK_FONTS if f in _installed] + ["DejaVu Sans"]
+if len(CHART_FONTS) == 1:
+    # 每個缺字都會警告一次，會把 log 洗版
+    warnings.filterwarnings("ignore", message="Glyph .* missing from font", category=UserWarning)
+
+
+def chart_frequency(start, end):
+    # 回傳 (period 代碼, 單位)：點數不超過 CHART_MAX_POINTS 的最細單位
+    for freq, unit in CHART_FREQUENCIES:
+        if len(pd.period_range(pd.Timestamp(start), pd.Timestamp(end), freq=freq)) <= CHART_MAX_POINTS:
+            return freq, unit
+    return CHART_FREQUENCIES[-1]
+
+
+def trend_points(df: pd.DataFrame, start, end) -> pd.DataFrame:
+    # 依時間單位加總 收入 / 實際支出（元），沒有紀錄的區間補 0，點數有上限
+    freq, _ = chart_frequency(start, end)
+    periods = pd.period_range(pd.Timestamp(start), pd.Timestamp(end), freq=freq)
+    if df.empty:
+        points = pd.DataFrame(0, index=periods, columns=["收入", "支出"])
+    else:
+        grouped = df.groupby(df["日期"].dt.to_period(freq))[["收入", "實際支出"]].sum()
+        points = grouped.rename(columns={"實際支出": "支出"}).reindex(periods, fill_value=0)
+    return points / MONEY_SCALE
+
+
+def category_share(df: pd.DataFrame, top_n: int = SHARE_TOP_N) -> pd.Series:
+    # 各類別實際支出（元），由大到小；超過 top_n 類的併成「其他」
+    if df.empty:
+        return pd.Series(dtype="float64")
+    share = df.groupby("類別")["實際支出"].sum()
+    share = share[share > 0].sort_values(ascending=False)
+    if len(share) > top_n:
+        rest = share.iloc[top_n:].sum()
+        share = share.iloc[:top_n]
+        share["其他"] = share.get("其他", 0) + rest
+    return share / MONEY_SCALE
+
+
+def _new_figure(width=7.0, height=3.2) -> Figure:
+    fig = Figure(figsize=(width, height), dpi=100, layout="constrained")
+    fig.set_facecolor("white")
+    return fig
+
+
+def _png(fig: Figure) -> bytes:
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png")
+    return buf.getvalue()
+
+
+def _money_axis(axis):
+    axis.set_major_formatter(FuncFormatter(lambda v, _: f"{v:,.0f}"))
+
+
+def render_trend(points: pd.DataFrame, unit: str) -> bytes:
+    fig = _new_figure()
+    ax = fig.add_subplot()
+    x = points.index.to_timestamp()
+    # 點少的時候標出每個點，點多就只畫線
+    marker = "o" if len(points) <= 40 else None
+    ax.plot(x, points["收入"], color=INCOME_COLOR, marker=marker, markersize=3, label="收入")
+    ax.plot(x, points["支出"], color=EXPENSE_COLOR, marker=marker, markersize=3, label="支出")
+    ax.set_title(f"收支趨勢（每{unit}）", fontfamily=CHART_FONTS)
+    _money_axis(ax.yaxis)
+    ax.grid(axis="y", alpha=0.3)
+    ax.legend(prop={"family": CHART_FONTS}, frameon=False)
+    fig.autofmt_xdate()
+    return _png(fig)
+
+
+def render_share(share: pd.Series) -> bytes:
+    fig = _new_figure(height=max(2.0, 0.4 * len(share) + 0.8))
+    ax = fig.add_subplot()
+    share = share.iloc[::-1]
+    bars = ax.barh(share.index, share.values, color=EXPENSE_COLOR, alpha=0.8)
+    total = share.sum()
+    ax.bar_label(bars, labels=[f"{v / total:.0%}" for v in share.values], padding=3, fontsize=8)
+    ax.set_title("類別占比（實際支出）", fontfamily=CHART_FONTS)
+    _money_axis(ax.xaxis)
+    for label in ax.get_yticklabels():
+        label.set_fontfamily(CHART_FONTS)
+    ax.margins(x=0.12)
+    return _png(fig)
+
+
+def spending_charts(df: pd.DataFrame, start, end):
+    # 回傳 (趨勢圖 PNG, 類別占比 PNG 或 None)
+    _, unit = chart_frequency(start, end)
+    trend = render_trend(trend_points(df, start, end), unit)
+    share = category_share(df)
+    return trend, (render_share(share) if not share.empty else None)
@@ -0,0 +1,209 @@
+"""家芬a整合平台的命令列工具（不需要 Streamlit，可以給 cron 排程用）。
+
+用法：
+    python cli.py ingest 舊帳.xlsx 信用卡.csv
+    python cli.py import-statement 魔法小卡_2025-01.csv --payment 魔法小卡
+    python cli.py recurring
+    python cli.py recompute-assets
+    python cli.py summary --month 2025-01 --out summary.csv
+    python cli.py archive
+    python cli.py --ledger 小明 summary
+"""
+import argparse
+import os
+import sys
+import zipfile
+from datetime import date
+
+import pandas as pd
+
+import ledger
+from books import book_dir
+from recurring import due_occurrences, materialize, save_rules
+from statement_import import STATEMENT_MATCH_DAYS, read_statement, split_new_rows, statement_range, statement_to_rows
+
+
+# 讀檔失敗會丟的例外：找不到檔案、空檔、格式或日期看不懂（pandas 的讀檔錯誤都是 ValueError）、
+# 副檔名是 .xlsx 但內容不是 Excel
+READ_ERRORS = (OSError, ValueError, zipfile.BadZipFile)
+
+
+def read_ingest_file(path) -> pd.DataFrame:
+    # 讀進來先檢查日期欄，壞掉的檔案在寫入任何東西之前就擋下來
+    frame = ledger.read_table(path)
+    if not frame.empty:
+        if "日期" not in frame.columns:
+            raise ValueError("缺少「日期」欄")
+        pd.to_datetime(frame["日期"])
+    return frame
+
+
+def fail(path, error) -> int:
+    print(f"{path}: 讀取失敗：{error}", file=sys.stderr)
+    return 1
+
+
+def cmd_ingest(args) -> int:
+    # 多個檔案先合併，最後只寫一次檔（欄位整理、金額換算由 Ledger 處理）
+    frames = []
+    for path in args.files:
+        try:
+            frame = read_ingest_file(path)
+        except READ_ERRORS as e:
+            return fail(path, e)
+        print(f"{path}: {len(frame)} 筆")
+        frames.append(frame)
+    incoming = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=ledger.COLUMNS)
+    if incoming.empty:
+        print("沒有資料可匯入。")
+        return 0
+
+    if args.dry_run:
+        print(f"（dry run）將新增 {len(incoming)} 筆，未寫入。")
+        return 0
+    ledger.Ledger().add_many(incoming)
+    print(f"已匯入 {len(incoming)} 筆到 {ledger.DATA_FILE}")
+    return 0
+
+
+def cmd_import_statement(args) -> int:
+    # 對帳單：帳本裡已經有的（金額、項目相同，日期相差 --days 天內）跳過
+    book = ledger.Ledger()
+    total = 0
+    for path in args.files:
+        try:
+            rows, skipped = statement_to_rows(
+                read_statement(path), args.payment, args.category, args.subcategory,
+            )
+        except READ_ERRORS as e:
+            return fail(path, e)
+        existing = book.query_all(*statement_range(rows, args.days)) if not rows.empty else book.df
+        new_rows, duplicates = split_new_rows(existing, rows, args.days)
+        print(f"{path}: {len(rows)} 筆，新的 {len(new_rows)} 筆、已存在 {len(duplicates)} 筆、略過 {skipped} 筆")
+        if not args.dry_run and not new_rows.empty:
+            book.add_many(new_rows)
+        total += len(new_rows)
+    if args.dry_run:
+        print(f"（dry run）將新增 {total} 筆，未寫入。")
+    else:
+        print(f"已匯入 {total} 筆到 {ledger.DATA_FILE}")
+    return 0
+
+
+def cmd_recurring(args) -> int:
+    today = date.fromisoformat(args.today) if args.today else date.today()
+    rules = ledger.load_active_rules()
+    if rules.empty:
+        print("沒有固定收支規則。")
+        return 0
+    book = ledger.Ledger()
+    due = due_occurrences(rules, today)
+    # 封存年度裡已經入帳的也要算，只讀最早到期那天以後的
+    existing = book.query_all(due["日期"].min()) if not due.empty else book.df
+    new_rows, updated_rules = materialize(rules, existing, today, 1, ledger.WEEKDAY_LABELS)
+    if not new_rows.empty:
+        book.add_many(new_rows)
+    save_rules(updated_rules, ledger.RECURRING_FILE)
+    print(f"已產生 {len(new_rows)} 筆到期的固定收支。")
+    return 0
+
+
+def cmd_recompute_assets(args) -> int:
+    if not ledger.ASSET_FILE.exists():
+        print(f"找不到 {ledger.ASSET_FILE}")
+        return 1
+    today = date.fromisoformat(args.today) if args.today else date.today()
+    df_assets = ledger.recompute_depreciation(ledger.load_assets(), today)
+    ledger.save_assets(df_assets)
+    print(f"已重算 {len(df_assets)} 筆資產的持有天數與每日均攤費用。")
+    return 0
+
+
+def cmd_archive(args) -> int:
+    today = date.fromisoformat(args.today) if args.today else date.today()
+    moved = ledger.Ledger().archive_closed_years(today)
+    years = ledger.archive_years()
+    print(f"已封存 {moved} 筆；封存年度：{'、'.join(map(str, years)) or '（無）'}")
+    return 0
+
+
+def cmd_summary(args) -> int:
+    # 只讀統計需要的三個欄位；封存年度直接用彙總
+    by_month = ledger.monthly_summary(ledger.load_data(columns=ledger.SUMMARY_COLUMNS), ledger.read_rollup())
+    if args.month:
+        by_month = by_month[by_month.index.isin(args.month)]
+    if args.out:
+        if args.out.lower().endswith((".xlsx", ".xls")):
+            by_month.to_excel(args.out)
+        else:
+            by_month.to_csv(args.out, encoding="utf-8-sig")
+        print(f"已輸出 {len(by_month)} 個月份到 {args.out}")
+    elif by_month.empty:
+        print("尚無資料可以統計。")
+    else:
+        print(by_month.astype(float).to_string(float_format=lambda v: f"{v:,.0f}"))
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="家芬a整合平台 命令列工具")
+    parser.add_argument(
+        "--data-dir",
+        default=None,
+        help="transactions.csv / assets.csv 所在的資料夾（預設為目前資料夾）",
+    )
+    parser.add_argument("--ledger", default=None, help="帳本名稱（ledgers/<名稱>/），跟 --data-dir 擇一")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("ingest", help="從 CSV / XLSX 批次匯入記帳資料")
+    p.add_argument("files", nargs="+")
+    p.add_argument("--dry-run", action="store_true", help="只檢查、不寫檔")
+    p.set_defaults(func=cmd_ingest)
+
+    p = sub.add_parser("import-statement", help="匯入信用卡 / 銀行對帳單，已經記過的自動跳過")
+    p.add_argument("files", nargs="+")
+    p.add_argument("--payment", required=True, help="支付方式，例如：魔法小卡")
+    p.add_argument("--category", default="其他")
+    p.add_argument("--subcategory", default="其他")
+    p.add_argument("--days", type=int, default=STATEMENT_MATCH_DAYS, help="日期容許誤差（天）")
+    p.add_argument("--dry-run", action="store_true", help="只檢查、不寫檔")
+    p.set_defaults(func=cmd_import_statement)
+
+    p = sub.add_parser("recurring", help="產生到期的固定收支")
+    p.add_argument("--today", help="以這天當作今天（YYYY-MM-DD）")
+    p.set_defaults(func=cmd_recurring)
+
+    p = sub.add_parser("recompute-assets", help="重算固定資產的持有天數與每日均攤費用")
+    p.add_argument("--today", help="以這天當作今天（YYYY-MM-DD）")
+    p.set_defaults(func=cmd_recompute_assets)
+
+    p = sub.add_parser("archive", help="把已經結束的年度搬進壓縮的封存檔")
+    p.add_argument("--today", help="以這天當作今天（YYYY-MM-DD）")
+    p.set_defaults(func=cmd_archive)
+
+    p = sub.add_parser("summary", help="依月份統計收入 / 支出 / 結餘")
+    p.add_argument("--month", action="append", help="只看某個月份（YYYY-MM，可重複指定）")
+    p.add_argument("--out", help="輸出到 CSV / XLSX，不指定就印在畫面上")
+    p.set_defaults(func=cmd_summary)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.ledger:
+        args.data_dir = str(book_dir(args.ledger))
+        if not os.path.isdir(args.data_dir):
+            print(f"找不到帳本：{args.ledger}")
+            return 1
+    if args.data_dir:
+        # ingest 的檔案路徑先轉成絕對路徑，再切到資料夾
+        if getattr(args, "files", None):
+            args.files = [os.path.abspath(f) for f in args.files]
+        if getattr(args, "out", None):
+            args.out = os.path.abspath(args.out)
+        os.chdir(args.data_dir)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+import tempfile
+
+import pandas as pd
+
+
+# ===================== 匯出 CSV / XLSX =====================
+#
+# 一次只轉換一小段（EXPORT_CHUNK_ROWS 列）寫進磁碟上的暫存檔，不會先把整份資料
+# 轉成一個大字串，也不會複製整張 DataFrame。
+
+EXPORT_CHUNK_ROWS = 50_000
+XLSX_MAX_ROWS = 1_048_575  # Excel 一張工作表的上限（扣掉標題列）
+
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "XLSX": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+try:
+    import openpyxl
+except ImportError:  # 沒裝 openpyxl 就只提供 CSV
+    openpyxl = None
+
+
+def available_formats():
+    return [fmt for fmt in EXPORT_FORMATS if fmt != "XLSX" or openpyxl is not None]
+
+
+def iter_chunks(df: pd.DataFrame, columns=None, chunk_rows: int = EXPORT_CHUNK_ROWS, transform=None):
+    # transform：每一段輸出前再做的轉換（例如金額從「分」換回「元」）
+    columns = list(columns) if columns is not None else list(df.columns)
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows][columns].copy()
+        if transform is not None:
+            chunk = transform(chunk)
+        # 日期欄位統一輸出成 YYYY-MM-DD
+        for col in chunk.columns:
+            if pd.api.types.is_datetime64_any_dtype(chunk[col]):
+                chunk[col] = chunk[col].dt.strftime("%Y-%m-%d")
+        yield chunk
+
+
+def write_csv(df: pd.DataFrame, fileobj, columns=None, chunk_rows: int = EXPORT_CHUNK_ROWS, transform=None):
+    columns = list(columns) if columns is not None else list(df.columns)
+    # utf-8-sig：Excel 直接打開中文才不會亂碼（跟 save_data 一樣）
+    fileobj.write(pd.DataFrame(columns=columns).to_csv(index=False).encode("utf-8-sig"))
+    for chunk in iter_chunks(df, columns, chunk_rows, transform):
+        fileobj.write(chunk.to_csv(index=False, header=False).encode("utf-8"))
+
+
+def write_xlsx(df: pd.DataFrame, fileobj, columns=None, chunk_rows: int = EXPORT_CHUNK_ROWS, sheet_name="data", transform=None):
+    if openpyxl is None:
+        raise RuntimeError("匯出 XLSX 需要安裝 openpyxl")
+    columns = list(columns) if columns is not None else list(df.columns)
+    # write_only 模式是逐列寫出，不會在記憶體裡留整張表
+    wb = openpyxl.Workbook(write_only=True)
+    ws = None
+    rows_in_sheet = XLSX_MAX_ROWS
+    for chunk in iter_chunks(df, columns, chunk_rows, transform):
+        chunk = chunk.astype(object).where(chunk.notna(), None)
+        for row in chunk.itertuples(index=False, name=None):
+            if rows_in_sheet >= XLSX_MAX_ROWS:
+                ws = wb.create_sheet(sheet_name if ws is None else f"{sheet_name}_{len(wb.worksheets) + 1}")
+                ws.append(columns)
+                rows_in_sheet = 0
+            ws.append(row)
+            rows_in_sheet += 1
+    if ws is None:
+        wb.create_sheet(sheet_name).append(columns)
+    wb.save(fileobj)
+
+
+def export_file(df: pd.DataFrame, fmt: str, columns=None, transform=None):
+    # 回傳倒回開頭的暫存檔（io.FileIO），可以直接交給 st.download_button
+    out = tempfile.TemporaryFile()
+    if fmt == "XLSX":
+        write_xlsx(df, out, columns, transform=transform)
+    else:
+        write_csv(df, out, columns, transform=transform)
+    out.flush()
+    # download_button 只認 RawIOBase / BytesIO 這類物件，所以拆掉外層的 buffer
+    raw = out.detach()
+    raw.seek(0)
+    return raw
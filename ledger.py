@@ -0,0 +1,1125 @@
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+
+import pandas as pd
+from pathlib import Path
+
+try:
+    import pyarrow
+    import pyarrow.feather as feather
+except ImportError:  # 沒裝 pyarrow 就用 pandas 內建的 C parser，也不寫 sidecar
+    pyarrow = None
+    feather = None
+try:
+    import fcntl
+except ImportError:  # Windows 沒有 fcntl，只能靠行程內的鎖
+    fcntl = None
+from datetime import date, datetime
+
+from recurring import assign_rule_ids, load_rules
+from spending_cube import CUBE_DIMS, CUBE_MEASURES, cells_from_rows
+
+# 這個檔案只放資料設定、讀寫與 Ledger / AssetRegistry 物件，不 import streamlit，
+# 讓 app.py、命令列工具（cli.py）跟其他 Python 腳本共用同一套邏輯：
+#
+#     from ledger import Ledger
+#     book = Ledger()
+#     book.add_many(rows)            # 幾千筆也只寫一次檔
+#     book.query(start, end, categories=["飲食"])
+
+# ===================== 共用設定 =====================
+
+DATA_FILE = Path("transactions.csv")
+# 變更紀錄超過這個大小就整理回 transactions.csv（快照）
+LOG_COMPACT_BYTES = 2 * 1024 * 1024
+# 今年跟去年留在 transactions.csv（熱資料），更早的整年封存
+ARCHIVE_HOT_YEARS = 2
+RECURRING_FILE = Path("recurring.csv")
+
+COLUMNS = [
+    "日期", "星期",
+    "類別", "小類", "項目",
+    "支付方式", "幣別",
+    "收入", "支出",
+    "支出比例", "實際支出",
+    "備註",
+    "規則ID",
+]
+
+CATEGORY_OPTIONS = [
+    "飲食", "衣著", "日常", "交通",
+    "教育", "娛樂", "醫療",
+    "收入",
+    "其他",
+]
+
+SUBCATEGORY_MAP = {
+    "飲食": ["早餐", "午餐", "晚餐", "零食飲料", "食材原料"],
+    "衣著": ["服飾鞋包"],
+    "日常": [
+        "水費", "電費", "房租", "電話費",
+        "日用消耗", "居家百貨", "美妝保養", "電子數位",
+        "保險", "股票", "稅務",
+    ],
+    "交通": ["加油", "保養維修", "停車費", "過路費", "公共交通", "叫車"],
+    "教育": ["學雜費", "文具用品"],
+    "娛樂": ["旅遊", "聚會娛樂", "運動健身", "人情世故"],
+    "醫療": ["醫藥費", "藥品"],
+    "收入": ["薪資", "獎金"],
+    "其他": ["其他"],
+}
+
+PAYMENT_OPTIONS = ["現金", "魔法小卡", "大哥"]
+CURRENCY_OPTIONS = ["TWD", "USD", "JPY", "EUR", "其他"]
+WEEKDAY_LABELS = ["一", "二", "三", "四", "五", "六", "日"]
+
+# 金額在記憶體裡一律存成 int64 的「分」（1 元 = 100），加總不會有浮點誤差；
+# 只有寫檔 / 讀檔、畫面顯示時才換回「元」
+MONEY_SCALE = 100
+MONEY_COLUMNS = ["收入", "支出", "實際支出", "金額", "每日均攤費用"]
+
+# CSV 每一欄固定的型態，讀檔時不用再猜；日期欄另外用 parse_dates 解析
+TRANSACTION_DTYPES = {
+    "星期": "str",
+    "類別": "str",
+    "小類": "str",
+    "項目": "str",
+    "支付方式": "str",
+    "幣別": "str",
+    "收入": "float64",
+    "支出": "float64",
+    "支出比例": "float64",
+    "實際支出": "float64",
+    "備註": "str",
+    "規則ID": "str",
+    "ID": "float64",
+}
+TRANSACTION_DATE_COLUMNS = ["日期"]
+
+# 匯率（你可以自行調整）
+FX_TO_TWD = {
+    "TWD": 1.0,
+    "USD": 32.0,
+    "JPY": 0.22,
+    "EUR": 35.0,
+    "其他": 1.0,
+}
+
+# ===================== 金額：元 ↔ 分 =====================
+
+def to_minor(values) -> pd.Series:
+    # 元（float / 字串）→ 分（int64），看不懂的當 0
+    # 半分一律四捨五入（負數往遠離 0 的方向）；先去掉 1.005 × 100 = 100.4999… 這種浮點誤差
+    values = pd.to_numeric(pd.Series(values), errors="coerce").fillna(0)
+    cents = (values * MONEY_SCALE).round(6)
+    magnitude = (cents.abs() + 0.5) // 1
+    return magnitude.where(cents >= 0, -magnitude).astype("int64")
+
+
+def from_minor(values) -> pd.Series:
+    return pd.Series(values) / MONEY_SCALE
+
+
+def to_major(df: pd.DataFrame) -> pd.DataFrame:
+    # 複製一份，金額欄換回「元」（寫檔、匯出、畫面用）
+    df = df.copy()
+    for col in MONEY_COLUMNS:
+        if col in df.columns:
+            df[col] = from_minor(df[col])
+    return df
+
+
+def split_expense(expense_minor: pd.Series, ratio: pd.Series) -> pd.Series:
+    # 實際支出 = 支出 × 比例%，整數運算、四捨五入到分，結果固定不會飄
+    return (expense_minor.astype("int64") * ratio.astype("int64") + 50) // 100
+
+
+# ===================== CSV 讀取（固定型態） =====================
+
+CSV_ENGINE = "pyarrow" if pyarrow is not None else "c"
+
+
+def read_typed_csv(path, dtypes, date_columns, columns) -> pd.DataFrame:
+    # 依 schema 讀指定的欄位（多執行緒的 Arrow parser，日期直接解析）；
+    # 舊檔沒有的欄位一次補成空值，不在 columns 裡的欄位根本不會讀進來
+    header = pd.read_csv(path, nrows=0).columns
+    present = [c for c in columns if c in header]
+    df = pd.read_csv(
+        path,
+        engine=CSV_ENGINE,
+        usecols=present,
+        dtype={c: dtypes[c] for c in present if c in dtypes},
+        parse_dates=[c for c in date_columns if c in present],
+    )
+    df = df.reindex(columns=list(columns))
+    for col in columns:
+        if col in date_columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            # 有看不懂的日期時 Arrow 會整欄留成字串
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+        elif col not in present and col in dtypes:
+            df[col] = df[col].astype(dtypes[col])
+    return df
+
+
+# ===================== CSV 的二進位 sidecar（Feather） =====================
+#
+# 第一次解析 transactions.csv 後，把結果另存一份 Feather（Arrow IPC）檔在旁邊，
+# 之後啟動直接 memory-map 讀，不用再解析文字。CSV 仍然是正式的資料格式。
+# sidecar 的 metadata 記著 CSV 當時的 mtime / 大小 / sha256：
+#   mtime + 大小 都一樣 → 直接用
+#   不一樣但內容 hash 一樣（只是被 touch）→ 照用，順便更新 metadata
+#   內容不一樣（在外面被改過）→ 重新解析 CSV、重寫 sidecar
+
+SIDECAR_FORMAT = "1"
+
+
+def sidecar_path_for(path) -> Path:
+    path = Path(path)
+    return path.with_name(path.stem + ".cache.feather")
+
+
+def file_digest(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _sidecar_key(stat, digest, columns) -> dict:
+    return {
+        b"sidecar_format": SIDECAR_FORMAT.encode(),
+        b"source_mtime_ns": str(stat.st_mtime_ns).encode(),
+        b"source_size": str(stat.st_size).encode(),
+        b"source_sha256": digest.encode(),
+        b"columns": json.dumps(list(columns), ensure_ascii=False).encode(),
+    }
+
+
+def _write_sidecar(sidecar: Path, table, key: dict):
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), **key})
+    tmp_path = sidecar.with_name(sidecar.name + ".tmp")
+    try:
+        # 不壓縮，讀的時候才能直接 memory-map
+        feather.write_feather(table, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, sidecar)
+    except OSError:
+        # 資料夾不能寫就算了，下次一樣解析 CSV
+        tmp_path.unlink(missing_ok=True)
+
+
+def read_csv_cached(path, dtypes, date_columns, all_columns, columns=None) -> pd.DataFrame:
+    path = Path(path)
+    columns = list(columns or all_columns)
+    if feather is None:
+        return read_typed_csv(path, dtypes, date_columns, columns)
+
+    sidecar = sidecar_path_for(path)
+    stat = path.stat()
+    meta = {}
+    if sidecar.exists():
+        try:
+            meta = pyarrow.ipc.open_file(pyarrow.memory_map(str(sidecar))).schema.metadata or {}
+        except (OSError, pyarrow.ArrowInvalid):
+            meta = {}
+    same_layout = (
+        meta.get(b"sidecar_format") == SIDECAR_FORMAT.encode()
+        and meta.get(b"columns") == json.dumps(list(all_columns), ensure_ascii=False).encode()
+    )
+    if same_layout:
+        if (
+            meta.get(b"source_mtime_ns") == str(stat.st_mtime_ns).encode()
+            and meta.get(b"source_size") == str(stat.st_size).encode()
+        ):
+            return feather.read_table(sidecar, columns=columns, memory_map=True).to_pandas()
+        if meta.get(b"source_size") == str(stat.st_size).encode():
+            digest = file_digest(path)
+            if meta.get(b"source_sha256") == digest.encode():
+                table = feather.read_table(sidecar, memory_map=True)
+                _write_sidecar(sidecar, table, _sidecar_key(stat, digest, all_columns))
+                return table.select(columns).to_pandas()
+
+    digest = file_digest(path)
+    df = read_typed_csv(path, dtypes, date_columns, all_columns)
+    _write_sidecar(
+        sidecar,
+        pyarrow.Table.from_pandas(df, preserve_index=False),
+        _sidecar_key(stat, digest, all_columns),
+    )
+    return df[columns]
+
+
+def empty_frame(dtypes, date_columns, columns) -> pd.DataFrame:
+    return pd.DataFrame({
+        col: pd.Series(dtype="datetime64[ns]" if col in date_columns else dtypes.get(col, "str"))
+        for col in columns
+    })
+
+
+# ===================== 記帳：讀寫 =====================
+#
+# transactions.csv 是「快照」，之後的每一批 新增 / 修改 / 刪除 都只追加一行到
+# transactions.log.jsonl（變更紀錄），不用每次重寫整個 CSV。
+# 目前的帳本 = 快照 + 依序重放變更紀錄；紀錄太大時再整理成新的快照。
+#
+# 每一行記的是這批被拿掉的舊列（removed）跟放上去的新列（added），
+# 修改 = 拿掉舊列 + 放上新列。重放是「依 ID 拿掉、再放上」，同一行重放兩次
+# 結果也一樣，所以整理快照時就算中途當掉也不會重複入帳；
+# 舊列也都留著，所以可以往回復原。
+
+def load_data(path=None, columns=None) -> pd.DataFrame:
+    # columns：只需要部分欄位時（例如 KPI 只要 日期 / 收入 / 實際支出）只讀那幾欄
+    path = Path(path or DATA_FILE)
+    df = load_snapshot(path, columns)
+    entries, _ = read_log(path)
+    for entry in entries:
+        removed = transaction_frame(entry["removed"])[df.columns]
+        added = transaction_frame(entry["added"])[df.columns]
+        df = apply_batch(df, removed, added)
+    return df
+
+
+def load_snapshot(path, columns=None) -> pd.DataFrame:
+    path = Path(path)
+    columns = [c for c in (columns or COLUMNS) if c != "ID"] + ["ID"]
+    if not path.exists():
+        return empty_transactions(columns)
+    return typed_transactions(assign_ids(read_csv_cached(
+        path, TRANSACTION_DTYPES, TRANSACTION_DATE_COLUMNS, COLUMNS + ["ID"], columns,
+    )))
+
+
+def empty_transactions(columns) -> pd.DataFrame:
+    df = empty_frame(TRANSACTION_DTYPES, TRANSACTION_DATE_COLUMNS, columns)
+    df["ID"] = df["ID"].astype("int64")
+    return typed_transactions(df)
+
+
+def typed_transactions(df: pd.DataFrame) -> pd.DataFrame:
+    # 檔案裡的金額是「元」，讀進來換成「分」
+    for col in ["收入", "支出", "實際支出"]:
+        if col in df.columns:
+            df[col] = to_minor(df[col]).to_numpy()
+    if "支出比例" in df.columns:
+        df["支出比例"] = df["支出比例"].fillna(100).astype("int64")
+    return df
+
+
+def assign_ids(df: pd.DataFrame) -> pd.DataFrame:
+    # 每筆紀錄一個固定的 ID（搜尋索引等都靠它對回原始資料）
+    # 舊檔沒有 ID 欄時，依序補上，下次存檔就會寫進 CSV
+    ids = pd.to_numeric(df["ID"], errors="coerce") if "ID" in df.columns else pd.Series(float("nan"), index=df.index)
+    missing = ids.isna()
+    if missing.any():
+        start = int(ids.max()) + 1 if ids.notna().any() else 1
+        ids[missing] = range(start, start + int(missing.sum()))
+    df["ID"] = ids.astype("int64")
+    return df
+
+
+def next_id(df: pd.DataFrame) -> int:
+    return int(df["ID"].max()) + 1 if not df.empty else 1
+
+
+def file_version(path):
+    # 以檔案修改時間 + 大小當資料版本，其他 session 或外部改檔都會讓版本改變
+    path = Path(path)
+    if not path.exists():
+        return None
+    stat = path.stat()
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def log_path_for(path) -> Path:
+    path = Path(path)
+    return path.with_name(path.stem + ".log.jsonl")
+
+
+def lock_path_for(path) -> Path:
+    path = Path(path)
+    return path.with_name(path.stem + ".lock")
+
+
+@contextmanager
+def file_lock(path):
+    # 跨行程的寫入鎖：同一份檔案同時只有一個人在 讀最新 → 寫入 → 整理快照。
+    # 鎖在另外的 .lock 檔上，變更紀錄整理時被刪掉也不影響
+    if fcntl is None:
+        yield
+        return
+    with open(lock_path_for(path), "a+b") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def data_version(path):
+    # 快照 + 變更紀錄，任一個變了就是新版本
+    return (file_version(path), file_version(log_path_for(path)))
+
+
+def ledger_version():
+    return data_version(DATA_FILE)
+
+
+def save_data(df: pd.DataFrame, path=None):
+    # 寫出完整快照（先寫暫存檔再換名），之後清掉已經併進快照的變更紀錄
+    path = Path(path or DATA_FILE)
+    write_transactions_csv(df, path)
+    log_path_for(path).unlink(missing_ok=True)
+
+
+def write_transactions_csv(df: pd.DataFrame, path):
+    # 先寫暫存檔再換名；副檔名是 .gz 就壓縮
+    path = Path(path)
+    df_to_save = to_major(df)
+    if not df_to_save.empty:
+        df_to_save["日期"] = pd.to_datetime(df_to_save["日期"]).dt.strftime("%Y-%m-%d")
+    tmp_path = path.with_name(path.name + ".tmp")
+    compression = "gzip" if path.suffix == ".gz" else None
+    df_to_save.to_csv(tmp_path, index=False, encoding="utf-8-sig", compression=compression)
+    os.replace(tmp_path, path)
+
+
+# ===================== 記帳：變更紀錄 =====================
+
+def transaction_frame(records) -> pd.DataFrame:
+    # 變更紀錄裡的 list of dict → 帳本欄位 + ID
+    if not records:
+        return pd.DataFrame(columns=COLUMNS + ["ID"])
+    raw = pd.DataFrame(records)
+    df = normalize_transactions(raw)
+    df["ID"] = pd.to_numeric(raw["ID"]).astype("int64").to_numpy()
+    return df
+
+
+def apply_batch(df: pd.DataFrame, removed: pd.DataFrame, added: pd.DataFrame) -> pd.DataFrame:
+    # 依 ID 拿掉 removed / added 的列，再放上 added；列維持依 ID 排序
+    touches_existing = not df.empty and not added.empty and added["ID"].min() <= df["ID"].max()
+    if not removed.empty or touches_existing:
+        df = df[~df["ID"].isin(pd.concat([removed["ID"], added["ID"]]))]
+    if added.empty:
+        return df.reset_index(drop=True)
+    if df.empty:
+        return added.reset_index(drop=True)
+    out = pd.concat([df, added], ignore_index=True)
+    if touches_existing:
+        out = out.sort_values("ID", kind="stable", ignore_index=True)
+    return out
+
+
+def read_log(path, offset: int = 0):
+    # 從 offset（byte）開始讀完整的行；回傳 (紀錄, 讀到哪裡)
+    log_path = log_path_for(path)
+    if not log_path.exists():
+        return [], 0
+    with open(log_path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    # 別人寫到一半的最後一行先不讀
+    end = data.rfind(b"\n") + 1
+    entries = [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+    return entries, offset + end
+
+
+def _records(df: pd.DataFrame):
+    # 變更紀錄跟 CSV 一樣存「元」
+    if df.empty:
+        return []
+    return json.loads(to_major(df).to_json(orient="records", date_format="iso", force_ascii=False))
+
+
+def append_log(path, seq: int, removed: pd.DataFrame, added: pd.DataFrame, undo_of=None):
+    entry = {
+        "seq": seq,
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "undo_of": undo_of,
+        "removed": _records(removed),
+        "added": _records(added),
+    }
+    with open(log_path_for(path), "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def query_mask(df: pd.DataFrame, start=None, end=None, categories=None, payments=None) -> pd.Series:
+    # 日期區間（含頭尾）+ 類別 + 支付方式；空的條件 = 不限
+    mask = pd.Series(True, index=df.index)
+    if start is not None:
+        mask &= df["日期"] >= pd.Timestamp(start)
+    if end is not None:
+        mask &= df["日期"] < pd.Timestamp(end) + pd.Timedelta(days=1)
+    if categories:
+        mask &= df["類別"].isin(categories)
+    if payments:
+        mask &= df["支付方式"].isin(payments)
+    return mask
+
+
+def read_table(path) -> pd.DataFrame:
+    path = Path(path)
+    if path.suffix.lower() in (".xlsx", ".xls"):
+        return pd.read_excel(path)
+    return pd.read_csv(path)
+
+
+def normalize_transactions(raw: pd.DataFrame) -> pd.DataFrame:
+    # 外部匯入的表格（舊 Excel、其他 CSV）整理成帳本欄位，缺的欄位補預設值
+    df = raw.copy()
+    # 舊檔可能有「月份」欄，先丟掉
+    if "月份" in df.columns:
+        df = df.drop(columns=["月份"])
+    for col in COLUMNS:
+        if col not in df.columns:
+            if col == "幣別":
+                df[col] = "TWD"
+            elif col == "支出比例":
+                df[col] = 100
+            elif col in ["收入", "支出", "實際支出"]:
+                df[col] = 0
+            else:
+                df[col] = ""
+    df = df[COLUMNS].copy()
+    df["日期"] = pd.to_datetime(df["日期"])
+    for col in ["收入", "支出", "實際支出"]:
+        df[col] = to_minor(df[col]).to_numpy()
+    df["支出比例"] = pd.to_numeric(df["支出比例"], errors="coerce").fillna(100).astype(int)
+    if "實際支出" not in raw.columns:
+        df["實際支出"] = split_expense(df["支出"], df["支出比例"])
+    df["星期"] = df["日期"].dt.weekday.map(dict(enumerate(WEEKDAY_LABELS)))
+    return df
+
+
+# monthly_summary 只用到這幾欄，可以搭配 load_data(columns=...) 只讀這些
+SUMMARY_COLUMNS = ["日期", "收入", "實際支出"]
+
+
+def monthly_summary(df: pd.DataFrame, rollup=None) -> pd.DataFrame:
+    # 依月份加總：收入 / 支出（實際支出）/ 結餘；整數（分）加總完才換回元
+    # rollup：封存年度的彙總格子（read_rollup），有給就一起算進去
+    month_stats = df[["收入", "實際支出"]].copy()
+    month_stats["月份"] = df["日期"].dt.strftime("%Y-%m")
+    if rollup is not None and not rollup.empty:
+        month_stats = pd.concat([rollup[["收入", "實際支出", "月份"]], month_stats], ignore_index=True)
+    if month_stats.empty:
+        return pd.DataFrame(columns=["收入", "支出", "結餘"])
+    by_month = (
+        month_stats.groupby("月份")[["收入", "實際支出"]]
+        .sum()
+        .rename(columns={"實際支出": "支出"})
+        .sort_values("月份", ascending=True)
+    )
+    by_month["結餘"] = by_month["收入"] - by_month["支出"]
+    return by_month / MONEY_SCALE
+
+
+def load_active_rules(path=None) -> pd.DataFrame:
+    rules = load_rules(Path(path or RECURRING_FILE))
+    rules = rules[rules["項目"].fillna("").astype(str).str.strip() != ""]
+    # 手動改 CSV 新增的規則可能沒有 ID，先補上（產生時會一起存回去）
+    return assign_rule_ids(rules)
+
+
+# ===================== 記帳：封存（冷資料） =====================
+#
+# 已經結束的年度（今年、去年以外）整年搬到 transactions.archive/<年>.csv.gz，
+# 同時把那一年 (月份, 類別, 小類, 支付方式) 的 收入 / 實際支出 彙總寫進 rollup.csv。
+# 平常只讀熱資料（transactions.csv + 變更紀錄）跟彙總；篩選日期往前碰到封存的
+# 年度時，才去讀那幾年的壓縮檔。封存的紀錄是唯讀的。
+#
+# 封存後補記的舊日期紀錄會先進熱資料，下次封存時再併進該年的檔案。
+# 寫入順序是 年度檔 → 彙總 → 快照；中途當掉的話同一筆會暫時兩邊都有，
+# 讀封存時依 ID 以熱資料為準，下次封存依 ID 覆蓋，不會重複入帳。
+
+def archive_dir_for(path) -> Path:
+    path = Path(path)
+    return path.with_name(path.stem + ".archive")
+
+
+def archive_year_path(path, year) -> Path:
+    return archive_dir_for(path) / f"{year}.csv.gz"
+
+
+def archive_years(path=None) -> list:
+    folder = archive_dir_for(path or DATA_FILE)
+    if not folder.is_dir():
+        return []
+    return sorted(int(p.name.split(".")[0]) for p in folder.glob("*.csv.gz") if p.name.split(".")[0].isdigit())
+
+
+def archive_cutoff(today=None) -> pd.Timestamp:
+    # 這天（含）以後的紀錄留在熱資料
+    today = today or date.today()
+    return pd.Timestamp(year=today.year - ARCHIVE_HOT_YEARS + 1, month=1, day=1)
+
+
+@lru_cache(maxsize=16)
+def _read_archive_year(path: str, version, columns: tuple) -> pd.DataFrame:
+    # version 只是快取的 key：檔案換了就重讀；回傳的表是共用的，請當唯讀
+    # ID 跟熱資料一樣轉成 int64，兩邊接起來才不會整欄變成 float
+    return typed_transactions(assign_ids(
+        read_typed_csv(path, TRANSACTION_DTYPES, TRANSACTION_DATE_COLUMNS, list(columns))
+    ))
+
+
+def read_archive(path=None, start=None, end=None, columns=None) -> pd.DataFrame:
+    # 只讀跟 [start, end] 有重疊的年度
+    path = Path(path or DATA_FILE)
+    columns = [c for c in (columns or COLUMNS) if c != "ID"]
+    if "日期" not in columns:
+        columns.insert(0, "日期")
+    columns = tuple(columns + ["ID"])
+    years = [
+        y for y in archive_years(path)
+        if (start is None or y >= pd.Timestamp(start).year) and (end is None or y <= pd.Timestamp(end).year)
+    ]
+    frames = [
+        _read_archive_year(str(archive_year_path(path, y)), file_version(archive_year_path(path, y)), columns)
+        for y in years
+    ]
+    if not frames:
+        return empty_transactions(list(columns))
+    df = pd.concat(frames, ignore_index=True)
+    return df[query_mask(df, start, end)].reset_index(drop=True)
+
+
+def rollup_path_for(path) -> Path:
+    return archive_dir_for(path) / "rollup.csv"
+
+
+def read_rollup(path=None) -> pd.DataFrame:
+    # 封存年度的彙總格子（同 spending_cube 的格式，金額為分）
+    rollup = rollup_path_for(path or DATA_FILE)
+    if not rollup.exists():
+        return pd.DataFrame(columns=CUBE_DIMS + CUBE_MEASURES)
+    return _read_rollup(str(rollup), file_version(rollup)).copy()
+
+
+@lru_cache(maxsize=16)
+def _read_rollup(path: str, version) -> pd.DataFrame:
+    df = pd.read_csv(path, dtype={c: "str" for c in CUBE_DIMS}, keep_default_na=False)
+    for col in CUBE_MEASURES:
+        df[col] = to_minor(df[col]).to_numpy()
+    return df
+
+
+def archive_max_id(path=None) -> int:
+    # 封存過的最大 ID；新紀錄的 ID 要比它大，才不會跟封存的撞號
+    meta = archive_dir_for(path or DATA_FILE) / "archive.json"
+    if not meta.exists():
+        return 0
+    return int(json.loads(meta.read_text(encoding="utf-8")).get("max_id", 0))
+
+
+def write_archive(path, cold: pd.DataFrame):
+    # cold 依年度併進各年的壓縮檔（同 ID 以 cold 為準），再重算這幾年的彙總
+    path = Path(path)
+    folder = archive_dir_for(path)
+    folder.mkdir(exist_ok=True)
+    cells = []
+    for year, rows in cold.groupby(cold["日期"].dt.year):
+        target = archive_year_path(path, year)
+        if target.exists():
+            existing = read_archive(path, f"{year}-01-01", f"{year}-12-31")
+            rows = apply_batch(existing, rows.iloc[0:0], rows[existing.columns])
+        write_transactions_csv(rows.sort_values(["日期", "ID"], kind="stable"), target)
+        cells.append(cells_from_rows(rows))
+
+    years = {str(y) for y in cold["日期"].dt.year.unique()}
+    rollup = read_rollup(path)
+    rollup = pd.concat([rollup[~rollup["月份"].str[:4].isin(years)], *cells], ignore_index=True)
+    rollup = to_major(rollup.sort_values(CUBE_DIMS, ignore_index=True))
+    tmp_path = rollup_path_for(path).with_name("rollup.csv.tmp")
+    rollup.to_csv(tmp_path, index=False, encoding="utf-8-sig")
+    os.replace(tmp_path, rollup_path_for(path))
+
+    max_id = max(archive_max_id(path), int(cold["ID"].max()))
+    (folder / "archive.json").write_text(json.dumps({"max_id": max_id}), encoding="utf-8")
+
+
+# ===================== 固定資產：讀寫 =====================
+
+ASSET_FILE = Path("assets.csv")
+
+ASSET_COLUMNS = [
+    "分類",
+    "小類",
+    "產品名稱",
+    "品牌/型號",
+    "購買日期",
+    "幣別",
+    "金額",
+    "持有天數",
+    "每日均攤費用",
+    "當前狀態(服役中/已除役)",
+    "地點",
+    "備註",
+    # 付這筆錢的記帳紀錄 ID（可以空白）
+    "交易ID",
+]
+
+ASSET_DTYPES = {
+    "分類": "str",
+    "小類": "str",
+    "產品名稱": "str",
+    "品牌/型號": "str",
+    "幣別": "str",
+    "金額": "float64",
+    "持有天數": "float64",
+    "每日均攤費用": "float64",
+    "當前狀態(服役中/已除役)": "str",
+    "地點": "str",
+    "備註": "str",
+    "交易ID": "float64",
+    "ID": "float64",
+}
+ASSET_DATE_COLUMNS = ["購買日期"]
+
+
+def recompute_depreciation(df: pd.DataFrame, today=None) -> pd.DataFrame:
+    # 依購買日期重算「持有天數」與「每日均攤費用」（沒填日期就當 1 天）
+    # 金額、每日均攤費用都是「分」
+    today = pd.to_datetime(today or date.today())
+    df["金額"] = pd.to_numeric(df["金額"], errors="coerce").fillna(0).astype("int64")
+    df["購買日期"] = pd.to_datetime(df["購買日期"], errors="coerce")
+
+    valid_mask = df["購買日期"].notna()
+    df.loc[valid_mask, "持有天數"] = (today - df.loc[valid_mask, "購買日期"]).dt.days + 1
+    df.loc[~valid_mask, "持有天數"] = 1
+
+    df["持有天數"] = pd.to_numeric(df["持有天數"], errors="coerce")
+    df.loc[df["持有天數"].isna() | (df["持有天數"] <= 0), "持有天數"] = 1
+    df["持有天數"] = df["持有天數"].astype(int)
+
+    # 整數除法四捨五入到分
+    df["每日均攤費用"] = (df["金額"] + df["持有天數"] // 2) // df["持有天數"]
+    return df
+
+
+def load_assets(path=None) -> pd.DataFrame:
+    path = Path(path or ASSET_FILE)
+    if path.exists():
+        df = read_typed_csv(path, ASSET_DTYPES, ASSET_DATE_COLUMNS, ASSET_COLUMNS + ["ID"])
+        df["幣別"] = df["幣別"].fillna("TWD")
+        df["金額"] = to_minor(df["金額"]).to_numpy()
+        df["交易ID"] = df["交易ID"].astype("Int64")
+
+        return assign_ids(recompute_depreciation(df))
+    else:
+        df = empty_frame(ASSET_DTYPES, ASSET_DATE_COLUMNS, ASSET_COLUMNS + ["ID"])
+        df.to_csv(path, index=False, encoding="utf-8-sig")
+        return df
+
+
+def asset_file_rows(df: pd.DataFrame) -> pd.DataFrame:
+    df_to_save = to_major(df)
+    # 金額都是整數元時照舊寫成整數
+    if not df.empty and (df["金額"] % MONEY_SCALE == 0).all():
+        df_to_save["金額"] = df["金額"] // MONEY_SCALE
+    if not df_to_save.empty:
+        df_to_save["購買日期"] = pd.to_datetime(df_to_save["購買日期"], errors="coerce").dt.strftime("%Y-%m-%d")
+    return df_to_save
+
+
+def save_assets(df: pd.DataFrame, path=None):
+    asset_file_rows(df).to_csv(Path(path or ASSET_FILE), index=False, encoding="utf-8-sig")
+
+
+def append_assets(df: pd.DataFrame, path=None) -> bool:
+    # 只把新的列接在檔尾；檔案不存在、或欄位跟現在的格式不一樣（舊檔）時回傳 False，
+    # 由呼叫端整個重寫一次（之後就是新格式了）
+    path = Path(path or ASSET_FILE)
+    columns = ASSET_COLUMNS + ["ID"]
+    if not path.exists() or list(pd.read_csv(path, nrows=0, encoding="utf-8-sig").columns) != columns:
+        return False
+    with open(path, "rb+") as f:
+        # 在外面編輯過、最後一行沒有換行的話先補上
+        f.seek(0, 2)
+        if f.tell() > 0:
+            f.seek(-1, 2)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+    asset_file_rows(df)[columns].to_csv(path, mode="a", header=False, index=False, encoding="utf-8")
+    return True
+
+
+# ===================== Ledger / AssetRegistry =====================
+#
+# 兩者都把資料留在記憶體，檔案在外面被改過（版本不同）才重新讀。
+# 批次的 新增 / 修改 / 刪除 都是整批向量運算，最後只寫一次檔。
+# 搜尋索引、彙總表等衍生資料可以 subscribe：每次寫檔後會收到
+# apply(removed, added, version)——修改 = 刪掉舊列 + 加上新列。
+# 衍生資料的 version 跟寫檔前不同（代表本來就沒同步）時不通知，留給它自己重建。
+#
+# log_compact_bytes 有設定的表（Ledger）寫檔只追加變更紀錄；別人追加的紀錄
+# 也只讀新增的那一段，不用整個重讀。
+#
+# 會寫檔的操作（apply_changes / undo / compact / 封存）整段都拿著檔案鎖：
+# 先讀到最新（包含別的行程、別的 Ledger 剛寫的），在這份最新的資料上改、
+# 追加紀錄、必要時整理快照，放鎖之前別人都插不進來，不會互相蓋掉。
+
+
+class _Table:
+    columns = []
+    # None = 不用變更紀錄，每次都寫整個檔
+    log_compact_bytes = None
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.version = None
+        self._df = None
+        self._listeners = []
+        self._lock = threading.RLock()
+        self._log_offset = 0
+        self._last_seq = 0
+
+    def _load(self) -> pd.DataFrame:
+        raise NotImplementedError
+
+    def _save(self, df: pd.DataFrame):
+        raise NotImplementedError
+
+    @contextmanager
+    def _writing(self):
+        # 行程內的鎖 + 檔案鎖，拿到之後先讀到最新
+        with self._lock, file_lock(self.path):
+            self._refresh()
+            yield
+
+    def _frame(self, records) -> pd.DataFrame:
+        # 變更紀錄裡的 list of dict → 表格
+        raise NotImplementedError
+
+    def _current_version(self):
+        if self.log_compact_bytes is None:
+            return file_version(self.path)
+        return data_version(self.path)
+
+    def _refresh(self):
+        version = self._current_version()
+        if self._df is not None and version == self.version:
+            return
+        # 快照沒變、變更紀錄只是變長 → 只重放後面新增的部分
+        tail_only = (
+            self._df is not None
+            and self.log_compact_bytes is not None
+            and version[0] == self.version[0]
+            and version[1] is not None
+            and version[1][1] >= self._log_offset
+        )
+        if tail_only:
+            self._replay_log(version)
+        else:
+            self._df = self._load()
+            self._log_offset = 0
+            self._last_seq = 0
+            self.version = None
+            if self.log_compact_bytes is not None:
+                self._replay_log(version)
+            self.version = version
+
+    def _replay_log(self, version):
+        entries, self._log_offset = read_log(self.path, self._log_offset)
+        in_sync = [listener for listener in self._listeners if listener.version == self.version]
+        for entry in entries:
+            removed, added = self._frame(entry["removed"]), self._frame(entry["added"])
+            self._df = apply_batch(self._df, removed, added)
+            self._last_seq = entry["seq"]
+            if self.version is not None:
+                for listener in in_sync:
+                    listener.apply(removed, added, version)
+        self.version = version
+
+    @property
+    def df(self) -> pd.DataFrame:
+        # 共用的資料，請當唯讀使用；要改請用 add_many / update_many / delete_many
+        with self._lock:
+            self._refresh()
+            return self._df
+
+    def snapshot(self):
+        # (資料, 版本) 一起拿，版本一定對得上這份資料
+        with self._lock:
+            self._refresh()
+            return self._df, self.version
+
+    def nbytes(self) -> int:
+        # 目前讀進記憶體的大小（還沒讀就是 0）
+        df = self._df
+        return int(df.memory_usage(index=True, deep=True).sum()) if df is not None else 0
+
+    def rows_by_id(self, ids) -> pd.DataFrame:
+        # 列平常都依 ID 排序，用二分搜尋找這幾筆，不用掃整張表
+        df = self.df
+        ids = pd.Series(ids, dtype="int64").drop_duplicates()
+        if df.empty or ids.empty:
+            return df.iloc[0:0]
+        if not df["ID"].is_monotonic_increasing:
+            return df[df["ID"].isin(ids)]
+        pos = df["ID"].searchsorted(ids)
+        found = df.iloc[pos[pos < len(df)]]
+        return found[found["ID"].isin(ids)]
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+
+    def sync(self, listener):
+        # 讓衍生資料跟目前的版本一致（不一致就整個重建）
+        with self._lock:
+            self._refresh()
+            if listener.version != self.version:
+                listener.build(self._df, self.version)
+            return listener
+
+    def reload(self):
+        with self._lock:
+            self._df = None
+            self._refresh()
+
+    def _append(self, added: pd.DataFrame) -> bool:
+        # 把新增的列追加到檔尾；不支援就回傳 False，改成整個重寫
+        return False
+
+    def _prepare(self, rows: pd.DataFrame) -> pd.DataFrame:
+        # 補欄位、轉型態
+        return rows
+
+    def _derive(self, rows: pd.DataFrame) -> pd.DataFrame:
+        # 重算衍生欄位（星期、實際支出、每日均攤…）
+        return rows
+
+    def _min_next_id(self) -> int:
+        # 不在 _df 裡、但不能重複使用的 ID（例如已封存的紀錄）
+        return 1
+
+    def _commit(self, removed: pd.DataFrame, added: pd.DataFrame, undo_of=None):
+        # 要在 _writing() 裡面呼叫：_df、_last_seq、_log_offset 都是拿到鎖之後剛讀的
+        version_before = self.version
+        self._df = apply_batch(self._df, removed, added)
+        if self.log_compact_bytes is None:
+            # 只有新增、而且這張表可以追加（AssetRegistry）時，只把新的列接在檔尾
+            if not (removed.empty and self._append(added)):
+                self._save(self._df)
+        else:
+            self._last_seq += 1
+            append_log(self.path, self._last_seq, removed, added, undo_of)
+            self._log_offset = log_path_for(self.path).stat().st_size
+            if self._log_offset > self.log_compact_bytes:
+                self._save(self._df)
+                self._log_offset = 0
+        self.version = self._current_version()
+        for listener in self._listeners:
+            if listener.version == version_before:
+                listener.apply(removed, added, self.version)
+
+    def apply_changes(self, add=None, update=None, delete=None) -> pd.DataFrame:
+        # add：新的列（list of dict 或 DataFrame，不用帶 ID，會自動編號）
+        # update：要修改的列，需帶「ID」欄，其餘欄位只改有給的
+        # delete：要刪除的 ID
+        # 三種可以一起給，整批處理後只寫一次檔；回傳新增 / 修改後的列
+        with self._writing():
+            df = self._df
+            removed = [df.iloc[0:0]]
+            added = []
+
+            if delete is not None and len(delete):
+                target = df["ID"].isin(pd.to_numeric(pd.Series(delete)).astype("int64"))
+                removed.append(df[target])
+                df = df[~target]
+
+            if update is not None and len(update):
+                update = pd.DataFrame(update)
+                update["ID"] = pd.to_numeric(update["ID"]).astype("int64")
+                update = update.drop_duplicates("ID", keep="last").set_index("ID")
+                old = df[df["ID"].isin(update.index)]
+                # 傳進來的金額是「元」，先把舊列也換成元再蓋上去，最後一起轉回分
+                new = to_major(old)
+                changes = update.loc[old["ID"].to_numpy()]
+                for col in changes.columns:
+                    if col in self.columns:
+                        new[col] = changes[col].to_numpy()
+                removed.append(old)
+                added.append(self._derive(self._prepare(new)))
+
+            if add is not None and len(add):
+                new = self._derive(self._prepare(pd.DataFrame(add).drop(columns=["ID"], errors="ignore")))
+                # 用刪除前的最大 ID 往下編，刪掉的 ID 不會被重複使用
+                start = int(self._df["ID"].max()) + 1 if not self._df.empty else 1
+                start = max(start, self._min_next_id())
+                new["ID"] = range(start, start + len(new))
+                added.append(new)
+
+            removed = pd.concat(removed, ignore_index=True)
+            added = pd.concat(added, ignore_index=True) if added else removed.iloc[0:0]
+            if removed.empty and added.empty:
+                return added
+            self._commit(removed, added)
+            return added
+
+    def add_many(self, rows) -> pd.DataFrame:
+        return self.apply_changes(add=rows)
+
+    def update_many(self, changes) -> pd.DataFrame:
+        return self.apply_changes(update=changes)
+
+    def delete_many(self, ids):
+        self.apply_changes(delete=ids)
+
+    def history(self) -> pd.DataFrame:
+        # 上次整理快照之後的每一批變更（只有使用變更紀錄的表才有）
+        entries, _ = read_log(self.path) if self.log_compact_bytes is not None else ([], 0)
+        return pd.DataFrame(
+            [
+                {
+                    "序號": e["seq"],
+                    "時間": e["time"],
+                    "拿掉": len(e["removed"]),
+                    "放上": len(e["added"]),
+                    "復原第幾批": e["undo_of"],
+                }
+                for e in entries
+            ],
+            columns=["序號", "時間", "拿掉", "放上", "復原第幾批"],
+        )
+
+    def undo(self) -> bool:
+        # 復原最近一批還沒被復原的變更（寫成新的一批，一樣記在變更紀錄裡）
+        # 整理成快照之後，之前的變更就不能再復原
+        if self.log_compact_bytes is None:
+            return False
+        with self._writing():
+            entries, _ = read_log(self.path)
+            undone = {e["undo_of"] for e in entries if e["undo_of"] is not None}
+            for entry in reversed(entries):
+                if entry["undo_of"] is not None or entry["seq"] in undone:
+                    continue
+                self._commit(self._frame(entry["added"]), self._frame(entry["removed"]), undo_of=entry["seq"])
+                return True
+            return False
+
+    def compact(self):
+        # 把變更紀錄整理成新的快照
+        if self.log_compact_bytes is None:
+            return
+        with self._writing():
+            version_before = self.version
+            self._save(self._df)
+            self._log_offset = 0
+            self.version = self._current_version()
+            # 資料沒變，同步中的衍生資料直接跟著換版本
+            for listener in self._listeners:
+                if listener.version == version_before:
+                    listener.version = self.version
+
+
+class Ledger(_Table):
+    columns = COLUMNS
+    log_compact_bytes = LOG_COMPACT_BYTES
+
+    def __init__(self, path=None):
+        super().__init__(path or DATA_FILE)
+
+    def _load(self):
+        return load_snapshot(self.path)
+
+    def _save(self, df):
+        save_data(df, self.path)
+
+    def _frame(self, records):
+        return transaction_frame(records)
+
+    def _prepare(self, rows):
+        prepared = normalize_transactions(rows)
+        if "ID" in rows.columns:
+            prepared["ID"] = rows["ID"].to_numpy()
+        return prepared
+
+    def _derive(self, rows):
+        rows["星期"] = rows["日期"].dt.weekday.map(dict(enumerate(WEEKDAY_LABELS)))
+        rows["實際支出"] = split_expense(rows["支出"], rows["支出比例"])
+        return rows
+
+    def _min_next_id(self):
+        return archive_max_id(self.path) + 1
+
+    def query(self, start=None, end=None, categories=None, payments=None, columns=None) -> pd.DataFrame:
+        # columns：只複製需要的欄位（只查熱資料，封存的請用 archived）
+        df = self.df
+        mask = query_mask(df, start, end, categories, payments)
+        return df.loc[mask, list(columns) if columns is not None else df.columns].copy()
+
+    def archived(self, start=None, end=None, categories=None, payments=None, columns=None) -> pd.DataFrame:
+        # 封存的紀錄（唯讀）；只讀跟日期區間有重疊的年度
+        df = read_archive(self.path, start, end, columns)
+        mask = query_mask(df, None, None, categories, payments) & ~df["ID"].isin(self.df["ID"])
+        return df[mask].reset_index(drop=True)
+
+    def query_all(self, start=None, end=None) -> pd.DataFrame:
+        # 熱資料 + 封存的紀錄（例如比對是否已經入帳過，封存的年度也要算）
+        hot = self.query(start, end)
+        archived = self.archived(start, end)
+        return pd.concat([archived, hot], ignore_index=True) if not archived.empty else hot
+
+    def rollup(self) -> pd.DataFrame:
+        return read_rollup(self.path)
+
+    def monthly_summary(self) -> pd.DataFrame:
+        # 熱資料 + 封存年度的彙總
+        return monthly_summary(self.df, self.rollup())
+
+    def archive_closed_years(self, today=None) -> int:
+        # 把已經結束的年度搬進封存檔，回傳搬了幾筆；跟整理快照一樣，之前的修改就不能再復原
+        with self._writing():
+            cold_mask = self._df["日期"] < archive_cutoff(today)
+            if not cold_mask.any():
+                return 0
+            cold = self._df[cold_mask]
+            write_archive(self.path, cold)
+            version_before = self.version
+            self._df = self._df[~cold_mask].reset_index(drop=True)
+            self._save(self._df)
+            self._log_offset = 0
+            self.version = self._current_version()
+            # 對衍生資料來說就是刪掉這些列
+            for listener in self._listeners:
+                if listener.version == version_before:
+                    listener.apply(cold, cold.iloc[0:0], self.version)
+            return len(cold)
+
+
+class AssetRegistry(_Table):
+    columns = ASSET_COLUMNS
+
+    def __init__(self, path=None):
+        super().__init__(path or ASSET_FILE)
+
+    def _current_version(self):
+        # 持有天數跟著日期走：日期也算進版本，跨日就重讀，衍生資料也會跟著重建
+        return (super()._current_version(), date.today())
+
+    def _load(self):
+        return load_assets(self.path)
+
+    def _save(self, df):
+        save_assets(df, self.path)
+
+    def _append(self, added):
+        return append_assets(added, self.path)
+
+    def _prepare(self, rows):
+        rows = rows.copy()
+        for col in ASSET_COLUMNS:
+            if col not in rows.columns:
+                rows[col] = "TWD" if col == "幣別" else None
+        rows["幣別"] = rows["幣別"].fillna("TWD").replace("", "TWD")
+        rows["金額"] = to_minor(rows["金額"]).to_numpy()
+        rows["交易ID"] = pd.to_numeric(rows["交易ID"], errors="coerce").astype("Int64")
+        return rows[ASSET_COLUMNS + [c for c in rows.columns if c not in ASSET_COLUMNS]]
+
+    def _derive(self, rows):
+        return recompute_depreciation(rows)
@@ -0,0 +1,367 @@
+"""家芬a整合平台的壓力測試：同時開 N 個無頭 session 操作 app，看一台機器撐得住多少人。
+
+每個 session 用 Streamlit 的 AppTest 跑 app.py，依序做
+新增記帳、改篩選條件、儲存表格修改、新增資產這些動作，每次重跑都計時。
+每一輪都在暫存資料夾裡操作資料的副本，不會動到真正的帳本。
+
+用法：
+    python loadtest.py --sessions 1 2 4 8
+    python loadtest.py --sessions 4 8 16 --actions 30 --data-dir 備份資料夾
+    python loadtest.py --sessions 4 --seed-rows 20000 --script app.py
+    python loadtest.py --sessions 2 4 --mode process
+
+輸出（每個 N 一列）：
+    重跑延遲 p50 / p95、寫入動作的 p95、峰值 RSS、
+    寫入筆數（應寫入 / 實際寫入，差額就是互相覆蓋掉的寫入）、例外次數
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+
+import ledger
+
+try:
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+except ImportError:  # 沒裝 streamlit 時 --help 還是可以看
+    st = None
+    AppTest = None
+
+APP_DIR = Path(__file__).resolve().parent
+DEFAULT_SCRIPTS = ["app.py"]
+DATA_FILES = ["transactions.csv", "transactions.log.jsonl", "assets.csv", "recurring.csv", "budgets.csv"]
+
+BOOKKEEPING_TAB = "📒 記帳"
+ASSET_TAB = "🧱 固定資產折舊"
+
+# 各動作被抽到的權重（大部分時間在看 / 篩選，偶爾才寫入）
+ACTION_WEIGHTS = {
+    "add_entry": 3,
+    "change_filter": 5,
+    "save_editor": 2,
+    "submit_asset": 1,
+}
+WRITE_ACTIONS = {"add_entry", "save_editor", "submit_asset"}
+
+SEARCH_WORDS = ["", "午餐", "加油", "房租", "測試", "店"]
+
+# AppTest 每次重跑都會換掉全域的 Runtime，不能在同一個行程裡平行跑，
+# 所以 thread 模式一次只讓一個 session 重跑（server 上 GIL 也讓重跑大致排隊，量到的延遲含排隊時間）。
+# process 模式每個 session 一個行程，真的同時寫檔，看得到多個 worker 搶寫同一本帳本的情況。
+RUN_LOCK = threading.Lock()
+
+
+# ===================== 測試資料 =====================
+
+def seed_ledger(path: Path, rows: int, seed: int = 0):
+    # 沒有現成資料時，產生 rows 筆看起來像真的記帳資料
+    rng = random.Random(seed)
+    categories = [c for c in ledger.CATEGORY_OPTIONS if c != "收入"]
+    start = pd.Timestamp(date.today()) - pd.Timedelta(days=3 * 365)
+    records = []
+    for i in range(rows):
+        category = rng.choice(categories)
+        sub = rng.choice(ledger.SUBCATEGORY_MAP.get(category, ["其他"]))
+        income = rng.random() < 0.05
+        amount = round(rng.uniform(10, 3000), rng.choice([0, 0, 2]))
+        records.append({
+            "日期": start + pd.Timedelta(days=rng.randrange(3 * 365)),
+            "類別": "收入" if income else category,
+            "小類": "薪資" if income else sub,
+            "項目": f"{sub}{i % 500}號店",
+            "支付方式": rng.choice(ledger.PAYMENT_OPTIONS),
+            "幣別": "TWD",
+            "收入": amount if income else 0.0,
+            "支出": 0.0 if income else amount,
+            "支出比例": rng.choice([100, 100, 100, 50]),
+            "備註": "測試" if i % 7 == 0 else "",
+        })
+    book = ledger.Ledger(path)
+    book.add_many(pd.DataFrame(records))
+    book.compact()
+
+
+def prepare_workdir(source, seed_rows: int) -> Path:
+    # 複製一份資料到暫存資料夾，所有 session 都在這份副本上操作
+    workdir = Path(tempfile.mkdtemp(prefix="loadtest_"))
+    if source:
+        for name in DATA_FILES:
+            if (Path(source) / name).exists():
+                shutil.copy2(Path(source) / name, workdir / name)
+        archive = ledger.archive_dir_for(Path(source) / "transactions.csv")
+        if archive.is_dir():
+            shutil.copytree(archive, workdir / archive.name)
+    if not (workdir / "transactions.csv").exists():
+        seed_ledger(workdir / "transactions.csv", seed_rows)
+    # 舊年度先封存好（跟一直開著的 server 一樣）；不然第一次開記帳頁時才搬走，會被算成遺失的寫入
+    ledger.Ledger(workdir / "transactions.csv").archive_closed_years()
+    return workdir
+
+
+# ===================== 單一 session =====================
+
+class Session:
+    def __init__(self, script, number: int, actions: int, timeout: float, lock=None):
+        self.script = script
+        self.lock = lock
+        self.number = number
+        self.actions = actions
+        self.timeout = timeout
+        self.rng = random.Random(number)
+        self.timings = []  # (動作, 秒數)
+        self.exceptions = 0
+        self.rows_added = 0
+        self.at = None
+
+    def run(self, barrier):
+        self.at = AppTest.from_file(str(APP_DIR / self.script), default_timeout=self.timeout)
+        barrier.wait()
+        self._rerun("open", self.at.run)
+        names = list(ACTION_WEIGHTS)
+        weights = list(ACTION_WEIGHTS.values())
+        for _ in range(self.actions):
+            action = self.rng.choices(names, weights)[0]
+            try:
+                getattr(self, action)()
+            except Exception:
+                # 找不到元件（通常是上一輪已經出錯）也算一次例外，換下一個動作
+                self.exceptions += 1
+        return self.result()
+
+    def result(self) -> dict:
+        return {"timings": self.timings, "exceptions": self.exceptions, "rows_added": self.rows_added}
+
+    def _rerun(self, action, run):
+        started = time.perf_counter()
+        try:
+            if self.lock is None:
+                run()
+            else:
+                with self.lock:
+                    run()
+        except Exception:
+            self.exceptions += 1
+        self.timings.append((action, time.perf_counter() - started))
+        self.exceptions += len(self.at.exception)
+
+    def _widget(self, kind, label, sidebar=False):
+        root = self.at.sidebar if sidebar else self.at
+        return next(w for w in getattr(root, kind) if w.label.startswith(label))
+
+    def _open_tab(self, tab):
+        if self.at.session_state["main_tabs"] != tab:
+            self.at.session_state["main_tabs"] = tab
+            self._rerun("switch_tab", self.at.run)
+
+    def add_entry(self):
+        self._open_tab(BOOKKEEPING_TAB)
+        self._widget("text_input", "項目", sidebar=True).input(f"壓測{self.number}-{len(self.timings)}")
+        self._widget("text_input", "金額", sidebar=True).input(str(self.rng.randint(10, 500)))
+        self._rerun("add_entry", self._widget("button", "💾 Add", sidebar=True).click().run)
+        if any("已新增" in s.value for s in self.at.sidebar.success):
+            self.rows_added += 1
+
+    def change_filter(self):
+        self._open_tab(BOOKKEEPING_TAB)
+        if self.rng.random() < 0.5:
+            box = self._widget("text_input", "搜尋")
+            self._rerun("change_filter", box.input(self.rng.choice(SEARCH_WORDS)).run)
+            return
+        picked = self.rng.sample(ledger.CATEGORY_OPTIONS, self.rng.randint(0, 2))
+        self._rerun("change_filter", self._widget("multiselect", "類別篩選").set_value(picked).run)
+
+    def save_editor(self):
+        self._open_tab(BOOKKEEPING_TAB)
+        self.at.session_state["bk_editor"] = {
+            "edited_rows": {"0": {"備註": f"壓測{self.number}"}},
+            "added_rows": [],
+            "deleted_rows": [],
+        }
+        self._rerun("save_editor", self._widget("button", "💾 儲存修改").click().run)
+
+    def submit_asset(self):
+        self._open_tab(ASSET_TAB)
+        self._widget("text_input", "產品名稱").input(f"壓測資產{self.number}")
+        self._widget("number_input", "金額").set_value(self.rng.randint(1000, 50000))
+        self._rerun("submit_asset", self._widget("button", "新增資產").click().run)
+
+
+# ===================== 一輪（N 個 session 同時跑） =====================
+
+def current_rss() -> int:
+    # 目前的常駐記憶體（bytes）；沒有 /proc 的系統用 ru_maxrss 代替
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def _run_threads(sessions):
+    # 同一個行程裡的 N 個 session，跟一台 server 一樣共用帳本池、快取
+    barrier = threading.Barrier(len(sessions))
+    results = [None] * len(sessions)
+
+    def work(i):
+        results[i] = sessions[i].run(barrier)
+
+    peak = current_rss()
+    done = threading.Event()
+
+    def sample():
+        nonlocal peak
+        while not done.wait(0.05):
+            peak = max(peak, current_rss())
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    threads = [threading.Thread(target=work, args=(i,), daemon=True) for i in range(len(sessions))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    done.set()
+    sampler.join()
+    return results, peak
+
+
+def _session_process(script, number, actions, timeout, barrier, queue):
+    result = Session(script, number, actions, timeout).run(barrier)
+    scale = 1 if sys.platform == "darwin" else 1024
+    result["rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    queue.put(result)
+
+
+def _run_processes(sessions):
+    # 每個 session 一個行程（像開了 N 個 worker），峰值 RSS 是各行程峰值的加總
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(len(sessions))
+    queue = context.Queue()
+    processes = [
+        context.Process(
+            target=_session_process,
+            args=(s.script, s.number, s.actions, s.timeout, barrier, queue),
+            daemon=True,
+        )
+        for s in sessions
+    ]
+    for p in processes:
+        p.start()
+    results = [queue.get() for _ in processes]
+    for p in processes:
+        p.join()
+    return results, sum(r.pop("rss") for r in results)
+
+
+def run_round(n: int, scripts, actions: int, timeout: float, source, seed_rows: int, mode="thread") -> dict:
+    workdir = prepare_workdir(source, seed_rows)
+    os.chdir(workdir)
+    # 每一輪都是一台剛啟動的 server：共用的帳本池、快取都清掉
+    st.cache_resource.clear()
+    st.cache_data.clear()
+    rows_before = len(ledger.load_data())
+
+    lock = RUN_LOCK if mode == "thread" else None
+    sessions = [Session(scripts[i % len(scripts)], i, actions, timeout, lock) for i in range(n)]
+    started = time.perf_counter()
+    if mode == "thread":
+        results, peak = _run_threads(sessions)
+    else:
+        results, peak = _run_processes(sessions)
+    elapsed = time.perf_counter() - started
+
+    timings = pd.DataFrame(
+        [(action, seconds) for r in results for action, seconds in r["timings"]],
+        columns=["動作", "秒數"],
+    )
+    writes = timings[timings["動作"].isin(WRITE_ACTIONS)]["秒數"]
+    expected = sum(r["rows_added"] for r in results)
+    # 從檔案重新讀一次，才看得到別的行程蓋掉的寫入
+    written = len(ledger.load_data()) - rows_before
+    return {
+        "sessions": n,
+        "重跑次數": len(timings),
+        "p50(ms)": timings["秒數"].quantile(0.5) * 1000,
+        "p95(ms)": timings["秒數"].quantile(0.95) * 1000,
+        "寫入p95(ms)": writes.quantile(0.95) * 1000 if not writes.empty else float("nan"),
+        "峰值RSS(MB)": peak / 1024 / 1024,
+        "應寫入": expected,
+        "實際寫入": written,
+        "遺失寫入": max(expected - written, 0),
+        "例外": sum(r["exceptions"] for r in results),
+        "總秒數": elapsed,
+        "_workdir": workdir,
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="家芬a整合平台 多 session 壓力測試")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8], help="同時幾個 session（可給多個）")
+    parser.add_argument("--actions", type=int, default=20, help="每個 session 做幾個動作")
+    parser.add_argument(
+        "--script",
+        action="append",
+        help=f"要跑的頁面（可重複指定，session 輪流分配；預設 {'、'.join(DEFAULT_SCRIPTS)}）",
+    )
+    parser.add_argument("--data-dir", default=".", help="從這個資料夾複製帳本來測（預設為目前資料夾）")
+    parser.add_argument("--seed-rows", type=int, default=5000, help="資料夾裡沒有帳本時，產生幾筆測試資料")
+    parser.add_argument(
+        "--mode",
+        choices=["thread", "process"],
+        default="thread",
+        help="thread：同一個行程（一台 server）；process：每個 session 一個行程（多個 worker 搶寫同一份檔案）",
+    )
+    parser.add_argument("--timeout", type=float, default=60, help="單次重跑的逾時秒數")
+    parser.add_argument("--out", help="結果另存成 CSV")
+    parser.add_argument("--keep", action="store_true", help="保留每一輪的暫存資料夾")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if AppTest is None:
+        print("需要先安裝 streamlit 才能跑壓力測試。")
+        return 1
+    source = os.path.abspath(args.data_dir)
+    scripts = args.script or DEFAULT_SCRIPTS
+    home = os.getcwd()
+    results = []
+    try:
+        for n in args.sessions:
+            result = run_round(n, scripts, args.actions, args.timeout, source, args.seed_rows, args.mode)
+            os.chdir(home)
+            workdir = result.pop("_workdir")
+            if not args.keep:
+                shutil.rmtree(workdir, ignore_errors=True)
+            results.append(result)
+            print(
+                f"N={n:>3}  p50 {result['p50(ms)']:7.0f} ms  p95 {result['p95(ms)']:7.0f} ms  "
+                f"RSS {result['峰值RSS(MB)']:6.0f} MB  遺失寫入 {result['遺失寫入']}  例外 {result['例外']}",
+                flush=True,
+            )
+    finally:
+        os.chdir(home)
+
+    table = pd.DataFrame(results).set_index("sessions")
+    print()
+    print(table.to_string(float_format=lambda v: f"{v:,.1f}"))
+    if args.out:
+        table.to_csv(args.out, encoding="utf-8-sig")
+        print(f"已輸出到 {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
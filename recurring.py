@@ -0,0 +1,139 @@
+from datetime import date
+
+import pandas as pd
+
+
+# ===================== 固定收支（每月自動入帳） =====================
+#
+# 規則存在 recurring.csv：每條規則每月固定某一天產生一筆紀錄（薪資、房租、電話費…）。
+# 產生出來的紀錄會帶「規則ID」，用 (規則ID, 日期) 判斷是否已經入帳過，
+# 所以不管重跑幾次都不會重複新增。
+
+RECURRING_COLUMNS = [
+    "規則ID",
+    "項目",
+    "類別",
+    "小類",
+    "支付方式",
+    "幣別",
+    "收支",
+    "金額",
+    "支出比例",
+    "每月幾號",
+    "開始日期",
+    "結束日期",
+    "上次產生",
+    "備註",
+]
+
+
+def load_rules(path) -> pd.DataFrame:
+    if not path.exists():
+        return pd.DataFrame(columns=RECURRING_COLUMNS)
+    rules = pd.read_csv(path, dtype={"規則ID": str})
+    for col in RECURRING_COLUMNS:
+        if col not in rules.columns:
+            rules[col] = None
+    for col in ["開始日期", "結束日期", "上次產生"]:
+        rules[col] = pd.to_datetime(rules[col], errors="coerce")
+    return rules[RECURRING_COLUMNS]
+
+
+def save_rules(rules: pd.DataFrame, path):
+    rules_to_save = rules.copy()
+    for col in ["開始日期", "結束日期", "上次產生"]:
+        rules_to_save[col] = pd.to_datetime(rules_to_save[col], errors="coerce").dt.strftime("%Y-%m-%d")
+    rules_to_save.to_csv(path, index=False, encoding="utf-8-sig")
+
+
+def assign_rule_ids(rules: pd.DataFrame) -> pd.DataFrame:
+    rules = rules.copy()
+    ids = rules["規則ID"].astype("string").str.strip()
+    missing = ids.isna() | (ids == "")
+    if missing.any():
+        used = pd.to_numeric(ids.str.lstrip("R"), errors="coerce")
+        start = int(used.max()) + 1 if used.notna().any() else 1
+        ids[missing] = [f"R{n}" for n in range(start, start + int(missing.sum()))]
+    rules["規則ID"] = ids.astype(object)
+    return rules
+
+
+def due_occurrences(rules: pd.DataFrame, today: date) -> pd.DataFrame:
+    # 每條規則：從「上次產生的隔天」（沒有就用開始日期）到 今天 / 結束日期
+    # 之間，每月的「每月幾號」（遇到小月就用月底）
+    columns = ["規則ID", "日期"]
+    if rules.empty:
+        return pd.DataFrame(columns=columns)
+
+    today_ts = pd.Timestamp(today)
+    start = rules["開始日期"].fillna(today_ts)
+    last = rules["上次產生"]
+    start = start.where(last.isna() | (last < start), last + pd.Timedelta(days=1))
+    end = rules["結束日期"].fillna(today_ts).clip(upper=today_ts)
+    day = pd.to_numeric(rules["每月幾號"], errors="coerce").fillna(1).clip(1, 31).astype(int)
+
+    active = start <= end
+    if not active.any():
+        return pd.DataFrame(columns=columns)
+
+    # 每條規則展開成它涵蓋的月份（一列一個月），之後全部用向量運算算日期
+    first_month = start[active].dt.year * 12 + start[active].dt.month - 1
+    last_month = end[active].dt.year * 12 + end[active].dt.month - 1
+    n_months = (last_month - first_month + 1).to_numpy()
+    expanded = pd.DataFrame({
+        "規則ID": rules.loc[active, "規則ID"].to_numpy().repeat(n_months),
+        "start": start[active].to_numpy().repeat(n_months),
+        "end": end[active].to_numpy().repeat(n_months),
+        "day": day[active].to_numpy().repeat(n_months),
+        "month": first_month.to_numpy().repeat(n_months),
+    })
+    expanded["month"] += expanded.groupby("規則ID").cumcount()
+    month_start = pd.to_datetime(pd.DataFrame({
+        "year": expanded["month"] // 12,
+        "month": expanded["month"] % 12 + 1,
+        "day": 1,
+    }))
+    day_in_month = expanded["day"].clip(upper=month_start.dt.days_in_month)
+    occurrence = month_start + pd.to_timedelta(day_in_month - 1, unit="D")
+
+    in_range = (occurrence >= expanded["start"]) & (occurrence <= expanded["end"])
+    return pd.DataFrame({
+        "規則ID": expanded.loc[in_range, "規則ID"].to_numpy(),
+        "日期": occurrence[in_range].to_numpy(),
+    })
+
+
+def materialize(rules: pd.DataFrame, ledger: pd.DataFrame, today: date, first_id: int, weekday_labels):
+    # 回傳 (要新增的紀錄, 更新過「上次產生」的規則)
+    occurrences = due_occurrences(rules, today)
+
+    # 已經入帳過的 (規則ID, 日期) 就跳過
+    if not occurrences.empty and "規則ID" in ledger.columns and not ledger.empty:
+        done = ledger.loc[ledger["規則ID"].notna(), ["規則ID", "日期"]].copy()
+        done["規則ID"] = done["規則ID"].astype(str)
+        done["日期"] = pd.to_datetime(done["日期"]).dt.normalize()
+        occurrences = occurrences.merge(done.drop_duplicates(), how="left", indicator=True)
+        occurrences = occurrences[occurrences["_merge"] == "left_only"].drop(columns="_merge")
+
+    new_rows = occurrences.merge(
+        rules.drop(columns=["開始日期", "結束日期", "上次產生", "每月幾號"]),
+        on="規則ID",
+        how="left",
+    ).sort_values(["日期", "規則ID"], ignore_index=True)
+
+    amount = pd.to_numeric(new_rows["金額"], errors="coerce").fillna(0.0)
+    ratio = pd.to_numeric(new_rows["支出比例"], errors="coerce").fillna(100).astype(int)
+    is_income = new_rows["收支"] == "收入"
+    new_rows["收入"] = amount.where(is_income, 0.0)
+    new_rows["支出"] = amount.where(~is_income, 0.0)
+    new_rows["支出比例"] = ratio
+    # 實際支出不在這裡算：新增時帳本依 支出 × 比例 算成整數的分
+    new_rows["星期"] = new_rows["日期"].dt.weekday.map(dict(enumerate(weekday_labels)))
+    new_rows["ID"] = range(first_id, first_id + len(new_rows))
+    new_rows = new_rows.drop(columns=["收支", "金額"])
+
+    updated_rules = rules.copy()
+    today_ts = pd.Timestamp(today)
+    ended = updated_rules["結束日期"].notna() & (updated_rules["結束日期"] < today_ts)
+    updated_rules["上次產生"] = updated_rules["結束日期"].where(ended, today_ts)
+    return new_rows, updated_rules
@@ -0,0 +1,160 @@
+import threading
+from datetime import date
+
+import pandas as pd
+
+
+# ===================== 近 N 天支出（滾動視窗） =====================
+#
+# 狀態是一張「日 × 類別」的每日實際支出表（金額單位：分），日期連續、沒花錢的日子補 0，
+# 另外存好每個視窗的滾動加總、以及異常判斷用的滾動中位數。
+# 新增 / 修改 / 刪除時只把差額加到受影響的那幾天，再從「最早被改到的那天」往後重算
+# 滾動值；平常新增的都是最近幾天，只會重算表尾幾列，不用整份歷史重來。
+
+ROLLING_WINDOWS = [7, 30, 90]
+
+# 某天某類別的支出 > 該類別前 OUTLIER_WINDOW 天「有花錢的日子」支出中位數的 OUTLIER_FACTOR 倍，
+# 就標成異常；前面有花錢的日子少於 OUTLIER_MIN_DAYS 天時樣本太少，不判斷
+OUTLIER_WINDOW = 90
+OUTLIER_FACTOR = 3
+OUTLIER_MIN_DAYS = 5
+
+
+def daily_spend(df: pd.DataFrame) -> pd.DataFrame:
+    # 明細 → 日 × 類別 的實際支出加總（build 跟 apply 共用）
+    if df.empty:
+        return pd.DataFrame(dtype="int64")
+    tmp = pd.DataFrame({
+        "日期": pd.to_datetime(df["日期"]).dt.normalize(),
+        "類別": df["類別"].fillna("").astype(str),
+        "實際支出": pd.to_numeric(df["實際支出"], errors="coerce").fillna(0).astype("int64"),
+    })
+    return tmp.pivot_table(index="日期", columns="類別", values="實際支出", aggfunc="sum", fill_value=0)
+
+
+def rolling_sums(daily: pd.DataFrame, window: int) -> pd.DataFrame:
+    return daily.rolling(window, min_periods=1).sum().astype("int64")
+
+
+def rolling_medians(daily: pd.DataFrame) -> pd.DataFrame:
+    # 只看有花錢的日子；shift(1) 讓當天不算進自己的基準
+    spent = daily.where(daily > 0)
+    return spent.rolling(OUTLIER_WINDOW, min_periods=OUTLIER_MIN_DAYS).median().shift(1)
+
+
+class RollingSpend:
+    def __init__(self, windows=ROLLING_WINDOWS):
+        self.windows = list(windows)
+        self.version = None
+        self._daily = pd.DataFrame(dtype="int64")
+        self._sums = {w: pd.DataFrame(dtype="int64") for w in self.windows}
+        self._medians = pd.DataFrame()
+        self._lock = threading.Lock()
+
+    def build(self, df: pd.DataFrame, version=None):
+        with self._lock:
+            daily = daily_spend(df)
+            if not daily.empty:
+                full = pd.date_range(daily.index.min(), daily.index.max(), freq="D")
+                daily = daily.reindex(full, fill_value=0)
+            self._daily = daily
+            self._sums = {w: rolling_sums(daily, w) for w in self.windows}
+            self._medians = rolling_medians(daily)
+            self.version = version
+
+    def apply(self, removed: pd.DataFrame, added: pd.DataFrame, version=None):
+        with self._lock:
+            delta = daily_spend(added).sub(daily_spend(removed), fill_value=0).fillna(0)
+            delta = delta.loc[(delta != 0).any(axis=1), (delta != 0).any(axis=0)]
+            if not delta.empty:
+                self._add_delta(delta.astype("int64"))
+            self.version = version
+
+    def _add_delta(self, delta: pd.DataFrame):
+        daily = self._daily
+        old_end = None if daily.empty else daily.index.max()
+        lo = delta.index.min() if daily.empty else min(daily.index.min(), delta.index.min())
+        hi = delta.index.max() if daily.empty else max(old_end, delta.index.max())
+        full = pd.date_range(lo, hi, freq="D")
+        columns = daily.columns.union(delta.columns)
+        if not daily.index.equals(full) or not daily.columns.equals(columns):
+            # 表往前 / 往後長或多了新類別：新的格子都是 0
+            daily = daily.reindex(index=full, columns=columns, fill_value=0)
+            for w in self.windows:
+                self._sums[w] = self._sums[w].reindex(index=full, columns=columns, fill_value=0)
+            self._medians = self._medians.reindex(index=full, columns=columns)
+        daily = daily.add(delta.reindex(index=full, columns=columns, fill_value=0)).astype("int64")
+        self._daily = daily
+
+        # 比最早被改到的那天還早的滾動值都不會變，只重算它之後的部分；
+        # 表往後長出來的新日子也要算（它們的視窗裡有舊資料）
+        start = full.get_loc(delta.index.min())
+        if old_end is not None and old_end < full[-1]:
+            start = min(start, full.get_loc(old_end + pd.Timedelta(days=1)))
+        for w in self.windows:
+            lo = max(start - w + 1, 0)
+            tail = rolling_sums(daily.iloc[lo:], w).iloc[start - lo:]
+            self._sums[w] = pd.concat([self._sums[w].iloc[:start], tail])
+        lo = max(start - OUTLIER_WINDOW, 0)
+        tail = rolling_medians(daily.iloc[lo:]).iloc[start - lo:]
+        self._medians = pd.concat([self._medians.iloc[:start], tail])
+
+    def rolling_totals(self, as_of=None) -> pd.DataFrame:
+        # 回傳 類別 × 近N天 的支出（分）；as_of 預設為今天
+        as_of = pd.Timestamp(as_of or date.today()).normalize()
+        with self._lock:
+            daily = self._daily
+            sums = dict(self._sums)
+        if daily.empty:
+            return pd.DataFrame(columns=[f"近{w}天" for w in self.windows], dtype="int64")
+        if as_of in daily.index:
+            result = pd.DataFrame({f"近{w}天": sums[w].loc[as_of] for w in self.windows})
+        else:
+            # 超出帳本日期範圍的日子都沒有支出，直接加總視窗內那幾天
+            result = pd.DataFrame({
+                f"近{w}天": daily.loc[as_of - pd.Timedelta(days=w - 1):as_of].sum()
+                for w in self.windows
+            })
+        result = result.astype("int64")
+        return result[(result != 0).any(axis=1)].sort_values(f"近{self.windows[-1]}天", ascending=False)
+
+    def month_over_month(self, month=None) -> pd.DataFrame:
+        # 回傳 類別 × (本月, 上月, 增減, 增減%)，金額單位：分
+        this_start = pd.Timestamp(month or date.today()).to_period("M").to_timestamp()
+        last_start = this_start - pd.offsets.MonthBegin(1)
+        this_end = this_start + pd.offsets.MonthEnd(0)
+        with self._lock:
+            daily = self._daily
+        if daily.empty:
+            return pd.DataFrame(columns=["本月", "上月", "增減", "增減%"])
+        this_month = daily.loc[this_start:this_end].sum()
+        last_month = daily.loc[last_start:this_start - pd.Timedelta(days=1)].sum()
+        result = pd.DataFrame({"本月": this_month, "上月": last_month}).astype("int64")
+        result = result[(result != 0).any(axis=1)]
+        result["增減"] = result["本月"] - result["上月"]
+        result["增減%"] = (result["增減"] / result["上月"].where(result["上月"] != 0) * 100).round(1)
+        return result.sort_values("本月", ascending=False)
+
+    def outliers(self, since=None) -> pd.DataFrame:
+        # 回傳異常的 (日期, 類別, 當日支出, 中位數, 倍數)，新的在前
+        with self._lock:
+            daily = self._daily
+            medians = self._medians
+        columns = ["日期", "類別", "當日支出", "中位數", "倍數"]
+        if daily.empty:
+            return pd.DataFrame(columns=columns)
+        if since is not None:
+            daily = daily.loc[pd.Timestamp(since):]
+            medians = medians.loc[daily.index]
+        flagged = (daily > medians * OUTLIER_FACTOR) & medians.notna()
+        hits = flagged.stack()
+        hits = hits[hits].index
+        if hits.empty:
+            return pd.DataFrame(columns=columns)
+        result = pd.DataFrame(
+            {"當日支出": daily.stack().reindex(hits), "中位數": medians.stack().reindex(hits)},
+            index=hits,
+        )
+        result["倍數"] = (result["當日支出"] / result["中位數"]).round(1)
+        result = result.rename_axis(["日期", "類別"]).reset_index()
+        return result.sort_values(["日期", "倍數"], ascending=[False, False], ignore_index=True)[columns]
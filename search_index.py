@@ -0,0 +1,90 @@
+import threading
+import unicodedata
+
+import pandas as pd
+
+
+# ===================== 全文搜尋：倒排索引 =====================
+#
+# 中文沒有空白斷詞，所以用「字元 n-gram」切：每個字（unigram）跟相鄰兩字（bigram）
+# 都當成 token。查詢時取查詢字串的 bigram 做交集拿到候選列，再用原文做一次
+# 子字串比對，結果和 str.contains 一樣，但不用每次掃過全部資料。
+
+
+def normalize_text(value) -> str:
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return ""
+    # 全形 / 半形統一、英文不分大小寫、去掉空白
+    text = unicodedata.normalize("NFKC", str(value)).lower()
+    return "".join(text.split())
+
+
+def ngrams(text: str) -> set:
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+class SearchIndex:
+    def __init__(self, fields):
+        self.fields = list(fields)
+        self.version = None
+        self._postings = {}
+        self._docs = {}
+        self._lock = threading.Lock()
+
+    def _add(self, row_id, text):
+        self._docs[row_id] = text
+        for gram in ngrams(text):
+            self._postings.setdefault(gram, set()).add(row_id)
+
+    def _remove(self, row_id):
+        text = self._docs.pop(row_id, None)
+        if text is None:
+            return
+        for gram in ngrams(text):
+            ids = self._postings.get(gram)
+            if ids is not None:
+                ids.discard(row_id)
+                if not ids:
+                    del self._postings[gram]
+
+    def _index_rows(self, df: pd.DataFrame):
+        # 不同欄位之間用分隔符號隔開，避免跨欄位拼出不存在的字
+        # （\x1f 會被 normalize_text 當空白去掉，查詢字串不可能含有它）
+        for row_id, *values in zip(df["ID"], *(df[f] for f in self.fields)):
+            self._remove(int(row_id))
+            self._add(int(row_id), "\x1f".join(normalize_text(v) for v in values))
+
+    def build(self, df: pd.DataFrame, version=None):
+        with self._lock:
+            self._postings = {}
+            self._docs = {}
+            if not df.empty:
+                self._index_rows(df)
+            self.version = version
+
+    def apply(self, removed: pd.DataFrame, added: pd.DataFrame, version=None):
+        # 修改 = 刪掉舊列 + 加上新列（同一個 ID）
+        with self._lock:
+            for row_id in removed["ID"]:
+                self._remove(int(row_id))
+            self._index_rows(added)
+            self.version = version
+
+    def search(self, query: str) -> set:
+        q = normalize_text(query)
+        if not q:
+            return set(self._docs)
+        with self._lock:
+            grams = [q] if len(q) == 1 else [q[i:i + 2] for i in range(len(q) - 1)]
+            # 從最短的 posting list 開始交集
+            postings = sorted((self._postings.get(g, set()) for g in grams), key=len)
+            candidates = set(postings[0])
+            for ids in postings[1:]:
+                candidates &= ids
+                if not candidates:
+                    break
+            if len(q) <= 2:
+                return candidates
+            return {row_id for row_id in candidates if q in self._docs[row_id]}
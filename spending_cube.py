@@ -0,0 +1,84 @@
+import threading
+from datetime import date, timedelta
+
+import pandas as pd
+
+
+# ===================== 類別 × 月份 預先彙總 =====================
+#
+# 以 (月份, 類別, 小類, 支付方式) 為格子，預先加總「收入」「實際支出」。
+# 新增 / 修改 / 刪除時只加減受影響的格子，查詢某段期間時直接把格子加起來，
+# 不必每次對全部明細做 groupby。只有「不滿一整個月」的頭尾月份才回頭看明細。
+
+CUBE_DIMS = ["月份", "類別", "小類", "支付方式"]
+CUBE_MEASURES = ["收入", "實際支出"]
+
+
+def split_full_months(start_date: date, end_date: date):
+    # 把 [start, end] 切成「完整月份」跟「頭尾不完整的日期區間」
+    full_months = []
+    partial_ranges = []
+    month_start = start_date.replace(day=1)
+    while month_start <= end_date:
+        next_month = (month_start + timedelta(days=32)).replace(day=1)
+        month_end = next_month - timedelta(days=1)
+        lo = max(month_start, start_date)
+        hi = min(month_end, end_date)
+        if lo == month_start and hi == month_end:
+            full_months.append(month_start.strftime("%Y-%m"))
+        else:
+            partial_ranges.append((lo, hi))
+        month_start = next_month
+    return full_months, partial_ranges
+
+
+def cells_from_rows(df: pd.DataFrame) -> pd.DataFrame:
+    # 明細 → 格子（build 跟「不完整月份」的回退計算共用）
+    if df.empty:
+        return pd.DataFrame(columns=CUBE_DIMS + CUBE_MEASURES)
+    tmp = df[["類別", "小類", "支付方式"]].fillna("").astype(str)
+    tmp.insert(0, "月份", pd.to_datetime(df["日期"]).dt.strftime("%Y-%m"))
+    for col in CUBE_MEASURES:
+        tmp[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype("int64")
+    return tmp.groupby(CUBE_DIMS)[CUBE_MEASURES].sum().reset_index()
+
+
+class SpendingCube:
+    def __init__(self):
+        self.version = None
+        self._cells = {}
+        self._lock = threading.Lock()
+
+    def build(self, df: pd.DataFrame, version=None):
+        with self._lock:
+            self._cells = {}
+            grouped = cells_from_rows(df)
+            for *key, income, actual in grouped.itertuples(index=False):
+                self._cells[tuple(key)] = [int(income), int(actual)]
+            self.version = version
+
+    def apply(self, removed: pd.DataFrame, added: pd.DataFrame, version=None):
+        # 修改 = 扣掉舊列 + 加上新列；兩邊都先在批次內 groupby，再加減到格子上
+        with self._lock:
+            for frame, sign in ((removed, -1), (added, +1)):
+                for *key, income, actual in cells_from_rows(frame).itertuples(index=False):
+                    # 金額都是整數（分），加減完剛好歸零就能把格子拿掉
+                    cell = self._cells.setdefault(tuple(key), [0, 0])
+                    cell[0] += sign * int(income)
+                    cell[1] += sign * int(actual)
+                    if cell[0] == 0 and cell[1] == 0:
+                        del self._cells[tuple(key)]
+            self.version = version
+
+    def cells(self, months=None, categories=None, payments=None) -> pd.DataFrame:
+        with self._lock:
+            items = list(self._cells.items())
+        month_set = set(months) if months is not None else None
+        rows = [
+            (*key, income, actual)
+            for key, (income, actual) in items
+            if (month_set is None or key[0] in month_set)
+            and (not categories or key[1] in categories)
+            and (not payments or key[3] in payments)
+        ]
+        return pd.DataFrame(rows, columns=CUBE_DIMS + CUBE_MEASURES)
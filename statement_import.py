@@ -0,0 +1,144 @@
+import re
+
+import pandas as pd
+
+from ledger import to_minor
+from search_index import normalize_text
+
+
+# ===================== 信用卡 / 銀行對帳單匯入 =====================
+#
+# 對帳單整理成帳本的列之後，先跟帳本比對：金額相同、項目（正規化後）相同、
+# 日期相差不超過 N 天，就當作已經記過，跳過不匯入。
+#
+# 比對不是兩兩比較：帳本依 (金額, 項目, 日期桶) 建 hash join，桶寬 = N 天，
+# 每筆對帳單只要查自己的桶跟前後兩個桶，時間跟 帳本筆數 + 對帳單筆數 成正比。
+
+STATEMENT_MATCH_DAYS = 3
+
+# 各家對帳單常見的欄位名稱 → 帳本欄位
+STATEMENT_COLUMN_ALIASES = {
+    "日期": ["日期", "交易日期", "消費日期", "消費日", "入帳日期", "date"],
+    "項目": ["項目", "摘要", "說明", "消費明細", "交易說明", "商店名稱", "description"],
+    "金額": ["金額", "消費金額", "新臺幣金額", "臺幣金額", "交易金額", "amount"],
+    "備註": ["備註", "note"],
+}
+
+ROC_DATE = re.compile(r"^(\d{2,3})[/.-](\d{1,2})[/.-](\d{1,2})$")
+
+
+def read_statement(source, name=None) -> pd.DataFrame:
+    # source 可以是路徑或上傳的檔案物件；副檔名決定用 CSV 或 Excel 讀
+    name = str(name or getattr(source, "name", source))
+    if name.lower().endswith((".xlsx", ".xls")):
+        return pd.read_excel(source)
+    return pd.read_csv(source)
+
+
+def parse_statement_dates(values: pd.Series) -> pd.Series:
+    # 一般日期之外，也看得懂民國年（113/01/05）
+    text = values.astype(str).str.strip()
+    roc = text.str.extract(ROC_DATE)
+    is_roc = roc[0].notna()
+    if is_roc.any():
+        text = text.where(
+            ~is_roc,
+            (roc[0].astype(float) + 1911).astype("Int64").astype(str) + "-" + roc[1] + "-" + roc[2],
+        )
+    return pd.to_datetime(text, errors="coerce", format="mixed").dt.normalize()
+
+
+def statement_to_rows(raw: pd.DataFrame, payment, category="其他", subcategory="其他", currency="TWD"):
+    # 回傳 (帳本格式的列, 看不懂而略過的筆數)；金額為負（退款）記成收入
+    lowered = {str(c).strip().lower(): c for c in raw.columns}
+    columns = {}
+    for target, aliases in STATEMENT_COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias.lower() in lowered:
+                columns[target] = lowered[alias.lower()]
+                break
+    missing = [c for c in ["日期", "項目", "金額"] if c not in columns]
+    if missing:
+        raise ValueError(f"對帳單缺少欄位：{'、'.join(missing)}")
+
+    dates = parse_statement_dates(raw[columns["日期"]])
+    amount = pd.to_numeric(
+        raw[columns["金額"]].astype(str).str.replace(",", "", regex=False).str.strip(),
+        errors="coerce",
+    )
+    valid = dates.notna() & amount.notna() & (amount != 0)
+    amount = amount[valid]
+    rows = pd.DataFrame({
+        "日期": dates[valid],
+        "類別": category,
+        "小類": subcategory,
+        "項目": raw.loc[valid, columns["項目"]].fillna("").astype(str).str.strip(),
+        "支付方式": payment,
+        "幣別": currency,
+        "收入": (-amount).clip(lower=0),
+        "支出": amount.clip(lower=0),
+        "支出比例": 100,
+        "備註": raw.loc[valid, columns["備註"]].fillna("").astype(str) if "備註" in columns else "",
+    })
+    return rows.reset_index(drop=True), int((~valid).sum())
+
+
+def item_key(items: pd.Series) -> pd.Series:
+    # 全形半形、大小寫、空白、標點都不算差異
+    return items.fillna("").astype(str).map(normalize_text).str.replace(r"[\W_]+", "", regex=True)
+
+
+def _match_keys(df: pd.DataFrame, cents: pd.Series) -> pd.DataFrame:
+    return pd.DataFrame({
+        "cents": cents.to_numpy(),
+        "day": (df["日期"].dt.normalize() - pd.Timestamp("1970-01-01")).dt.days.astype("int64"),
+        "item": item_key(df["項目"]),
+    })
+
+
+def statement_range(rows: pd.DataFrame, days: int = STATEMENT_MATCH_DAYS):
+    # 要拿來比對的帳本日期範圍：對帳單的頭尾各往外 days 天
+    return rows["日期"].min() - pd.Timedelta(days=days), rows["日期"].max() + pd.Timedelta(days=days)
+
+
+def find_duplicates(ledger: pd.DataFrame, rows: pd.DataFrame, days: int = STATEMENT_MATCH_DAYS) -> pd.Series:
+    # 回傳跟 rows 同 index 的布林值：True = 帳本裡已經有這筆
+    duplicated = pd.Series(False, index=rows.index)
+    if ledger.empty or rows.empty:
+        return duplicated
+
+    # 只拿日期範圍附近的帳本來比
+    lo, hi = statement_range(rows, days)
+    book = ledger[(ledger["日期"] >= lo) & (ledger["日期"] <= hi)]
+    if book.empty:
+        return duplicated
+
+    width = max(int(days), 1)
+    # 帳本的金額已經是「分」，對帳單的還是「元」
+    book_keys = _match_keys(book, book["支出"] - book["收入"])
+    book_keys["book_row"] = range(len(book_keys))
+    book_keys["bucket"] = book_keys["day"] // width
+
+    new_keys = _match_keys(rows, to_minor(rows["支出"]) - to_minor(rows["收入"]))
+    new_keys["row"] = rows.index
+    # 相差不超過 days 天的兩筆，桶號最多差 1，所以查 自己 / 前一個 / 後一個 桶就夠
+    probe = pd.concat(
+        [new_keys.assign(bucket=new_keys["day"] // width + shift) for shift in (-1, 0, 1)],
+        ignore_index=True,
+    )
+    pairs = probe.merge(book_keys, on=["cents", "bucket", "item"], suffixes=("", "_book"))
+    pairs["gap"] = (pairs["day"] - pairs["day_book"]).abs()
+    pairs = pairs[pairs["gap"] <= days].sort_values("gap", kind="stable")
+    # 一筆帳本紀錄只抵銷一筆對帳單（同一天買兩杯一樣的咖啡，帳本只有一筆就要補一筆）
+    # 每輪每筆對帳單先配日期最近的帳本紀錄，配過的兩邊都拿掉再配下一輪
+    while not pairs.empty:
+        best = pairs.drop_duplicates("row").drop_duplicates("book_row")
+        duplicated.loc[best["row"].to_numpy()] = True
+        pairs = pairs[~pairs["row"].isin(best["row"]) & ~pairs["book_row"].isin(best["book_row"])]
+    return duplicated
+
+
+def split_new_rows(ledger: pd.DataFrame, rows: pd.DataFrame, days: int = STATEMENT_MATCH_DAYS):
+    # 回傳 (要新增的列, 帳本已經有的列)；ledger 請包含封存的紀錄（Ledger.query_all(*statement_range(rows, days))）
+    duplicated = find_duplicates(ledger, rows, days)
+    return rows[~duplicated], rows[duplicated]
@@ -0,0 +1,148 @@
+import pandas as pd
+import pytest
+
+import cli
+from ledger import Ledger, archive_max_id, archive_years, monthly_summary, read_archive, read_log
+from recurring import RECURRING_COLUMNS, save_rules
+
+
+def entry(item, day, expense=100, income=0, category="飲食"):
+    return {
+        "日期": day, "類別": category, "小類": "午餐", "項目": item,
+        "支付方式": "現金", "幣別": "TWD", "收入": income, "支出": expense, "支出比例": 100,
+    }
+
+
+TODAY = pd.Timestamp("2026-06-15")
+
+
+def load_rules_frame(rules):
+    rules = rules.reindex(columns=RECURRING_COLUMNS)
+    for col in ["開始日期", "結束日期", "上次產生"]:
+        rules[col] = pd.to_datetime(rules[col])
+    return rules
+
+
+@pytest.fixture
+def book(tmp_path):
+    book = Ledger(tmp_path / "transactions.csv")
+    book.add_many([
+        entry("二〇年早餐", "2020-03-02", 80),
+        entry("二三年午餐", "2023-07-10", 120),
+        entry("二三年薪水", "2023-07-25", 0, 50000, "收入"),
+        entry("去年晚餐", "2025-11-30", 300),
+        entry("今年午餐", "2026-01-05", 150),
+    ])
+    book.archive_closed_years(TODAY)
+    return book
+
+
+def test_archived_ids_are_integers(book):
+    assert read_archive(book.path)["ID"].dtype == "int64"
+    assert read_archive(book.path, columns=["日期", "收入"])["ID"].dtype == "int64"
+    both = pd.concat([book.archived(), book.df], ignore_index=True)
+    assert both["ID"].dtype == "int64"
+    assert both["ID"].tolist() == [1, 2, 3, 4, 5]
+
+
+# ===================== 封存 / 彙總 =====================
+
+def test_archive_closed_years(book):
+    assert archive_years(book.path) == [2020, 2023]
+    assert book.df["項目"].tolist() == ["去年晚餐", "今年午餐"]
+    assert read_archive(book.path)["項目"].tolist() == ["二〇年早餐", "二三年午餐", "二三年薪水"]
+    # 封存也是整理成新的快照，變更紀錄清空
+    assert not read_log(book.path)[0]
+    assert book.archive_closed_years(TODAY) == 0
+
+    fresh = Ledger(book.path)
+    assert fresh.df["ID"].tolist() == [4, 5]
+    assert fresh.query_all()["ID"].tolist() == [1, 2, 3, 4, 5]
+
+
+def test_read_archive_by_range(book):
+    assert read_archive(book.path, "2023-01-01", "2023-12-31")["ID"].tolist() == [2, 3]
+    assert read_archive(book.path, "2023-07-20", "2024-06-30")["項目"].tolist() == ["二三年薪水"]
+    assert read_archive(book.path, "2021-01-01", "2022-12-31").empty
+    subset = read_archive(book.path, columns=["收入"])
+    assert subset.columns.tolist() == ["日期", "收入", "ID"]
+    assert subset["收入"].tolist() == [0, 0, 5000000]
+
+
+def test_rollup(book):
+    rollup = book.rollup().set_index(["月份", "類別"])
+    assert rollup.loc[("2020-03", "飲食"), "實際支出"] == 8000
+    assert rollup.loc[("2023-07", "飲食"), "實際支出"] == 12000
+    assert rollup.loc[("2023-07", "收入"), "收入"] == 5000000
+    assert rollup["實際支出"].sum() == 20000
+
+
+def test_backdated_entry_merges_into_archive(book):
+    book.add_many([entry("補記二三年", "2023-12-31", 60)])
+    assert book.df["項目"].tolist() == ["去年晚餐", "今年午餐", "補記二三年"]
+    assert book.archive_closed_years(TODAY) == 1
+    assert read_archive(book.path, "2023-01-01", "2023-12-31")["項目"].tolist() == ["二三年午餐", "二三年薪水", "補記二三年"]
+    rollup = book.rollup().set_index(["月份", "類別"])
+    assert rollup.loc[("2023-12", "飲食"), "實際支出"] == 6000
+    assert rollup.loc[("2023-07", "飲食"), "實際支出"] == 12000
+
+
+def test_archived_ids_are_not_reused(tmp_path):
+    book = Ledger(tmp_path / "transactions.csv")
+    book.add_many([entry("早", "2020-01-01"), entry("午", "2020-01-02"), entry("晚", "2020-01-03")])
+    assert book.archive_closed_years(TODAY) == 3
+    assert book.df.empty
+    assert archive_max_id(book.path) == 3
+    assert book.add_many([entry("今天", "2026-06-01")])["ID"].tolist() == [4]
+    assert Ledger(book.path).add_many([entry("明天", "2026-06-02")])["ID"].tolist() == [5]
+
+
+def test_monthly_summary_across_archive(tmp_path):
+    book = Ledger(tmp_path / "transactions.csv")
+    book.add_many([
+        entry("二三年午餐", "2023-07-10", 120),
+        entry("二三年薪水", "2023-07-25", 0, 500, "收入"),
+        entry("二三年晚餐", "2023-12-01", 80.5),
+        {**entry("今年分攤", "2026-01-05", 150), "支出比例": 50},
+    ])
+    before = book.monthly_summary()
+    book.archive_closed_years(TODAY)
+    after = book.monthly_summary()
+    pd.testing.assert_frame_equal(after, before)
+    assert after.loc["2023-07"].tolist() == [500.0, 120.0, 380.0]
+    assert after.loc["2023-12", "支出"] == 80.5
+    assert after.loc["2026-01", "支出"] == 75.0
+    # 封存之後只讀熱資料 + 彙總，不讀年度檔
+    assert monthly_summary(book.df, book.rollup()).equals(after)
+
+
+# ===================== 重複入帳 =====================
+
+def test_statement_reimport_into_archived_year(book, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    pd.DataFrame({
+        "交易日期": ["2023-07-11", "2023-08-01"], "摘要": ["二三年午餐", "二三年新的一筆"], "金額": [120, 99],
+    }).to_csv("statement.csv", index=False)
+    assert cli.main(["import-statement", "statement.csv", "--payment", "現金", "--category", "飲食"]) == 0
+    assert cli.main(["import-statement", "statement.csv", "--payment", "現金", "--category", "飲食"]) == 0
+    added = Ledger().df
+    # 對帳單上封存年度裡已經有的那筆跳過，新的那筆補記進熱資料（下次封存再併進去）
+    assert added["項目"].tolist() == ["去年晚餐", "今年午餐", "二三年新的一筆"]
+
+
+def test_recurring_rerun_over_archived_months(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    rules = pd.DataFrame([{
+        "規則ID": "R1", "項目": "房租", "類別": "日常", "小類": "房租", "支付方式": "現金", "幣別": "TWD",
+        "收支": "支出", "金額": 15000, "支出比例": 100, "每月幾號": 5, "開始日期": "2024-11-01",
+    }])
+    save_rules(load_rules_frame(rules), tmp_path / "recurring.csv")
+    assert cli.main(["recurring", "--today", "2026-02-10"]) == 0
+    assert cli.main(["archive", "--today", "2026-02-10"]) == 0
+    assert len(Ledger().df) == 14
+    # 規則重新儲存、上次產生被清掉：封存在 2024 的兩個月份不會再入帳
+    save_rules(load_rules_frame(rules), tmp_path / "recurring.csv")
+    assert cli.main(["recurring", "--today", "2026-02-10"]) == 0
+    book = Ledger()
+    assert len(book.df) == 14
+    assert len(book.query_all()) == 16
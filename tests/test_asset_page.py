@@ -0,0 +1,52 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from streamlit.testing.v1 import AppTest
+
+APP = str(Path(__file__).resolve().parent.parent / "app.py")
+ASSET_TAB = "🧱 固定資產折舊"
+
+
+def open_asset_page():
+    at = AppTest.from_file(APP, default_timeout=60)
+    at.session_state["main_tabs"] = ASSET_TAB
+    at.run()
+    return at
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    # 每個測試都在空的資料夾、全新的帳本池上跑
+    import streamlit as st
+
+    monkeypatch.chdir(tmp_path)
+    st.cache_resource.clear()
+    st.cache_data.clear()
+    return tmp_path
+
+
+def test_empty_ledger():
+    at = open_asset_page()
+    assert not at.exception
+    assert any(s.label.startswith("既有的支出") for s in at.selectbox)
+
+
+def test_no_recent_expense():
+    pd.DataFrame({
+        "日期": ["2020-01-05"], "類別": ["飲食"], "小類": ["早餐"], "項目": ["早餐店"],
+        "支付方式": ["現金"], "幣別": ["TWD"], "收入": [0], "支出": [80], "支出比例": [100],
+    }).to_csv("transactions.csv", index=False, encoding="utf-8-sig")
+    assert not open_asset_page().exception
+
+
+def test_linked_transaction_missing():
+    # 來源交易已刪除 / 封存：資產總覽照樣打得開，標成找不到
+    pd.DataFrame({
+        "分類": ["3C"], "產品名稱": ["筆電"], "購買日期": ["2024-01-01"], "幣別": ["TWD"],
+        "金額": [30000], "交易ID": [999], "ID": [1],
+    }).to_csv("assets.csv", index=False, encoding="utf-8-sig")
+    at = open_asset_page()
+    assert not at.exception
+    overview = at.dataframe[0].value
+    assert overview["來源交易"].iloc[0].startswith("#999")
@@ -0,0 +1,91 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from streamlit.testing.v1 import AppTest
+
+from ledger import Ledger, archive_years
+
+APP = str(Path(__file__).resolve().parent.parent / "app.py")
+
+
+def open_app():
+    return AppTest.from_file(APP, default_timeout=60).run()
+
+
+def button(at, label):
+    return next(b for b in at.button if b.label.startswith(label))
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    # 每個測試都在空的資料夾、全新的帳本池上跑
+    import streamlit as st
+
+    monkeypatch.chdir(tmp_path)
+    st.cache_resource.clear()
+    st.cache_data.clear()
+    return tmp_path
+
+
+def add_entry(at, item, amount):
+    next(w for w in at.sidebar.text_input if w.label.startswith("項目")).input(item)
+    next(w for w in at.sidebar.text_input if w.label.startswith("金額")).input(str(amount))
+    return next(b for b in at.sidebar.button if b.label.startswith("💾 Add")).click().run()
+
+
+def test_reruns_do_not_archive():
+    # 補記一筆很久以前的紀錄：重跑不會把它搬去封存，也還能復原
+    at = open_app()
+    next(w for w in at.sidebar.date_input if w.label == "日期").set_value(pd.Timestamp("2019-03-01").date())
+    add_entry(at, "舊帳", 120)
+    at.run()
+    assert not at.exception
+    assert archive_years() == []
+    assert Ledger().df["項目"].tolist() == ["舊帳"]
+
+    button(at, "↩️ 復原上一次修改").click().run()
+    assert Ledger().df.empty
+
+
+def test_archive_button():
+    pd.DataFrame({
+        "日期": ["2019-03-01", pd.Timestamp.today().strftime("%Y-%m-%d")], "類別": ["飲食", "飲食"],
+        "小類": ["早餐", "午餐"], "項目": ["舊帳", "新帳"], "支付方式": ["現金", "現金"], "幣別": ["TWD", "TWD"],
+        "收入": [0, 0], "支出": [80, 120], "支出比例": [100, 100],
+    }).to_csv("transactions.csv", index=False, encoding="utf-8-sig")
+    at = open_app()
+    assert archive_years() == []
+
+    button(at, "🗄️ 封存 1 筆").click().run()
+    assert not at.exception
+    assert archive_years() == [2019]
+    assert Ledger().df["項目"].tolist() == ["新帳"]
+    assert any("已封存 1 筆" in s.value for s in at.success)
+
+
+def test_sidebar_add_splits_in_cents():
+    at = open_app()
+    next(w for w in at.sidebar.number_input if w.label.startswith("支付比例")).set_value(50)
+    add_entry(at, "分攤", "100.01")
+    assert not at.exception
+    df = Ledger().df
+    assert df["支出"].tolist() == [10001]
+    assert df["實際支出"].tolist() == [5001]
+
+
+def test_budget_warning_only_when_crossing():
+    pd.DataFrame([{"類別": "飲食", "小類": "", "每月預算": 1000}]).to_csv("budgets.csv", index=False)
+    at = open_app()
+
+    def warnings():
+        return [w.value for w in at.sidebar.warning if "超過預算" in w.value]
+
+    add_entry(at, "午餐", 600)
+    assert warnings() == []
+    add_entry(at, "聚餐", 500)
+    assert len(warnings()) == 1
+    assert "超出 100" in warnings()[0]
+    # 本來就已經超過：不再跳警告
+    add_entry(at, "飲料", 100)
+    assert warnings() == []
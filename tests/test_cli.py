@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+import cli
+from ledger import Ledger
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def write(name, text):
+    with open(name, "w", encoding="utf-8") as f:
+        f.write(text)
+    return name
+
+
+def test_ingest():
+    write("old.csv", "日期,類別,項目,支出,支出比例\n2026-01-05,飲食,便當,80.5,100\n2026-01-06,飲食,分攤,100,50\n")
+    assert cli.main(["ingest", "old.csv"]) == 0
+    df = Ledger().df
+    assert df["支出"].tolist() == [8050, 10000]
+    assert df["實際支出"].tolist() == [8050, 5000]
+
+
+@pytest.mark.parametrize(
+    "name, text, message",
+    [
+        ("empty.csv", "", "No columns"),
+        ("no_date.csv", "x,y\n1,2\n", "缺少「日期」欄"),
+        ("bad_date.csv", "日期,支出\n昨天,80\n", "讀取失敗"),
+        ("fake.xlsx", "PK\x03\x04 這不是 Excel", "讀取失敗"),
+    ],
+)
+def test_ingest_bad_file(capsys, name, text, message):
+    # 壞掉的檔案：一行錯誤訊息、結束碼不是 0，好的檔案也不會先寫進去
+    write("good.csv", "日期,支出\n2026-01-05,80\n")
+    write(name, text)
+    assert cli.main(["ingest", "good.csv", name]) == 1
+    err = capsys.readouterr().err
+    assert err.startswith(f"{name}: ") and message in err
+    assert len(err.strip().splitlines()) == 1
+    assert not os.path.exists("transactions.csv")
+    assert Ledger().df.empty
+
+
+def test_ingest_missing_file(capsys):
+    assert cli.main(["ingest", "nope.csv"]) == 1
+    assert "nope.csv: 讀取失敗" in capsys.readouterr().err
+
+
+def test_import_statement_bad_file(capsys):
+    write("statement.csv", "x,y\n1,2\n")
+    assert cli.main(["import-statement", "statement.csv", "--payment", "現金"]) == 1
+    assert "對帳單缺少欄位" in capsys.readouterr().err
+    assert Ledger().df.empty
+
+
+def test_ingest_dev_null(capsys):
+    assert cli.main(["ingest", os.devnull]) == 1
+    assert capsys.readouterr().err.startswith(f"{os.devnull}: 讀取失敗")
+    assert Ledger().df.empty
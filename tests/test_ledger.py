@@ -0,0 +1,136 @@
+import multiprocessing
+
+import pandas as pd
+import pytest
+
+from ledger import Ledger, read_log
+
+
+def entry(item, expense=100, day="2026-01-05", **extra):
+    return {
+        "日期": day, "類別": "飲食", "小類": "午餐", "項目": item,
+        "支付方式": "現金", "幣別": "TWD", "收入": 0, "支出": expense, "支出比例": 100, **extra,
+    }
+
+
+def assert_same_rows(left, right):
+    # CSV 讀回來空白的文字欄是 NaN，記憶體裡是 ""，兩邊都當成空白比
+    text = ["類別", "小類", "項目", "支付方式", "幣別", "備註", "規則ID"]
+    pd.testing.assert_frame_equal(
+        left.assign(**{c: left[c].fillna("").astype(str) for c in text}),
+        right.assign(**{c: right[c].fillna("").astype(str) for c in text}),
+    )
+
+
+@pytest.fixture
+def path(tmp_path):
+    return tmp_path / "transactions.csv"
+
+
+# ===================== 多個寫入者 =====================
+
+class SmallLogLedger(Ledger):
+    # 紀錄很快就超過門檻，寫入之間也會一直整理快照
+    log_compact_bytes = 2000
+
+
+def _writer(path, number, count):
+    book = SmallLogLedger(path)
+    for i in range(count):
+        book.add_many([entry(f"w{number}-{i}")])
+
+
+def test_concurrent_writers_keep_every_row(path):
+    ctx = multiprocessing.get_context("fork")
+    workers = [ctx.Process(target=_writer, args=(path, n, 15)) for n in range(4)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+        assert w.exitcode == 0
+
+    df = Ledger(path).df
+    assert len(df) == 60
+    assert df["ID"].is_unique
+    assert set(df["項目"]) == {f"w{n}-{i}" for n in range(4) for i in range(15)}
+    entries, _ = read_log(path)
+    seqs = [e["seq"] for e in entries]
+    assert len(seqs) == len(set(seqs))
+
+
+def test_two_instances_see_each_others_writes(path):
+    a, b = Ledger(path), Ledger(path)
+    a.add_many([entry("a")])
+    b.add_many([entry("b")])
+    a.update_many(pd.DataFrame({"ID": [2], "支出": [300]}))
+    assert b.undo()
+    assert b.df.set_index("項目")["支出"].to_dict() == {"a": 10000, "b": 10000}
+    assert [e["seq"] for e in read_log(path)[0]] == [1, 2, 3, 4]
+
+
+# ===================== 變更紀錄 / 復原 / 整理快照 =====================
+
+def test_changes_replay_from_log(path):
+    book = Ledger(path)
+    book.add_many([entry("早餐", 80), entry("午餐", 120), entry("晚餐", 200)])
+    book.update_many(pd.DataFrame({"ID": [2], "支出": [150], "支出比例": [50]}))
+    book.delete_many([1])
+    # 只追加紀錄，快照還沒寫
+    assert not path.exists()
+    assert len(read_log(path)[0]) == 3
+
+    fresh = Ledger(path).df
+    assert fresh["ID"].tolist() == [2, 3]
+    assert fresh["支出"].tolist() == [15000, 20000]
+    assert fresh["實際支出"].tolist() == [7500, 20000]
+    pd.testing.assert_frame_equal(fresh, book.df)
+
+
+def test_undo_twice(path):
+    book = Ledger(path)
+    book.add_many([entry("早餐", 80)])
+    book.update_many(pd.DataFrame({"ID": [1], "支出": [90]}))
+    book.delete_many([1])
+
+    assert book.undo()
+    assert book.df["支出"].tolist() == [9000]
+    assert book.undo()
+    assert book.df["支出"].tolist() == [8000]
+    assert book.undo()
+    assert book.df.empty
+    assert not book.undo()
+    assert book.history()["復原第幾批"].tolist()[3:] == [3, 2, 1]
+    assert Ledger(path).df.empty
+
+
+def test_compact_at_threshold(path):
+    book = Ledger(path)
+    book.add_many([entry("早餐", 80)])
+    assert not path.exists()
+    # 一批就超過 2 MB 的紀錄 → 寫成快照、清掉紀錄
+    book.add_many([entry(f"項目{i}", i % 500 + 1, 備註="x" * 40) for i in range(8000)])
+    assert path.exists()
+    assert not read_log(path)[0]
+    assert len(book.df) == 8001
+
+    book.delete_many([1])
+    assert len(read_log(path)[0]) == 1
+    assert_same_rows(Ledger(path).df, book.df)
+
+
+def test_reload_after_compact(path):
+    book = Ledger(path)
+    book.add_many([entry("早餐", 80.5), entry("午餐", 120)])
+    book.update_many(pd.DataFrame({"ID": [1], "備註": ["加蛋"]}))
+    before = book.df.copy()
+    book.compact()
+    assert not read_log(path)[0]
+    # 整理之後之前的修改不能再復原
+    assert not book.undo()
+
+    fresh = Ledger(path)
+    assert_same_rows(fresh.df, before)
+    # 接著寫也是從快照的最大 ID 往下編
+    fresh.delete_many([1])
+    assert fresh.add_many([entry("晚餐")])["ID"].tolist() == [3]
+    assert Ledger(path).df["項目"].tolist() == ["午餐", "晚餐"]
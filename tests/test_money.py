@@ -0,0 +1,101 @@
+import pandas as pd
+import pytest
+
+import cli
+from ledger import Ledger, from_minor, split_expense, to_major, to_minor
+
+
+# ===================== 元 ↔ 分 =====================
+
+@pytest.mark.parametrize(
+    "yuan, cents",
+    [
+        (0, 0),
+        (80, 8000),
+        (80.5, 8050),
+        ("1234.56", 123456),
+        (0.1 + 0.2, 30),
+        # 半分四捨五入，不是銀行家捨入
+        (0.125, 13),
+        (0.135, 14),
+        # 1.005 × 100 在浮點數是 100.4999…，一樣要進位
+        (1.005, 101),
+        (2.675, 268),
+        (-0.125, -13),
+        (-80.5, -8050),
+        ("看不懂", 0),
+        (None, 0),
+    ],
+)
+def test_to_minor(yuan, cents):
+    result = to_minor([yuan])
+    assert result.dtype == "int64"
+    assert result.tolist() == [cents]
+
+
+def test_from_minor_round_trip():
+    cents = pd.Series([0, 1, 8050, 123456, -13], dtype="int64")
+    assert from_minor(cents).tolist() == [0.0, 0.01, 80.5, 1234.56, -0.13]
+    assert to_minor(from_minor(cents)).tolist() == cents.tolist()
+
+
+def test_to_major_only_touches_money_columns():
+    df = pd.DataFrame({"支出": [8050], "實際支出": [4025], "支出比例": [50], "ID": [7]})
+    major = to_major(df)
+    assert major.to_dict("records") == [{"支出": 80.5, "實際支出": 40.25, "支出比例": 50, "ID": 7}]
+    # 原本的表不動
+    assert df["支出"].tolist() == [8050]
+
+
+# ===================== 實際支出 =====================
+
+@pytest.mark.parametrize(
+    "expense, ratio, actual",
+    [
+        (10000, 100, 10000),
+        (10000, 0, 0),
+        (10000, 50, 5000),
+        (10001, 50, 5001),  # 5000.5 分 → 進位
+        (1, 50, 1),
+        (1, 49, 0),
+        (333, 33, 110),  # 109.89 分
+        (0, 70, 0),
+    ],
+)
+def test_split_expense(expense, ratio, actual):
+    result = split_expense(pd.Series([expense]), pd.Series([ratio]))
+    assert result.dtype == "int64"
+    assert result.tolist() == [actual]
+
+
+# ===================== 存檔再讀回來 =====================
+
+def test_money_survives_csv_round_trip(tmp_path):
+    path = tmp_path / "transactions.csv"
+    book = Ledger(path)
+    book.add_many([
+        {"日期": "2026-01-05", "類別": "飲食", "項目": "便當", "支出": 80.5, "支出比例": 100},
+        {"日期": "2026-01-06", "類別": "飲食", "項目": "分攤", "支出": 100.01, "支出比例": 50},
+        {"日期": "2026-01-07", "類別": "收入", "項目": "薪水", "收入": 0.1 + 0.2},
+    ])
+    book.compact()
+
+    df = Ledger(path).df
+    for col in ["收入", "支出", "實際支出"]:
+        assert df[col].dtype == "int64"
+    assert df["支出"].tolist() == [8050, 10001, 0]
+    assert df["實際支出"].tolist() == [8050, 5001, 0]
+    assert df["收入"].tolist() == [0, 0, 30]
+    assert df["實際支出"].sum() == 13051
+
+
+def test_recurring_rows_use_integer_split(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    pd.DataFrame([{
+        "規則ID": "R1", "項目": "分攤房租", "類別": "日常", "小類": "房租", "支付方式": "現金", "幣別": "TWD",
+        "收支": "支出", "金額": 100.01, "支出比例": 50, "每月幾號": 5, "開始日期": "2026-01-01",
+    }]).to_csv("recurring.csv", index=False)
+    assert cli.main(["recurring", "--today", "2026-02-10"]) == 0
+    df = Ledger().df
+    assert df["實際支出"].dtype == "int64"
+    assert df["實際支出"].tolist() == [5001, 5001]
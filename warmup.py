@@ -0,0 +1,131 @@
+"""家芬a整合平台的開機預熱：啟動 server 的同時，在背景把帳本讀進記憶體。
+
+Streamlit 要等第一個人連上來才會跑 app.py，所以第一個人要等讀 CSV、轉日期、
+重算資產折舊、讀封存彙總、建索引。改用這支啟動的話，這些事在 server 開機時
+就由背景執行緒先做好，第一個 session 直接接手預熱好的帳本池。
+每一步的進度跟花的時間都寫在 instrumentation.log。
+
+用法：
+    python warmup.py                          # 等同 streamlit run app.py，多了預熱
+    python warmup.py --books 預設,小明 -- --server.port 8502
+    python warmup.py --no-serve               # 只預熱一次看各步驟要多久，不開 server
+"""
+import argparse
+import importlib
+import logging
+import sys
+import threading
+import time
+from pathlib import Path
+
+from books import BOOK_POOL_MAX_MB, DEFAULT_BOOK, BookPool, list_books, offer_pool
+
+# 效能相關的紀錄都記在 instrumentation 底下，寫到這個檔
+INSTRUMENTATION_LOG = Path("instrumentation.log")
+
+log = logging.getLogger("instrumentation.warmup")
+
+
+def setup_instrumentation_log(path=INSTRUMENTATION_LOG):
+    logger = logging.getLogger("instrumentation")
+    if not logger.handlers:
+        handler = logging.FileHandler(path, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(levelname)s %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+    return logger
+
+
+def _timed(label, func):
+    started = time.perf_counter()
+    result = func()
+    log.info("%s：%.3f 秒", label, time.perf_counter() - started)
+    return result
+
+
+def warm_book(pool: BookPool, name):
+    book = pool.get(name)
+    started = time.perf_counter()
+    log.info("開始預熱帳本「%s」", name)
+    # 讀 CSV / 快取檔、轉日期、重放變更紀錄
+    rows = len(_timed(f"[{name}] 讀帳本", lambda: book.ledger.df))
+    _timed(f"[{name}] 封存彙總", book.ledger.rollup)
+    for label, listener in (
+        ("搜尋索引", book.search_index),
+        ("類別 × 月份彙總", book.cube),
+        ("近期支出", book.rolling),
+        ("預算累計", book.monthly_totals),
+    ):
+        _timed(f"[{name}] {label}", lambda listener=listener: book.ledger.sync(listener))
+    # 讀資產表時順便重算持有天數 / 每日均攤
+    assets = len(_timed(f"[{name}] 讀資產並重算折舊", lambda: book.assets.df))
+    for label, listener in (
+        ("資產連結", book.asset_links),
+        ("資產分組", book.asset_groups),
+        ("資產內容 hash", book.asset_hashes),
+    ):
+        _timed(f"[{name}] {label}", lambda listener=listener: book.assets.sync(listener))
+    log.info(
+        "帳本「%s」預熱完成：%d 筆記帳、%d 筆資產、%.1f MB，共 %.3f 秒",
+        name, rows, assets, book.nbytes() / 1024 / 1024, time.perf_counter() - started,
+    )
+
+
+def warm_up(pool: BookPool, names):
+    started = time.perf_counter()
+    log.info("預熱開始：%s", "、".join(names))
+    # 畫圖的模組第一次 import 要建字型快取，也先做
+    _timed("載入圖表模組", lambda: importlib.import_module("charts"))
+    for name in names:
+        try:
+            warm_book(pool, name)
+        except Exception:
+            # 預熱失敗不影響 server，第一個用到的 session 會自己再讀一次
+            log.exception("帳本「%s」預熱失敗", name)
+    log.info("預熱結束，共 %.3f 秒", time.perf_counter() - started)
+
+
+def start_warmup(names) -> threading.Thread:
+    # 帳本池先交出去，預熱在背景做；server 這時已經可以接 session
+    pool = BookPool(BOOK_POOL_MAX_MB * 1024 * 1024)
+    offer_pool(pool)
+    thread = threading.Thread(target=warm_up, args=(pool, names), name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="家芬a整合平台 開機預熱 + 啟動 server")
+    parser.add_argument(
+        "--books",
+        default=DEFAULT_BOOK,
+        help=f"要預熱的帳本，用逗號分隔；all = 全部（預設：{DEFAULT_BOOK}）",
+    )
+    parser.add_argument(
+        "--script",
+        default=str(Path(__file__).with_name("app.py")),
+        help="要啟動的 Streamlit 程式（預設：跟這支同一個資料夾的 app.py）",
+    )
+    parser.add_argument("--no-serve", action="store_true", help="只預熱一次，不啟動 server")
+    parser.add_argument("streamlit_args", nargs="*", help="放在 -- 後面，原樣交給 streamlit run")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    names = list_books() if args.books == "all" else [n.strip() for n in args.books.split(",") if n.strip()]
+    setup_instrumentation_log()
+    thread = start_warmup(names)
+    if args.no_serve:
+        thread.join()
+        print(f"預熱完成，各步驟花的時間請看 {INSTRUMENTATION_LOG}")
+        return 0
+
+    from streamlit.web import cli as stcli
+
+    sys.argv = ["streamlit", "run", args.script, *args.streamlit_args]
+    return stcli.main()
+
+
+if __name__ == "__main__":
+    sys.exit(main())